@@ -0,0 +1,239 @@
+from sqlalchemy import select, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app import models
+from app.crud import posts_with_counts, attach_counts, post_version_query
+from app.database import read_only
+from typing import Dict, List, Optional
+
+# Async versions of the hot read/write paths used by app/routes/async_routes.py.
+# Relationships are always eager-loaded here: lazy loading is not allowed on an
+# AsyncSession, so anything serialized later must be fetched up front.
+
+# ============= POST CRUD =============
+@read_only
+async def get_posts(db: AsyncSession, skip: int = 0, limit: int = 100, community_id: Optional[int] = None):
+    query = posts_with_counts()
+    if community_id:
+        query = query.where(models.Post.community_id == community_id)
+    query = query.order_by(models.Post.created_at.desc()).offset(skip).limit(limit)
+    result = await db.execute(query)
+    return attach_counts(result.all())
+
+@read_only
+async def get_post(db: AsyncSession, post_id: int):
+    result = await db.execute(posts_with_counts().where(models.Post.id == post_id))
+    posts = attach_counts(result.all())
+    return posts[0] if posts else None
+
+@read_only
+async def get_post_version(db: AsyncSession, post_id: int):
+    row = (await db.execute(post_version_query(post_id))).first()
+    return tuple(row) if row else None
+
+@read_only
+async def post_exists(db: AsyncSession, post_id: int) -> bool:
+    result = await db.execute(select(models.Post.id).where(models.Post.id == post_id))
+    return result.scalar() is not None
+
+# ============= COMMENT CRUD =============
+@read_only
+async def get_comments_with_replies(db: AsyncSession, post_id: int):
+    """Get parent comments paired with their replies, authors eager-loaded"""
+    result = await db.execute(
+        select(models.Comment)
+        .where(models.Comment.post_id == post_id)
+        .options(selectinload(models.Comment.author))
+        .order_by(models.Comment.created_at.asc())
+    )
+    all_comments = result.scalars().all()
+
+    replies: Dict[int, List[models.Comment]] = {}
+    for c in all_comments:
+        if c.parent_id is not None:
+            replies.setdefault(c.parent_id, []).append(c)
+
+    return [(c, replies.get(c.id, [])) for c in all_comments if c.parent_id is None]
+
+@read_only
+async def get_comment_reactions_counts(db: AsyncSession, comment_ids: List[int]):
+    """Get like and dislike counts for many comments in a single grouped query"""
+    counts = {comment_id: {"likes": 0, "dislikes": 0} for comment_id in comment_ids}
+    if not comment_ids:
+        return counts
+
+    result = await db.execute(
+        select(
+            models.CommentReaction.comment_id,
+            models.CommentReaction.reaction_type,
+            func.count(models.CommentReaction.id)
+        )
+        .where(models.CommentReaction.comment_id.in_(comment_ids))
+        .group_by(models.CommentReaction.comment_id, models.CommentReaction.reaction_type)
+    )
+    for comment_id, reaction_type, count in result.all():
+        if reaction_type == "like":
+            counts[comment_id]["likes"] = count
+        elif reaction_type == "dislike":
+            counts[comment_id]["dislikes"] = count
+    return counts
+
+# ============= REACTION CRUD =============
+@read_only
+async def get_post_reactions_count(db: AsyncSession, post_id: int):
+    result = await db.execute(
+        select(func.count(models.PostReaction.id)).where(models.PostReaction.post_id == post_id)
+    )
+    return result.scalar()
+
+@read_only
+async def has_user_reacted(db: AsyncSession, post_id: int, user_id: int):
+    result = await db.execute(
+        select(models.PostReaction.id).where(
+            models.PostReaction.post_id == post_id,
+            models.PostReaction.user_id == user_id
+        )
+    )
+    return result.scalar() is not None
+
+async def add_reaction(db: AsyncSession, post_id: int, user_id: int, reaction_type: str = "like"):
+    result = await db.execute(
+        select(models.PostReaction).where(
+            models.PostReaction.post_id == post_id,
+            models.PostReaction.user_id == user_id
+        )
+    )
+    existing = result.scalar()
+
+    if existing:
+        await db.delete(existing)
+        await db.commit()
+        return None
+
+    post = await db.get(models.Post, post_id)
+    reaction = models.PostReaction(
+        post_id=post_id,
+        user_id=user_id,
+        reaction_type=reaction_type
+    )
+    db.add(reaction)
+    await db.commit()
+
+    # Create notification for post author (only if not reacting to own post)
+    if post and post.user_id != user_id:
+        reactor = await db.get(models.User, user_id)
+        await create_notification(
+            db=db,
+            user_id=post.user_id,
+            notification_type='post_reaction',
+            title='Someone liked your post',
+            message=f'{reactor.username} liked your post: {post.title[:50]}',
+            target_type='post',
+            target_id=post_id,
+            actor_id=user_id
+        )
+
+    return reaction
+
+# ============= NOTIFICATION CRUD =============
+async def get_or_create_notification_preferences(db: AsyncSession, user_id: int):
+    """Get user's notification preferences or create default ones"""
+    result = await db.execute(
+        select(models.NotificationPreference).where(
+            models.NotificationPreference.user_id == user_id
+        )
+    )
+    prefs = result.scalar()
+
+    if not prefs:
+        prefs = models.NotificationPreference(user_id=user_id)
+        db.add(prefs)
+        await db.commit()
+
+    return prefs
+
+async def create_notification(
+    db: AsyncSession,
+    user_id: int,
+    notification_type: str,
+    title: str,
+    message: str,
+    target_type: str = None,
+    target_id: int = None,
+    actor_id: int = None
+):
+    """Create a new notification"""
+    prefs = await get_or_create_notification_preferences(db, user_id)
+
+    pref_mapping = {
+        'comment_reaction': prefs.comment_reactions,
+        'comment_reply': prefs.comment_replies,
+        'post_reaction': prefs.post_reactions,
+        'new_post': prefs.new_posts
+    }
+
+    # Only create notification if user has enabled this type
+    if not pref_mapping.get(notification_type, True):
+        return None
+
+    notification = models.Notification(
+        user_id=user_id,
+        type=notification_type,
+        title=title,
+        message=message,
+        target_type=target_type,
+        target_id=target_id,
+        actor_id=actor_id
+    )
+    db.add(notification)
+    await db.commit()
+    return notification
+
+@read_only
+async def get_user_notifications(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 50):
+    """Get user's notifications"""
+    result = await db.execute(
+        select(models.Notification)
+        .where(models.Notification.user_id == user_id)
+        .order_by(models.Notification.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+@read_only
+async def get_unread_notifications_count(db: AsyncSession, user_id: int):
+    """Get count of unread notifications"""
+    result = await db.execute(
+        select(func.count(models.Notification.id)).where(
+            models.Notification.user_id == user_id,
+            models.Notification.is_read == False
+        )
+    )
+    return result.scalar()
+
+async def mark_notification_as_read(db: AsyncSession, notification_id: int, user_id: int):
+    """Mark a notification as read"""
+    result = await db.execute(
+        update(models.Notification)
+        .where(
+            models.Notification.id == notification_id,
+            models.Notification.user_id == user_id
+        )
+        .values(is_read=True)
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+async def mark_all_notifications_as_read(db: AsyncSession, user_id: int):
+    """Mark all user's notifications as read"""
+    await db.execute(
+        update(models.Notification)
+        .where(
+            models.Notification.user_id == user_id,
+            models.Notification.is_read == False
+        )
+        .values(is_read=True)
+    )
+    await db.commit()
+    return True
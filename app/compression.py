@@ -0,0 +1,178 @@
+from collections import OrderedDict
+from typing import Optional
+import gzip
+import hashlib
+import os
+import threading
+import anyio
+from app.metrics import record_cache
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# gzip / brotli response compression.
+#
+# The encoding is negotiated from Accept-Encoding (brotli preferred). Bodies under
+# COMPRESSION_MIN_SIZE, non-text content types, already-encoded and streamed
+# responses pass through untouched. Compressed bodies are kept in a small LRU
+# keyed by a hash of the uncompressed body, so a hot payload (the same feed page
+# served to many clients) is compressed once, not on every request.
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# 4-5 is the usual sweet spot for on-the-fly brotli; 11 is for static assets
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESSION_CACHE_ENTRIES = int(os.getenv("COMPRESSION_CACHE_ENTRIES", "256"))
+# Bodies this large are compressed in a worker thread instead of on the event loop
+COMPRESSION_THREAD_THRESHOLD = int(os.getenv("COMPRESSION_THREAD_THRESHOLD", str(128 * 1024)))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported encoding the client accepts (q > 0), brotli first"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class CompressedBodyCache:
+    """Bounded LRU of compressed bodies keyed by (body digest, encoding)"""
+
+    def __init__(self, max_entries: int = COMPRESSION_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(body: bytes, encoding: str):
+        return hashlib.blake2b(body, digest_size=16).digest(), encoding
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+        record_cache("compression", compressed is not None)
+        return compressed
+
+    def put(self, key, compressed: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = compressed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+body_cache = CompressedBodyCache()
+
+async def compress_cached(body: bytes, encoding: str) -> bytes:
+    key = body_cache.key(body, encoding)
+    compressed = body_cache.get(key)
+    if compressed is None:
+        if len(body) >= COMPRESSION_THREAD_THRESHOLD:
+            compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+        else:
+            compressed = compress(body, encoding)
+        body_cache.put(key, compressed)
+    return compressed
+
+# ============= MIDDLEWARE =============
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = _header(scope.get("headers", ()), b"accept-encoding")
+        encoding = choose_encoding(accept.decode("latin-1")) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+                if _header(headers, b"content-encoding") or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] != "http.response.body":
+                # zerocopysend / pathsend: the body never passes through here
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            passthrough = True
+            body = message.get("body", b"")
+            if message.get("more_body") or len(body) < self.min_size:
+                # Streamed or small: not worth buffering/compressing
+                await send(start)
+                await send(message)
+                return
+
+            compressed = await compress_cached(body, encoding)
+            headers = [(k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            vary = _header(headers, b"vary")
+            if vary is None:
+                headers.append((b"vary", b"Accept-Encoding"))
+            elif b"accept-encoding" not in vary.lower():
+                headers = [(k, v) for k, v in headers if k.lower() != b"vary"]
+                headers.append((b"vary", vary + b", Accept-Encoding"))
+            start["headers"] = headers
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
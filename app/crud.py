@@ -1,12 +1,18 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session, selectinload
 from app import models, schemas
+from app.database import read_only
+from app.metrics import NOTIFICATIONS_PENDING
+from app.services import media_deletion
 from typing import List, Optional
 from datetime import datetime
 
 # ============= USER CRUD =============
+@read_only
 def get_user_by_firebase_uid(db: Session, firebase_uid: str):
     return db.query(models.User).filter(models.User.firebase_uid == firebase_uid).first()
 
+@read_only
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
@@ -21,6 +27,7 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+@read_only
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
@@ -40,6 +47,7 @@ def update_user_profile(db: Session, user_id: int, updates: dict):
     db.refresh(user)
     return user
 
+@read_only
 def get_user_profile_stats(db: Session, user_id: int):
     """Get user profile statistics"""
     posts_count = db.query(models.Post).filter(models.Post.user_id == user_id).count()
@@ -55,9 +63,11 @@ def get_user_profile_stats(db: Session, user_id: int):
     }
 
 # ============= COMMUNITY CRUD =============
+@read_only
 def get_communities(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Community).offset(skip).limit(limit).all()
 
+@read_only
 def get_community(db: Session, community_id: int):
     return db.query(models.Community).filter(models.Community.id == community_id).first()
 
@@ -73,30 +83,70 @@ def create_community(db: Session, name: str, description: str, created_by: int):
     return db_community
 
 # ============= POST CRUD =============
-def get_posts(db: Session, skip: int = 0, limit: int = 100, community_id: Optional[int] = None):
-    query = db.query(models.Post)
-    if community_id:
-        query = query.filter(models.Post.community_id == community_id)
-    posts = query.order_by(models.Post.created_at.desc()).offset(skip).limit(limit).all()
-    
-    # Add reactions and comments count to each post
-    for post in posts:
-        post.reactions_count = get_post_reactions_count(db, post.id)
-        post.comments_count = db.query(models.Comment).filter(models.Comment.post_id == post.id).count()
+def _reactions_count_column():
+    return select(func.count(models.PostReaction.id)).where(
+        models.PostReaction.post_id == models.Post.id
+    ).correlate(models.Post).scalar_subquery()
+
+def _comments_count_column():
+    return select(func.count(models.Comment.id)).where(
+        models.Comment.post_id == models.Post.id
+    ).correlate(models.Post).scalar_subquery()
+
+def posts_with_counts():
+    """Select posts together with their reaction and comment counts in one query"""
+    return select(
+        models.Post,
+        _reactions_count_column().label("reactions_count"),
+        _comments_count_column().label("comments_count")
+    ).options(
+        selectinload(models.Post.author),
+        selectinload(models.Post.community)
+    )
+
+def attach_counts(rows):
+    """Turn (post, reactions_count, comments_count) rows into posts carrying the counts"""
+    posts = []
+    for post, reactions_count, comments_count in rows:
+        post.reactions_count = reactions_count
+        post.comments_count = comments_count
         if post.is_anonymous is None:
             post.is_anonymous = False
+        posts.append(post)
     return posts
 
+@read_only
+def get_posts(db: Session, skip: int = 0, limit: int = 100, community_id: Optional[int] = None):
+    query = posts_with_counts()
+    if community_id:
+        query = query.where(models.Post.community_id == community_id)
+    query = query.order_by(models.Post.created_at.desc()).offset(skip).limit(limit)
+    return attach_counts(db.execute(query).all())
+
+@read_only
 def get_post(db: Session, post_id: int):
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if post:
-        # Add reactions count
-        post.reactions_count = get_post_reactions_count(db, post_id)
-        # Add comments count
-        post.comments_count = db.query(models.Comment).filter(models.Comment.post_id == post_id).count()
-        if post.is_anonymous is None:
-            post.is_anonymous = False
-    return post
+    posts = attach_counts(db.execute(posts_with_counts().where(models.Post.id == post_id)).all())
+    return posts[0] if posts else None
+
+def post_version_query(post_id: int):
+    """One row with everything a post's ETag depends on (see etags.post_version)"""
+    return select(
+        models.Post.id,
+        func.coalesce(models.Post.updated_at, models.Post.created_at),
+        _reactions_count_column(),
+        _comments_count_column(),
+        models.User.updated_at,
+        models.Community.updated_at
+    ).outerjoin(
+        models.User, models.User.id == models.Post.user_id
+    ).outerjoin(
+        models.Community, models.Community.id == models.Post.community_id
+    ).where(models.Post.id == post_id)
+
+@read_only
+def get_post_version(db: Session, post_id: int):
+    row = db.execute(post_version_query(post_id)).first()
+    return tuple(row) if row else None
 
 def create_post(db: Session, post: schemas.PostCreate, user_id: int):
     db_post = models.Post(
@@ -116,21 +166,16 @@ def create_post(db: Session, post: schemas.PostCreate, user_id: int):
 def delete_post(db: Session, post_id: int):
     post = db.query(models.Post).filter(models.Post.id == post_id).first()
     if post:
-        # Store media URLs before deleting
-        media_urls = {
-            'image_url': post.image_url,
-            'video_url': post.video_url
-        }
-        
-        # Delete post from database
+        # Delete post from database; its files are destroyed in the background once this commits
         db.delete(post)
+        media_deletion.enqueue(db, "image", post.image_url)
+        media_deletion.enqueue(db, "video", post.video_url)
         db.commit()
-        
-        # Return media URLs so we can delete them from Cloudinary
-        return media_urls
-    return None
+        return True
+    return False
 
 # ============= COMMENT CRUD =============
+@read_only
 def get_comments(db: Session, post_id: int):
     return db.query(models.Comment).filter(models.Comment.post_id == post_id).order_by(models.Comment.created_at.asc()).all()
 
@@ -146,37 +191,27 @@ def create_comment(db: Session, comment: schemas.CommentCreate, post_id: int, us
     return db_comment
 
 # ============= HOTLINE CRUD =============
+@read_only
 def get_hotlines(db: Session, country: Optional[str] = None):
     query = db.query(models.Hotline)
     if country:
         query = query.filter(models.Hotline.country == country)
     return query.all()
 
+@read_only
 def get_user_posts(db: Session, user_id: int):
-    posts = db.query(models.Post).filter(models.Post.user_id == user_id).order_by(models.Post.created_at.desc()).all()
-    
-    # Add reactions and comments count to each post
-    for post in posts:
-        post.reactions_count = get_post_reactions_count(db, post.id)
-        post.comments_count = db.query(models.Comment).filter(models.Comment.post_id == post.id).count()
-        if post.is_anonymous is None:
-            post.is_anonymous = False
-    return posts
+    query = posts_with_counts().where(models.Post.user_id == user_id).order_by(models.Post.created_at.desc())
+    return attach_counts(db.execute(query).all())
 
 # ============= SEARCH FUNCTIONS =============
+@read_only
 def search_posts(db: Session, query: str, skip: int = 0, limit: int = 50):
-    posts = db.query(models.Post).filter(
+    statement = posts_with_counts().where(
         models.Post.title.ilike(f'%{query}%') | models.Post.content.ilike(f'%{query}%')
-    ).order_by(models.Post.created_at.desc()).offset(skip).limit(limit).all()
-    
-    # Add reactions and comments count to each post
-    for post in posts:
-        post.reactions_count = get_post_reactions_count(db, post.id)
-        post.comments_count = db.query(models.Comment).filter(models.Comment.post_id == post.id).count()
-        if post.is_anonymous is None:
-            post.is_anonymous = False
-    return posts
+    ).order_by(models.Post.created_at.desc()).offset(skip).limit(limit)
+    return attach_counts(db.execute(statement).all())
 
+@read_only
 def search_communities(db: Session, query: str):
     return db.query(models.Community).filter(
         models.Community.name.ilike(f'%{query}%') | models.Community.description.ilike(f'%{query}%')
@@ -207,9 +242,11 @@ def add_reaction(db: Session, post_id: int, user_id: int, reaction_type: str = "
         db.refresh(reaction)
         return reaction
 
+@read_only
 def get_post_reactions_count(db: Session, post_id: int):
     return db.query(models.PostReaction).filter(models.PostReaction.post_id == post_id).count()
 
+@read_only
 def has_user_reacted(db: Session, post_id: int, user_id: int):
     reaction = db.query(models.PostReaction).filter(
         models.PostReaction.post_id == post_id,
@@ -229,6 +266,7 @@ def promote_user(db: Session, user_id: int, role: str):
         return user
     return None
 
+@read_only
 def get_all_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.User).offset(skip).limit(limit).all()
 
@@ -253,6 +291,7 @@ def create_report(db: Session, reported_by: int, target_type: str, target_id: in
     db.refresh(report)
     return report
 
+@read_only
 def get_reports(db: Session, status: str = None):
     query = db.query(models.Report)
     if status:
@@ -309,11 +348,13 @@ def submit_doctor_verification(
     db.refresh(verification)
     return verification
 
+@read_only
 def get_pending_verifications(db: Session):
     return db.query(models.DoctorVerification).filter(
         models.DoctorVerification.status == 'pending'
     ).order_by(models.DoctorVerification.submitted_at.desc()).all()
 
+@read_only
 def get_all_verifications(db: Session):
     return db.query(models.DoctorVerification).order_by(
         models.DoctorVerification.submitted_at.desc()
@@ -359,6 +400,7 @@ def reject_doctor_verification(db: Session, verification_id: int, admin_id: int,
     db.refresh(verification)
     return verification
 
+@read_only
 def get_user_verification(db: Session, user_id: int):
     return db.query(models.DoctorVerification).filter(
         models.DoctorVerification.user_id == user_id
@@ -388,11 +430,13 @@ def remove_community_moderator(db: Session, community_id: int, user_id: int):
         return True
     return False
 
+@read_only
 def get_community_moderators(db: Session, community_id: int):
     return db.query(models.CommunityModerator).filter(
         models.CommunityModerator.community_id == community_id
     ).all()
 
+@read_only
 def is_community_moderator(db: Session, community_id: int, user_id: int):
     moderator = db.query(models.CommunityModerator).filter(
         models.CommunityModerator.community_id == community_id,
@@ -400,6 +444,7 @@ def is_community_moderator(db: Session, community_id: int, user_id: int):
     ).first()
     return moderator is not None
 
+@read_only
 def get_user_moderated_communities(db: Session, user_id: int):
     return db.query(models.CommunityModerator).filter(
         models.CommunityModerator.user_id == user_id
@@ -439,6 +484,7 @@ def toggle_comment_reaction(db: Session, comment_id: int, user_id: int, reaction
         db.refresh(reaction)
         return reaction
 
+@read_only
 def get_comment_reactions_count(db: Session, comment_id: int):
     """Get like and dislike counts for a comment"""
     likes = db.query(models.CommentReaction).filter(
@@ -453,6 +499,29 @@ def get_comment_reactions_count(db: Session, comment_id: int):
     
     return {"likes": likes, "dislikes": dislikes}
 
+@read_only
+def get_comment_reactions_counts(db: Session, comment_ids: List[int]):
+    """Get like and dislike counts for many comments in a single grouped query"""
+    counts = {comment_id: {"likes": 0, "dislikes": 0} for comment_id in comment_ids}
+    if not comment_ids:
+        return counts
+
+    rows = db.query(
+        models.CommentReaction.comment_id,
+        models.CommentReaction.reaction_type,
+        func.count(models.CommentReaction.id)
+    ).filter(
+        models.CommentReaction.comment_id.in_(comment_ids)
+    ).group_by(models.CommentReaction.comment_id, models.CommentReaction.reaction_type).all()
+
+    for comment_id, reaction_type, count in rows:
+        if reaction_type == "like":
+            counts[comment_id]["likes"] = count
+        elif reaction_type == "dislike":
+            counts[comment_id]["dislikes"] = count
+    return counts
+
+@read_only
 def get_user_comment_reaction(db: Session, comment_id: int, user_id: int):
     """Get user's reaction on a comment"""
     reaction = db.query(models.CommentReaction).filter(
@@ -462,22 +531,22 @@ def get_user_comment_reaction(db: Session, comment_id: int, user_id: int):
     
     return reaction.reaction_type if reaction else None
 
-# Update get_comments to include nested replies
+@read_only
 def get_comments_with_replies(db: Session, post_id: int):
-    """Get comments with their replies and reaction counts"""
-    # Get all comments for the post
-    all_comments = db.query(models.Comment).filter(
+    """Get parent comments paired with their replies, authors eager-loaded"""
+    all_comments = db.query(models.Comment).options(
+        selectinload(models.Comment.author)
+    ).filter(
         models.Comment.post_id == post_id
     ).order_by(models.Comment.created_at.asc()).all()
     
-    # Separate parent comments and replies
-    parent_comments = [c for c in all_comments if c.parent_id is None]
-    
-    # Build comment tree
-    for comment in parent_comments:
-        comment.replies = [c for c in all_comments if c.parent_id == comment.id]
+    # Build the comment tree in memory instead of lazy-loading each comment's replies
+    replies = {}
+    for c in all_comments:
+        if c.parent_id is not None:
+            replies.setdefault(c.parent_id, []).append(c)
     
-    return parent_comments
+    return [(c, replies.get(c.id, [])) for c in all_comments if c.parent_id is None]
 
 # ============= NOTIFICATION PREFERENCE CRUD =============
 def get_or_create_notification_preferences(db: Session, user_id: int):
@@ -551,6 +620,7 @@ def create_notification(
     return notification
 
 
+@read_only
 def get_user_notifications(db: Session, user_id: int, skip: int = 0, limit: int = 50):
     """Get user's notifications"""
     return db.query(models.Notification).filter(
@@ -558,6 +628,7 @@ def get_user_notifications(db: Session, user_id: int, skip: int = 0, limit: int
     ).order_by(models.Notification.created_at.desc()).offset(skip).limit(limit).all()
 
 
+@read_only
 def get_unread_notifications_count(db: Session, user_id: int):
     """Get count of unread notifications"""
     return db.query(models.Notification).filter(
@@ -639,6 +710,7 @@ def unfollow_community(db: Session, community_id: int, user_id: int):
     return False
 
 
+@read_only
 def is_following_community(db: Session, community_id: int, user_id: int):
     """Check if user is following a community"""
     follower = db.query(models.CommunityFollower).filter(
@@ -648,6 +720,7 @@ def is_following_community(db: Session, community_id: int, user_id: int):
     return follower is not None
 
 
+@read_only
 def get_community_followers(db: Session, community_id: int):
     """Get all followers of a community"""
     return db.query(models.CommunityFollower).filter(
@@ -813,9 +886,11 @@ def create_post(db: Session, post: schemas.PostCreate, user_id: int):
         author = db.query(models.User).filter(models.User.id == user_id).first()
         community = db.query(models.Community).filter(models.Community.id == post.community_id).first()
         
-        for follower in followers:
-            # Don't notify the author
-            if follower.user_id != user_id:
+        recipients = [f for f in followers if f.user_id != user_id]  # Don't notify the author
+        pending = len(recipients)
+        NOTIFICATIONS_PENDING.inc(amount=pending)
+        try:
+            for follower in recipients:
                 create_notification(
                     db=db,
                     user_id=follower.user_id,
@@ -826,6 +901,10 @@ def create_post(db: Session, post: schemas.PostCreate, user_id: int):
                     target_id=db_post.id,
                     actor_id=user_id
                 )
+                pending -= 1
+                NOTIFICATIONS_PENDING.dec()
+        finally:
+            NOTIFICATIONS_PENDING.dec(amount=pending)
     
     return db_post
 
@@ -857,13 +936,34 @@ def leave_community(db: Session, community_id: int, user_id: int):
         return True
     return False
 
+@read_only
 def is_community_member(db: Session, community_id: int, user_id: int):
     return db.query(models.CommunityMember).filter(
         models.CommunityMember.community_id == community_id,
         models.CommunityMember.user_id == user_id
     ).first() is not None
 
+@read_only
 def get_community_members_count(db: Session, community_id: int):
     return db.query(models.CommunityMember).filter(
         models.CommunityMember.community_id == community_id
-    ).count()
\ No newline at end of file
+    ).count()
+
+# Direct Upload Functions
+@read_only
+def get_media_upload(db: Session, public_id: str):
+    return db.query(models.MediaUpload).filter(models.MediaUpload.public_id == public_id).first()
+
+def create_media_upload(db: Session, user_id: int, kind: str, public_id: str, url: str, format: str, bytes: Optional[int]):
+    upload = models.MediaUpload(
+        user_id=user_id,
+        kind=kind,
+        public_id=public_id,
+        url=url,
+        format=format,
+        bytes=bytes
+    )
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    return upload
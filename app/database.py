@@ -1,24 +1,183 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from contextvars import ContextVar
+import functools
+import inspect
+import itertools
 import os
+import time
 from dotenv import load_dotenv
 load_dotenv()
 
 
+def _normalize_url(url: str) -> str:
+    # Fix for Railway PostgreSQL URL (uses postgresql:// instead of postgres://)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if "sqlite" in url else {}
+
 # Get database URL from environment variable or use SQLite for local dev
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ahkili.db")
+DATABASE_URL = _normalize_url(os.getenv("DATABASE_URL", "sqlite:///./ahkili.db"))
 
-# Fix for Railway PostgreSQL URL (uses postgresql:// instead of postgres://)
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+# Optional comma-separated list of read replicas, e.g.
+# DATABASE_READ_URLS=postgresql://replica1/ahkili,postgresql://replica2/ahkili
+DATABASE_READ_URLS = [
+    _normalize_url(url.strip())
+    for url in os.getenv("DATABASE_READ_URLS", "").split(",")
+    if url.strip()
+]
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# How long a user's reads stay on the primary after they write (replica lag budget)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+engine = create_engine(DATABASE_URL, connect_args=_connect_args(DATABASE_URL))
+
+read_engines = [create_engine(url, connect_args=_connect_args(url)) for url in DATABASE_READ_URLS]
+
+# Async engine for the native async routes (asyncpg on Postgres, aiosqlite locally)
+def _async_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+async_read_engines = [create_async_engine(_async_url(url)) for url in DATABASE_READ_URLS]
+
+# ============= READ REPLICA ROUTING =============
+# Read-only CRUD functions are marked with @read_only. While one runs, statements
+# go to a replica unless the session has already written, or the request is pinned
+# to the primary because the caller wrote recently (see ReadYourWritesMiddleware).
+_read_only = ContextVar("read_only", default=False)
+_pinned_to_primary = ContextVar("pinned_to_primary", default=False)
+
+# user_id -> monotonic deadline until which that user's reads use the primary
+_recent_writers = {}
+
+def mark_user_write(user_id) -> None:
+    if user_id is None:
+        return
+    now = time.monotonic()
+    if len(_recent_writers) > 10000:
+        for key, deadline in list(_recent_writers.items()):
+            if deadline < now:
+                _recent_writers.pop(key, None)
+    _recent_writers[str(user_id)] = now + READ_YOUR_WRITES_SECONDS
+
+def wrote_recently(user_id) -> bool:
+    if user_id is None:
+        return False
+    deadline = _recent_writers.get(str(user_id))
+    if deadline is None:
+        return False
+    if deadline < time.monotonic():
+        _recent_writers.pop(str(user_id), None)
+        return False
+    return True
+
+def pin_to_primary(pinned: bool = True):
+    """Pin reads in the current context to the primary; returns a token for reset"""
+    return _pinned_to_primary.set(pinned)
+
+def unpin(token) -> None:
+    _pinned_to_primary.reset(token)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def pinned_to_primary() -> bool:
+    """True while the current request must see its own writes (skip caches too)"""
+    return _pinned_to_primary.get()
+
+def read_only(fn):
+    """Mark a CRUD function as safe to serve from a read replica"""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _read_only.reset(token)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+class RoutingSession(Session):
+    """Session that sends read-only statements to a replica, everything else to the primary"""
+    primary = engine
+    replicas = read_engines
+    is_async = False
+    _round_robin = itertools.count()
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            not self.replicas
+            or self._flushing
+            or not _read_only.get()
+            or _pinned_to_primary.get()
+            or self.info.get("wrote")
+        ):
+            return self.primary
+
+        # One replica per session so its reads share a connection and snapshot
+        replica = self.info.get("replica")
+        if replica is None:
+            replica = self.replicas[next(self._round_robin) % len(self.replicas)]
+            self.info["replica"] = replica
+        return replica
+
+class AsyncRoutingSession(RoutingSession):
+    primary = async_engine.sync_engine
+    replicas = [e.sync_engine for e in async_read_engines]
+    is_async = True
+
+@event.listens_for(RoutingSession, "after_flush")
+def _stick_to_primary(session, flush_context):
+    # Reads after this session's own writes must see them
+    session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _stick_to_primary_on_bulk_write(orm_execute_state):
+    # query.update()/delete() bypass flush but are writes all the same
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+# ============= SQLITE MODE =============
+# WAL + tuned pragmas and a serialized writer queue when running on SQLite
+# (set SQLITE_TUNING=false to get plain SQLite behaviour back)
+if DATABASE_URL.startswith("sqlite") and os.getenv("SQLITE_TUNING", "true").lower() == "true":
+    from app.sqlite_mode import configure_sqlite
+
+    configure_sqlite(
+        [engine, async_engine.sync_engine]
+        + [e for e in read_engines if e.dialect.name == "sqlite"]
+        + [e.sync_engine for e in async_read_engines if e.dialect.name == "sqlite"],
+        RoutingSession
+    )
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=RoutingSession)
+
+# expire_on_commit=False so objects stay readable after commit without lazy IO
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+    sync_session_class=AsyncRoutingSession
+)
 
 Base = declarative_base()
 
@@ -28,4 +187,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Async dependency for the async routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,63 @@
+from typing import Optional
+from fastapi import Request, Response
+import hashlib
+import os
+
+# Conditional GET: weak ETags built from row versions (updated_at, counts), never
+# from the serialized body, so a matching If-None-Match is answered with a 304
+# before any response model is built. Weak because the same version may be sent
+# gzip'd, brotli'd or plain by the compression middleware.
+
+COMMUNITIES_MAX_AGE = int(os.getenv("COMMUNITIES_MAX_AGE", "60"))
+
+# Posts can be deleted or moderated at any time: cacheable, but always revalidated
+POST_CACHE_CONTROL = "public, no-cache"
+COMMUNITY_CACHE_CONTROL = f"public, max-age={COMMUNITIES_MAX_AGE}"
+# Profiles include the email address, so shared caches must not keep them
+PROFILE_CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*version) -> str:
+    digest = hashlib.blake2b(repr(version).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as RFC 9110 requires for If-None-Match"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def conditional(request: Request, response: Response, etag: str, cache_control: str) -> Optional[Response]:
+    """
+    Return a 304 response if the client already has this version, otherwise set
+    ETag/Cache-Control on the response being built and return None.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+# ============= VERSIONS =============
+# post_version() must give the same tuple as a row of crud.post_version_query()
+
+def post_version(post) -> tuple:
+    return (
+        post.id,
+        post.updated_at or post.created_at,
+        getattr(post, "reactions_count", 0),
+        getattr(post, "comments_count", 0),
+        post.author.updated_at if post.author else None,
+        post.community.updated_at if post.community else None,
+    )
+
+def community_version(community) -> tuple:
+    return community.id, community.updated_at or community.created_at
@@ -0,0 +1,266 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from pydantic import TypeAdapter
+from sqlalchemy import event
+import importlib
+import os
+import threading
+import time
+from app import models, schemas, singleflight
+from app.database import RoutingSession, pinned_to_primary
+from app.metrics import record_cache
+
+# Cache of serialized feed pages (GET /posts/), keyed by (community_id, skip, limit).
+#
+# Pages are stored as the JSON bytes the route would have produced, together with
+# the post and author ids on them. Session events invalidate exactly the pages a
+# commit can change: a created/deleted post drops its community's pages and the
+# global feed, a reaction or comment drops the pages showing that post, and an
+# edited author or community drops the pages showing them. FEED_CACHE_TTL bounds
+# staleness for anything else (and for other workers when the backend is local).
+
+FEED_CACHE_ENABLED = os.getenv("FEED_CACHE", "true").lower() == "true"
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "30"))
+FEED_CACHE_ENTRIES = int(os.getenv("FEED_CACHE_ENTRIES", "512"))
+# "local", or "package.module:ClassName" of a FeedCacheBackend shared by all workers
+FEED_CACHE_BACKEND = os.getenv("FEED_CACHE_BACKEND", "local")
+
+PageKey = Tuple[Optional[int], int, int]
+
+class Page(NamedTuple):
+    body: bytes
+    post_ids: Set[int]
+    author_ids: Set[int]
+
+_page_adapter = TypeAdapter(List[schemas.PostDetailResponse])
+
+def page_key(community_id: Optional[int], skip: int, limit: int) -> PageKey:
+    return community_id or None, skip, limit
+
+def render_page(posts) -> Page:
+    """Serialize a feed page exactly as the route's response model would"""
+    body = _page_adapter.dump_json(_page_adapter.validate_python(posts, from_attributes=True))
+    return Page(
+        body=body,
+        post_ids={post.id for post in posts},
+        author_ids={post.user_id for post in posts if post.user_id is not None},
+    )
+
+# ============= BACKENDS =============
+class FeedCacheBackend(ABC):
+    """
+    Storage interface. A shared implementation (Redis, memcached) lets every
+    worker see the same pages and invalidations; it has to keep the post, author
+    and community indexes next to the pages so invalidate() stays precise.
+    """
+
+    @abstractmethod
+    def get(self, key: PageKey) -> Optional[bytes]:
+        """The cached page body, None if missing or expired"""
+
+    @abstractmethod
+    def set(self, key: PageKey, page: Page, ttl: float) -> None:
+        """Cache a page for ttl seconds"""
+
+    @abstractmethod
+    def invalidate(self, community_ids: Iterable = (), post_ids: Iterable[int] = (),
+                   author_ids: Iterable[int] = ()) -> None:
+        """Drop pages of these communities (None = global feed) or showing these posts/authors"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every page"""
+
+class _Entry:
+    __slots__ = ("page", "expires")
+
+    def __init__(self, page: Page, expires: float):
+        self.page = page
+        self.expires = expires
+
+class LocalFeedCache(FeedCacheBackend):
+    """Bounded in-process LRU with TTL"""
+
+    def __init__(self, max_entries: int = FEED_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[PageKey, _Entry]" = OrderedDict()
+        self._by_post: Dict[int, Set[PageKey]] = {}
+        self._by_author: Dict[int, Set[PageKey]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry.page.body
+
+    def set(self, key, page, ttl):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(page, time.monotonic() + ttl)
+            for post_id in page.post_ids:
+                self._by_post.setdefault(post_id, set()).add(key)
+            for author_id in page.author_ids:
+                self._by_author.setdefault(author_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, community_ids=(), post_ids=(), author_ids=()):
+        with self._lock:
+            keys = set()
+            communities = set(community_ids)
+            if communities:
+                # The global feed (community None) shows every community's posts
+                communities.add(None)
+                keys.update(k for k in self._entries if k[0] in communities)
+            for post_id in post_ids:
+                keys.update(self._by_post.get(post_id, ()))
+            for author_id in author_ids:
+                keys.update(self._by_author.get(author_id, ()))
+            for key in keys:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_post.clear()
+            self._by_author.clear()
+
+    def _drop(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for index, ids in ((self._by_post, entry.page.post_ids), (self._by_author, entry.page.author_ids)):
+            for i in ids:
+                keys = index.get(i)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[i]
+
+def _load_backend(spec: str) -> FeedCacheBackend:
+    if spec == "local":
+        return LocalFeedCache()
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+backend: FeedCacheBackend = _load_backend(FEED_CACHE_BACKEND)
+
+def set_backend(new_backend: FeedCacheBackend) -> None:
+    global backend
+    backend = new_backend
+
+# ============= READ PATH =============
+# Any invalidation bumps the generation; a page built across a bump may hold
+# pre-commit data, so it is returned but not stored. Threadpool threads and the
+# event loop both invalidate and store, so the bump and the invalidation, and the
+# check and the store, each happen under one lock: no bump is lost, and no store
+# lands between a bump and the invalidation it precedes.
+_generation = 0
+_generation_lock = threading.Lock()
+
+def _bypass() -> bool:
+    return not FEED_CACHE_ENABLED or pinned_to_primary()
+
+def _lookup(key: PageKey) -> Optional[bytes]:
+    body = backend.get(key)
+    if body is not None:
+        record_cache("feed", True)
+    return body
+
+def _store(key: PageKey, page: Page, generation: int) -> None:
+    with _generation_lock:
+        if generation == _generation:
+            backend.set(key, page, FEED_CACHE_TTL)
+
+# Stampede guard: concurrent misses on one key share a single rebuild through
+# singleflight; only the request that builds records the miss.
+
+def get_or_build(key: PageKey, build: Callable[[], Page]) -> bytes:
+    """Cached page body, or build it (once, however many threads ask) and cache it"""
+    if _bypass():
+        return build().body
+    body = _lookup(key)
+    if body is not None:
+        return body
+
+    def rebuild() -> bytes:
+        # A flight that finished just before this one may have stored it
+        body = _lookup(key)
+        if body is not None:
+            return body
+        record_cache("feed", False)
+        generation = _generation
+        page = build()
+        _store(key, page, generation)
+        return page.body
+
+    return singleflight.do("feed", key, rebuild)
+
+async def aget_or_build(key: PageKey, build: Callable[[], Awaitable[Page]]) -> bytes:
+    """Async get_or_build for handlers running on the event loop"""
+    if _bypass():
+        return (await build()).body
+    body = _lookup(key)
+    if body is not None:
+        return body
+
+    async def rebuild() -> bytes:
+        body = _lookup(key)
+        if body is not None:
+            return body
+        record_cache("feed", False)
+        generation = _generation
+        page = await build()
+        _store(key, page, generation)
+        return page.body
+
+    return await singleflight.ado("feed", key, rebuild)
+
+def invalidate(community_ids=(), post_ids=(), author_ids=()) -> None:
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        backend.invalidate(community_ids, post_ids, author_ids)
+
+# ============= WRITE-DRIVEN INVALIDATION =============
+def _changes(session) -> dict:
+    return session.info.setdefault("feed_changes", {"communities": set(), "posts": set(), "authors": set()})
+
+@event.listens_for(RoutingSession, "after_flush")
+def _collect_feed_changes(session, flush_context):
+    changes = None
+    for obj in (*session.new, *session.deleted):
+        if changes is None:
+            changes = _changes(session)
+        if isinstance(obj, models.Post):
+            changes["communities"].add(obj.community_id)
+            changes["posts"].add(obj.id)
+        elif isinstance(obj, (models.PostReaction, models.Comment)):
+            changes["posts"].add(obj.post_id)
+    for obj in session.dirty:
+        if not session.is_modified(obj):
+            continue
+        if isinstance(obj, models.Post):
+            _changes(session)["posts"].add(obj.id)
+        elif isinstance(obj, models.User):
+            _changes(session)["authors"].add(obj.id)
+        elif isinstance(obj, models.Community):
+            _changes(session)["communities"].add(obj.id)
+
+@event.listens_for(RoutingSession, "after_commit")
+def _apply_feed_changes(session):
+    changes = session.info.pop("feed_changes", None)
+    if changes and any(changes.values()):
+        invalidate(changes["communities"], changes["posts"], changes["authors"])
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_feed_changes(session):
+    session.info.pop("feed_changes", None)
@@ -0,0 +1,62 @@
+from typing import Dict
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: no image variants
+    Image = None
+
+# Image variants, rendered in worker processes (app/services/image_variants.py).
+#
+# Kept free of app imports so a spawned worker starts quickly. Every variant is
+# made from one decode of the original: EXIF orientation applied, first frame
+# of animations, alpha flattened onto white for JPEG.
+
+# name -> (longest side in px, format, square crop)
+VARIANTS = {
+    "thumbnail": (150, "JPEG", True),   # avatars, feed thumbnails
+    "medium": (480, "JPEG", False),     # feed cards
+    "webp": (800, "WEBP", False),       # full size, for clients that accept WebP
+}
+EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp"}
+QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+# Refuse to decode anything larger (decompression bombs); uploads are at most 5MB
+MAX_PIXELS = int(os.getenv("IMAGE_VARIANT_MAX_PIXELS", str(40_000_000)))
+
+def available() -> bool:
+    return Image is not None
+
+def _flatten(image):
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+def render_variants(source: str, out_dir: str) -> Dict[str, str]:
+    """Write every variant of the image at source into out_dir; returns name -> path"""
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    largest = max(size for size, _, _ in VARIANTS.values())
+    with Image.open(source) as original:
+        # JPEG: decode at reduced scale when the original is much larger than needed
+        original.draft("RGB", (largest, largest))
+        original.seek(0)
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    paths = {}
+    for name, (size, fmt, crop) in VARIANTS.items():
+        if crop:
+            variant = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        else:
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+        path = os.path.join(out_dir, f"{name}.{EXTENSIONS[fmt]}")
+        if fmt == "JPEG":
+            _flatten(variant).save(path, "JPEG", quality=QUALITY, optimize=True, progressive=True)
+        else:
+            variant = variant if variant.mode in ("RGB", "RGBA") else variant.convert("RGBA")
+            variant.save(path, "WEBP", quality=QUALITY, method=4)
+        paths[name] = path
+    return paths
@@ -0,0 +1,174 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from typing import Optional
+import logging
+import os
+import time
+from app import database
+from app.middleware import append_header
+
+# Per-request SQL instrumentation.
+#
+# Engine events time every statement and attribute it to the request in flight
+# (through a ContextVar, which sync routes inherit in the threadpool). At the end
+# of the request the totals go out in a Server-Timing header and a JSON log line,
+# and statements repeated N_PLUS_ONE_THRESHOLD+ times are flagged as suspected N+1.
+
+logger = logging.getLogger("app.sql")
+
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+SLOW_STATEMENTS_KEPT = 3
+# Strict mode (tests/CI): exceeding the query budget fails the request
+STRICT = os.getenv("SQL_STRICT", "false").lower() == "true"
+DEFAULT_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "50"))
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+class QueryStats:
+    __slots__ = ("count", "total_seconds", "statements", "slowest", "budget")
+
+    def __init__(self, budget: int = DEFAULT_QUERY_BUDGET):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.statements = {}  # SQL text -> times executed
+        self.slowest = []  # [(seconds, SQL text)], longest first
+        self.budget = budget
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+        if len(self.slowest) < SLOW_STATEMENTS_KEPT or seconds > self.slowest[-1][0]:
+            self.slowest.append((seconds, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOW_STATEMENTS_KEPT:]
+
+    def suspected_n_plus_one(self):
+        return [
+            {"statement": _shorten(statement), "count": count}
+            for statement, count in self.statements.items()
+            if count >= N_PLUS_ONE_THRESHOLD
+        ]
+
+    def summary(self) -> dict:
+        return {
+            "query_count": self.count,
+            "db_ms": round(self.total_seconds * 1000, 2),
+            "slowest": [
+                {"ms": round(seconds * 1000, 2), "statement": _shorten(statement)}
+                for seconds, statement in self.slowest
+            ],
+            "suspected_n_plus_one": self.suspected_n_plus_one(),
+        }
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("sql_query_stats", default=None)
+
+def _shorten(statement: str, limit: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+def query_budget(max_queries: int):
+    """Route dependency setting that route's query budget: dependencies=[Depends(query_budget(8))]"""
+    def set_budget():
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.budget = max_queries
+    return set_budget
+
+@contextmanager
+def track_queries():
+    """Collect QueryStats for a block of code outside a request (scripts, benchmarks)"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+# ============= ENGINE HOOKS =============
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    if STRICT and stats.count >= stats.budget:
+        raise QueryBudgetExceeded(
+            f"Query budget of {stats.budget} exceeded; suspected N+1: {stats.suspected_n_plus_one()}"
+        )
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    starts = conn.info.get("query_start_time")
+    if starts:
+        stats.record(statement, time.perf_counter() - starts.pop())
+
+_installed = False
+
+def install() -> None:
+    """Attach the timing hooks to every engine (idempotent)"""
+    global _installed
+    if _installed:
+        return
+    engines = [database.engine, *database.read_engines]
+    engines += [e.sync_engine for e in (database.async_engine, *database.async_read_engines)]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    _installed = True
+
+# ============= MIDDLEWARE =============
+class SQLInstrumentationMiddleware:
+    """Adds Server-Timing (db + app time, query count) and logs per-request SQL stats"""
+
+    def __init__(self, app):
+        self.app = app
+        install()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                app_ms = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'db;dur={stats.total_seconds * 1000:.2f};desc="{stats.count} queries", '
+                    f"app;dur={app_ms:.2f}"
+                )
+                append_header(message, b"server-timing", timing)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            self._log(scope, status, stats, time.perf_counter() - started)
+
+    @staticmethod
+    def _log(scope, status: int, stats: QueryStats, seconds: float) -> None:
+        suspects = stats.suspected_n_plus_one()
+        level = logging.WARNING if suspects else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        logger.log(level, "request_sql", extra={
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round(seconds * 1000, 2),
+            **stats.summary(),
+        })
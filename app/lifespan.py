@@ -0,0 +1,103 @@
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+import asyncio
+import logging
+import os
+import time
+from app import database, feed_cache, logs, metrics
+from app.services import image_variants, media_deletion, media_pool, resumable
+
+logger = logging.getLogger("app.startup")
+
+# Connections opened per engine at startup so the first requests don't pay for connects
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+# Feed page cached at startup (GET /posts/'s default limit); 0 only compiles the query
+WARMUP_FEED_LIMIT = int(os.getenv("WARMUP_FEED_LIMIT", "100"))
+
+# Startup timings, reported in the log and on GET /health
+startup_timings = {
+    "import_seconds": None,
+    "warmup_seconds": None,
+}
+
+def record_import_time(seconds: float) -> None:
+    startup_timings["import_seconds"] = round(seconds, 4)
+
+def warm_sync_pool(engine) -> None:
+    connections = [engine.connect() for _ in range(WARMUP_CONNECTIONS)]
+    try:
+        for conn in connections:
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
+
+async def warm_async_pool(engine) -> None:
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(WARMUP_CONNECTIONS)))
+
+def warm_query_cache() -> None:
+    """
+    Build the first feed page, so the feed query's compiled SQL and this worker's
+    feed cache (per process unless a shared backend is configured) are ready
+    before traffic arrives
+    """
+    from app import crud
+
+    db = database.SessionLocal()
+    try:
+        if WARMUP_FEED_LIMIT:
+            feed_cache.get_or_build(
+                feed_cache.page_key(None, 0, WARMUP_FEED_LIMIT),
+                lambda: feed_cache.render_page(crud.get_posts(db, limit=WARMUP_FEED_LIMIT)),
+            )
+        else:
+            crud.get_posts(db, limit=1)
+    finally:
+        db.close()
+
+async def warm_up() -> None:
+    configure_mappers()
+    for engine in [database.engine, *database.read_engines]:
+        warm_sync_pool(engine)
+    for engine in [database.async_engine, *database.async_read_engines]:
+        await warm_async_pool(engine)
+    warm_query_cache()
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.perf_counter()
+    try:
+        await warm_up()
+    except Exception as e:
+        # A cold pool is slower, not broken: keep booting and let requests surface DB errors
+        logger.warning("warmup_failed", extra={"error": str(e)})
+    startup_timings["warmup_seconds"] = round(time.perf_counter() - started, 4)
+    logger.info("startup", extra={"pid": os.getpid(), **startup_timings})
+
+    # Abandoned resumable uploads are removed from disk periodically
+    upload_gc = asyncio.create_task(resumable.run_garbage_collector())
+    # Files of deleted posts are destroyed at the provider in the background
+    deletions = asyncio.create_task(media_deletion.run_worker())
+    # Other gunicorn workers' scrapes include this worker's metrics
+    snapshots = asyncio.create_task(metrics.run_snapshots()) if metrics.METRICS_DIR else None
+
+    yield
+
+    upload_gc.cancel()
+    deletions.cancel()
+    if snapshots is not None:
+        snapshots.cancel()
+    # Drop queued media calls; ones already talking to the provider finish on their own
+    media_pool.shutdown()
+    image_variants.shutdown()
+
+    await database.async_engine.dispose()
+    for engine in database.async_read_engines:
+        await engine.dispose()
+    # Worker processes may exit without running atexit hooks
+    logs.shutdown()
@@ -0,0 +1,193 @@
+from contextvars import ContextVar
+from typing import Optional
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import secrets
+import sys
+import time
+import orjson
+from app.metrics import LOG_RECORDS_DROPPED
+from app.middleware import append_header
+
+# Structured, non-blocking application logs.
+#
+# Loggers under "app" (logging.getLogger("app.upload"), ...) write one JSON object
+# per line to stdout. The message is the event name and keyword fields go in
+# extra: logger.info("upload_stored", extra={"url": url, "duration_ms": 12.5}).
+# The calling thread only puts the record on a bounded queue; a background thread
+# formats and writes it, so a slow stdout never stalls a request (a full queue
+# drops records and counts them in log_records_dropped_total).
+#
+# Every record logged while a request is served carries that request's
+# correlation id (X-Request-ID, taken from the client or proxy when sent, echoed
+# in the response) and elapsed_ms since the request started; background work
+# started by a request (image variants) inherits both. Request records at
+# LOG_SAMPLE_LEVEL and below are the high-volume ones (a line per request, per
+# upload): they are kept for a LOG_SAMPLE_RATE fraction of requests, decided once
+# per request so a kept request is logged whole. Warnings, errors and records
+# outside requests (startup, background workers) are always kept.
+
+# Settings that couldn't be used as given; reported once logging is configured
+_invalid_settings = []
+
+def _level_setting(setting: str, default: str) -> int:
+    name = os.getenv(setting, default).upper()
+    level = logging.getLevelName(name)
+    if isinstance(level, int):
+        return level
+    # getLevelName() answers an unknown name with the string "Level <name>"
+    _invalid_settings.append({"setting": setting, "value": name, "using": default})
+    return logging.getLevelName(default)
+
+LOG_LEVEL = _level_setting("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_LEVEL = _level_setting("LOG_SAMPLE_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Client-supplied ids are used only if they look like ids
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+class RequestContext:
+    __slots__ = ("request_id", "started", "sampled")
+
+    def __init__(self, request_id: str, sampled: bool = True):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.sampled = sampled
+
+_context: ContextVar[Optional[RequestContext]] = ContextVar("log_request_context", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from extra
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+# ============= HANDLERS =============
+class _QueueHandler(logging.handlers.QueueHandler):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if LOG_SAMPLE_RATE < 1 and record.levelno <= LOG_SAMPLE_LEVEL:
+            context = _context.get()
+            if context is not None:
+                if not context.sampled:
+                    return False
+                record.sample_rate = LOG_SAMPLE_RATE
+        return super().filter(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # On the logging thread: capture what's only known here and leave the
+        # formatting to the writer thread
+        context = _context.get()
+        if context is not None:
+            record.request_id = context.request_id
+            record.elapsed_ms = round((time.perf_counter() - context.started) * 1000, 2)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _writer.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if _listener is None:
+            # Not started yet, or shut down: write directly
+            _writer.handle(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(())
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Waits for room instead of raising when the queue is full
+        self.queue.put(self._sentinel)
+
+_writer = logging.StreamHandler(sys.stdout)
+_writer.setFormatter(JSONFormatter())
+_handler: Optional[_QueueHandler] = None
+_listener: Optional[_QueueListener] = None
+
+def _start() -> None:
+    global _listener
+    # A fresh queue and thread: in a forked worker the parent's writer thread doesn't exist
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    listener = _QueueListener(_handler.queue, _writer)
+    listener.start()
+    _listener = listener
+
+def configure() -> None:
+    """Send the app.* loggers through the queue to the writer thread (idempotent)"""
+    global _handler
+    if _handler is not None:
+        return
+    _handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    logger = logging.getLogger("app")
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    _start()
+    if hasattr(os, "register_at_fork"):  # not on Windows, which doesn't fork
+        os.register_at_fork(after_in_child=_start)
+    atexit.register(shutdown)
+    for invalid in _invalid_settings:
+        logger.warning("invalid_log_level", extra=invalid)
+
+def shutdown() -> None:
+    """Write out queued records and stop the writer thread; later records are written directly"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+# ============= MIDDLEWARE =============
+class RequestContextMiddleware:
+    """Gives each request a correlation id and start time for its log records"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                candidate = value.decode("latin-1")
+                if _VALID_REQUEST_ID.fullmatch(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or secrets.token_hex(8)
+        token = _context.set(RequestContext(request_id, random.random() < LOG_SAMPLE_RATE))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                append_header(message, REQUEST_ID_HEADER, request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _context.reset(token)
@@ -1,13 +1,26 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import users, posts, comments, communities, reactions,admin , upload,verification ,comment_reactions , notification
-from app.database import Base, engine
-from app import models
+from app.routes import users, posts, comments, communities, reactions,admin , upload,verification ,comment_reactions , notification, async_routes, media
+from app.middleware import BodySizeLimitMiddleware, ReadYourWritesMiddleware
+from app.instrumentation import SQLInstrumentationMiddleware
+from app.compression import CompressionMiddleware
+from app import logs, metrics, profiling
+from app.lifespan import lifespan, record_import_time, startup_timings
 import os
 
 
-Base.metadata.create_all(bind=engine)
-app = FastAPI(title="Ahkili API", version="1.0.0")
+# Schema changes are applied by `python -m app.migrations` (release step), not at import.
+# The lifespan handler only warms connection pools and query caches.
+# Responses are encoded with orjson; routes returning ORM objects declare a
+# response_model so pydantic-core serializes them without jsonable_encoder.
+app = FastAPI(title="Ahkili API", version="1.0.0", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# app.* loggers write JSON lines from a background thread (print() blocked the request path)
+logs.configure()
 
 # Get allowed origins from environment or use defaults
 ALLOWED_ORIGINS = os.getenv(
@@ -18,6 +31,10 @@ ALLOWED_ORIGINS = os.getenv(
 # Add your Vercel domain once deployed
 # Example: ALLOWED_ORIGINS.append("https://ahkili.vercel.app")
 
+# Oversized uploads are refused while still arriving, before they are spooled
+# (added first so it sits inside CORS and the 413 carries CORS headers)
+app.add_middleware(BodySizeLimitMiddleware, limits=upload.BODY_LIMITS)
+
 # CORS - Allow frontend to connect
 app.add_middleware(
     CORSMiddleware,
@@ -27,6 +44,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for JSON bodies >= COMPRESSION_MIN_SIZE, hot payloads compressed once
+app.add_middleware(CompressionMiddleware)
+
+# Pins a client's reads to the primary right after it writes (no-op without replicas)
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Route latency / status / in-flight metrics (inside the SQL middleware so it sees query totals)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Per-request query count / DB time in Server-Timing and logs, with N+1 detection
+app.add_middleware(SQLInstrumentationMiddleware)
+
+# Outermost: a correlation id (X-Request-ID) and start time for every log record of the request
+app.add_middleware(logs.RequestContextMiddleware)
+
+# Native async handlers for the hot paths are registered first so they take
+# precedence over the sync ones on the same paths (ASYNC_ROUTES=false disables them)
+USE_ASYNC_ROUTES = os.getenv("ASYNC_ROUTES", "true").lower() == "true"
+if USE_ASYNC_ROUTES:
+    for router in async_routes.routers:
+        app.include_router(router)
+
 # Include routers
 app.include_router(users.router)
 app.include_router(posts.router)
@@ -38,6 +77,7 @@ app.include_router(upload.router)
 app.include_router(verification.router)
 app.include_router(comment_reactions.router)
 app.include_router(notification.router)
+app.include_router(media.router)
 
 
 
@@ -52,4 +92,18 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy", "startup": startup_timings}
+
+# Optional bearer token so the scrape endpoint isn't public
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(authorization: str = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# On-demand request profiling (admins' X-Profile header / PROFILE_SAMPLE_RATE); not installed unless configured
+profiling.install(app)
+
+record_import_time(time.perf_counter() - _import_started)
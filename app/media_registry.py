@@ -0,0 +1,215 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+import hashlib
+import os
+from sqlalchemy import event, inspect, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import feed_cache, models
+from app.database import RoutingSession, SessionLocal
+
+# Content-addressed registry of uploaded media (table media_assets).
+#
+# Every proxied upload is hashed (SHA-256) before it goes to the provider; if the
+# same bytes were uploaded before, the stored URL is returned and nothing is sent.
+# Each asset counts the posts and profile pictures pointing at its URL. The
+# count is kept by a session event in the same transaction as the write that
+# changes a reference, so the deletion queue (app/services/media_deletion.py)
+# only destroys an asset once nothing uses it. URLs that aren't registered (uploaded before the
+# registry, or signed direct uploads) are destroyed as before. Image variants
+# (app/services/image_variants.py) are recorded on the asset and copied onto the
+# posts and profiles using it.
+
+# An unreferenced asset handed out less than this long ago is kept: its uploader
+# is most likely about to attach it to a post
+MEDIA_DEDUP_GRACE = float(os.getenv("MEDIA_DEDUP_GRACE", "3600"))
+HASH_BLOCK = 1024 * 1024
+
+# Columns holding a registered media URL
+_REFERENCES = {
+    models.Post: ("image_url", "video_url"),
+    models.User: ("profile_picture_url",),
+}
+# Image URL column -> column holding a copy of that image's variants
+_VARIANT_COLUMNS = {
+    models.Post: {"image_url": "image_variants"},
+    models.User: {"profile_picture_url": "profile_picture_variants"},
+}
+
+def hash_file(f) -> str:
+    """SHA-256 of a file object, read block by block; leaves it rewound"""
+    f.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(HASH_BLOCK), b""):
+        digest.update(block)
+    f.seek(0)
+    return digest.hexdigest()
+
+def lookup(content_hash: str, kind: str) -> Optional[str]:
+    """URL of an identical earlier upload, or None"""
+    db = SessionLocal()
+    try:
+        # Touching the row first takes its lock, so a concurrent release() either sees
+        # the fresh last_used_at and keeps the asset, or has already removed the row
+        touched = db.query(models.MediaAsset).filter(
+            models.MediaAsset.content_hash == content_hash,
+            models.MediaAsset.kind == kind,
+        ).update({models.MediaAsset.last_used_at: datetime.utcnow()}, synchronize_session=False)
+        if not touched:
+            db.rollback()
+            return None
+        url = db.query(models.MediaAsset.url).filter(models.MediaAsset.content_hash == content_hash).scalar()
+        db.commit()
+        return url
+    finally:
+        db.close()
+
+def register(content_hash: str, kind: str, url: str, public_id: Optional[str] = None,
+             size: Optional[int] = None) -> str:
+    """
+    Record a new upload and return the URL to hand out. If the same content was
+    registered meanwhile (a concurrent identical upload), that URL is returned
+    and the caller should destroy its own copy.
+    """
+    db = SessionLocal()
+    try:
+        db.add(models.MediaAsset(content_hash=content_hash, kind=kind, url=url, public_id=public_id, bytes=size))
+        try:
+            db.commit()
+            return url
+        except IntegrityError:
+            db.rollback()
+        existing = db.query(models.MediaAsset.url).filter(models.MediaAsset.content_hash == content_hash).scalar()
+        return existing or url
+    finally:
+        db.close()
+
+# release() results
+RELEASED = "released"  # destroy the file now
+REFERENCED = "referenced"  # a post or profile still uses it
+RECENT = "recent"  # unreferenced, but handed out within MEDIA_DEDUP_GRACE
+
+def release(url: str) -> str:
+    """
+    Whether the asset at url can be destroyed now. A registered asset is only
+    released (and unregistered) when nothing references it and it isn't freshly
+    uploaded; an unregistered URL always can be.
+    """
+    db = SessionLocal()
+    try:
+        asset = db.query(models.MediaAsset).filter(models.MediaAsset.url == url).with_for_update().first()
+        if asset is None:
+            return RELEASED
+        if asset.ref_count > 0:
+            db.rollback()
+            return REFERENCED
+        if asset.last_used_at and asset.last_used_at > datetime.utcnow() - timedelta(seconds=MEDIA_DEDUP_GRACE):
+            db.rollback()
+            return RECENT
+        # The variants go with the original, through the deletion queue
+        discard(db, (asset.variants or {}).values())
+        db.delete(asset)
+        db.commit()
+        return RELEASED
+    finally:
+        db.close()
+
+def discard(db: Session, urls: Iterable[str]) -> None:
+    """Queue unregistered files (image variants) for deletion with the caller's transaction"""
+    for url in urls:
+        db.add(models.MediaDeletion(kind="image", url=url))
+
+# ============= VARIANTS =============
+def set_variants(url: str, variants: Dict[str, str]) -> None:
+    """Record an image's variants on its asset and on every post and profile using it"""
+    db = SessionLocal()
+    try:
+        asset = db.query(models.MediaAsset).filter(models.MediaAsset.url == url).with_for_update().first()
+        if asset is None:
+            # Released while the variants were rendered
+            discard(db, variants.values())
+            db.commit()
+            return
+        asset.variants = variants
+        now = datetime.utcnow()
+        post_ids = [post_id for (post_id,) in db.query(models.Post.id).filter(models.Post.image_url == url)]
+        if post_ids:
+            db.query(models.Post).filter(models.Post.id.in_(post_ids)).update(
+                {models.Post.image_variants: variants, models.Post.updated_at: now}, synchronize_session=False
+            )
+        db.query(models.User).filter(models.User.profile_picture_url == url).update(
+            {models.User.profile_picture_variants: variants, models.User.updated_at: now}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+    if post_ids:
+        feed_cache.invalidate(post_ids=post_ids)
+
+@event.listens_for(RoutingSession, "before_flush")
+def _copy_variants(session, flush_context, instances):
+    # A post or profile picked up a new image URL: copy that image's variants (if any yet)
+    changed = []
+    for obj in (*session.new, *session.dirty):
+        columns = _VARIANT_COLUMNS.get(type(obj))
+        if not columns:
+            continue
+        state = inspect(obj)
+        for url_attr, variants_attr in columns.items():
+            if state.pending or state.attrs[url_attr].history.has_changes():
+                changed.append((obj, variants_attr, state.dict.get(url_attr)))
+    if not changed:
+        return
+    urls = {url for _, _, url in changed if url}
+    found = {}
+    if urls:
+        found = dict(
+            session.query(models.MediaAsset.url, models.MediaAsset.variants).filter(models.MediaAsset.url.in_(urls))
+        )
+    for obj, variants_attr, url in changed:
+        setattr(obj, variants_attr, found.get(url))
+
+# ============= REFERENCE COUNTING =============
+def _loaded(obj, attr: str) -> Optional[str]:
+    # Never lazy-load here; an unloaded column can't have been changed in this flush
+    return inspect(obj).dict.get(attr)
+
+@event.listens_for(RoutingSession, "after_flush")
+def _count_references(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        for attr in _REFERENCES.get(type(obj), ()):
+            if _loaded(obj, attr):
+                deltas[_loaded(obj, attr)] += 1
+    for obj in session.deleted:
+        for attr in _REFERENCES.get(type(obj), ()):
+            if _loaded(obj, attr):
+                deltas[_loaded(obj, attr)] -= 1
+    for obj in session.dirty:
+        attrs = _REFERENCES.get(type(obj))
+        if not attrs or not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        for attr in attrs:
+            history = state.attrs[attr].history
+            if not history.has_changes():
+                continue
+            for url in history.added:
+                if url:
+                    deltas[url] += 1
+            for url in history.deleted:
+                if url:
+                    deltas[url] -= 1
+
+    deltas = {url: delta for url, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Same connection and transaction as the flush: the count commits or rolls back with it
+    connection = session.connection()
+    for url, delta in deltas.items():
+        connection.execute(
+            update(models.MediaAsset.__table__)
+            .where(models.MediaAsset.__table__.c.url == url)
+            .values(ref_count=models.MediaAsset.__table__.c.ref_count + delta)
+        )
@@ -0,0 +1,354 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+import weakref
+import anyio
+import orjson
+from app import database, instrumentation
+
+logger = logging.getLogger("app.metrics")
+
+# Prometheus-style metrics, rendered in the text exposition format on GET /metrics.
+#
+# Collection is lock-free on the hot path: every thread (the event loop and each
+# threadpool worker) updates its own shard, and a scrape sums the shards. The
+# only lock is taken once per thread, the first time it records a metric (and
+# once more when the thread exits and its shard is folded into the totals).
+#
+# Under gunicorn (METRICS_DIR set by gunicorn.conf.py) every worker process has
+# its own metrics. Each sample is then labelled with the worker's pid, workers
+# write their samples to METRICS_DIR every METRICS_SNAPSHOT_INTERVAL seconds, and
+# a scrape, whichever worker answers it, returns its own live samples plus the
+# other workers' latest snapshots. A recycled worker's series end with it.
+
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "5"))
+
+Labels = Tuple[str, ...]
+
+class _ThreadSentinel:
+    """Lives in a thread's locals, so it is freed when the thread exits"""
+
+class _Shards:
+    """
+    Per-thread shards. Worker threads come and go (anyio retires idle ones after
+    10s, media pools start their own), so when a thread exits its shard is
+    folded into a base total: the shard count stays bounded by the live threads.
+    """
+
+    def __init__(self, fold: Callable[[dict, dict], None]):
+        self._local = threading.local()
+        self._all: Dict[int, dict] = {}
+        self._base = {}
+        self._fold = fold
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+
+    def mine(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            key = next(self._keys)
+            with self._lock:
+                self._all[key] = shard
+            self._local.shard = shard
+            self._local.sentinel = sentinel = _ThreadSentinel()
+            weakref.finalize(sentinel, self._retire, key)
+        return shard
+
+    def _retire(self, key: int) -> None:
+        with self._lock:
+            shard = self._all.pop(key, None)
+            if shard:
+                self._fold(self._base, shard)
+
+    def snapshot(self):
+        with self._lock:
+            shards = [self._base, *self._all.values()]
+        # dict() copies are atomic under the GIL, so no shard is read mid-resize
+        # (folding replaces base values instead of mutating them)
+        return [dict(shard) for shard in shards]
+
+def _fold_counts(base: dict, shard: dict) -> None:
+    for labels, value in shard.items():
+        base[labels] = base.get(labels, 0) + value
+
+def _fold_rows(base: dict, shard: dict) -> None:
+    for labels, row in shard.items():
+        total = base.get(labels)
+        base[labels] = list(row) if total is None else [a + b for a, b in zip(total, row)]
+
+class _Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        _registry.append(self)
+
+    def _labels(self, values: Labels, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        if METRICS_DIR:
+            pairs.append(f'pid="{os.getpid()}"')
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def samples(self):
+        """Exposition lines for the current values"""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return lines
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._shards = _Shards(_fold_counts)
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        shard = self._shards.mine()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        totals = {}
+        for shard in self._shards.snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self):
+        return [f"{self.name}{self._labels(labels)} {_num(v)}" for labels, v in sorted(self.values().items())]
+
+class Gauge(Counter):
+    """Up/down gauge, summed across shards like a counter"""
+    type = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+class CallbackGauge(_Metric):
+    """Gauge whose values are read from a callback at scrape time"""
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames, callback: Callable[[], Dict[Labels, float]]):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def samples(self):
+        try:
+            values = self.callback()
+        except Exception:
+            return []
+        return [f"{self.name}{self._labels(labels)} {_num(v)}" for labels, v in sorted(values.items())]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._shards = _Shards(_fold_rows)
+
+    def observe(self, labels: Labels, value: float) -> None:
+        shard = self._shards.mine()
+        row = shard.get(labels)
+        if row is None:
+            # per-bucket counts (+Inf last), then sum
+            row = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def samples(self):
+        merged = {}
+        for shard in self._shards.snapshot():
+            for labels, row in shard.items():
+                total = merged.setdefault(labels, [0] * len(row))
+                for i, v in enumerate(list(row)):
+                    total[i] += v
+
+        lines = []
+        for labels, row in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                bucket_labels = self._labels(labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_num(row[-1])}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+_registry = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _num(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render() -> str:
+    others = _other_workers() if METRICS_DIR else []
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+        for snapshot in others:
+            lines.extend(snapshot.get(metric.name, ()))
+    return "\n".join(lines) + "\n"
+
+# ============= WORKER SNAPSHOTS =============
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+def write_snapshot() -> None:
+    """Publish this worker's samples for scrapes answered by the other workers"""
+    path = _snapshot_path(os.getpid())
+    partial = path + ".part"
+    with open(partial, "wb") as f:
+        f.write(orjson.dumps({metric.name: metric.samples() for metric in _registry}))
+    # Renamed into place, so readers never see half a snapshot
+    os.replace(partial, path)
+
+def remove_snapshot(pid: int) -> None:
+    try:
+        os.unlink(_snapshot_path(pid))
+    except FileNotFoundError:
+        pass
+
+def _other_workers() -> List[dict]:
+    own = f"{os.getpid()}.json"
+    snapshots = []
+    for entry in os.scandir(METRICS_DIR):
+        if not entry.name.endswith(".json") or entry.name == own:
+            continue
+        try:
+            with open(entry.path, "rb") as f:
+                snapshots.append(orjson.loads(f.read()))
+        except FileNotFoundError:
+            continue  # the worker exited meanwhile
+    return snapshots
+
+async def run_snapshots() -> None:
+    """Lifespan task: keep this worker's snapshot fresh while it runs, remove it on shutdown"""
+    try:
+        while True:
+            try:
+                await anyio.to_thread.run_sync(write_snapshot)
+            except Exception as e:
+                logger.warning("metrics_snapshot_failed", extra={"error": str(e)})
+            await asyncio.sleep(METRICS_SNAPSHOT_INTERVAL)
+    finally:
+        remove_snapshot(os.getpid())
+
+# ============= HTTP =============
+REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+# ============= DATABASE =============
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed, by route", ("route",))
+DB_SECONDS = Counter("db_query_seconds_total", "Time spent in SQL statements, by route", ("route",))
+
+def _pool_stats() -> Dict[Labels, float]:
+    engines = {"primary": database.engine, "async_primary": database.async_engine.sync_engine}
+    for i, e in enumerate(database.read_engines):
+        engines[f"replica{i}"] = e
+    for i, e in enumerate(database.async_read_engines):
+        engines[f"async_replica{i}"] = e.sync_engine
+
+    values = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        for stat in ("size", "checkedout", "checkedin", "overflow"):
+            fn = getattr(pool, stat, None)
+            if fn is not None:
+                values[(name, stat)] = fn()
+    return values
+
+CallbackGauge("db_pool_connections", "Connection pool state per engine", ("engine", "state"), _pool_stats)
+
+# ============= CACHES =============
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result", ("cache", "result"))
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc((cache, "hit" if hit else "miss"))
+
+def _cache_hit_ratios() -> Dict[Labels, float]:
+    totals = {}
+    for (cache, result), count in CACHE_REQUESTS.values().items():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (count if result == "hit" else 0), lookups + count)
+    return {(cache,): round(hits / lookups, 4) for cache, (hits, lookups) in totals.items() if lookups}
+
+CallbackGauge("cache_hit_ratio", "Cache hits / lookups since process start", ("cache",), _cache_hit_ratios)
+
+# ============= REQUEST COALESCING =============
+SINGLEFLIGHT_EXECUTIONS = Counter("singleflight_executions_total", "Coalescable reads that ran the computation themselves", ("group",))
+SINGLEFLIGHT_COALESCED = Counter("singleflight_coalesced_total", "Reads that shared an identical in-flight computation", ("group",))
+
+# ============= BACKGROUND WORK =============
+MEDIA_QUEUE_DEPTH = Gauge("media_queue_depth", "Media provider calls waiting for a worker", ("kind",))
+MEDIA_QUEUE_WAIT_SECONDS = Histogram("media_queue_wait_seconds", "Time media provider calls spent waiting for a worker", ("kind",))
+MEDIA_CALL_SECONDS = Histogram(
+    "media_call_duration_seconds", "Media provider call latency", ("kind",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+MEDIA_CALLS = Counter("media_calls_total", "Media provider calls by outcome (ok, error, timeout, rejected)", ("kind", "outcome"))
+MEDIA_DELETIONS = Counter(
+    "media_deletions_total", "Queued media deletions by outcome (deleted, kept, retried, failed)", ("kind", "outcome")
+)
+IMAGE_VARIANT_JOBS = Counter("image_variant_jobs_total", "Image variant jobs by outcome (ok, error, skipped)", ("outcome",))
+IMAGE_VARIANT_SECONDS = Histogram("image_variant_duration_seconds", "Time to render an image's variants in the process pool")
+NOTIFICATIONS_PENDING = Gauge("notification_queue_depth", "Notifications queued by a fan-out but not yet written")
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+# ============= MIDDLEWARE =============
+class MetricsMiddleware:
+    """Records request count, latency, in-flight and per-route SQL totals"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            # Label by route template, never the raw path, to keep cardinality bounded
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUESTS.inc((method, template, str(status)))
+            REQUEST_LATENCY.observe((method, template), time.perf_counter() - started)
+
+            stats = instrumentation.current_stats()
+            if stats is not None and stats.count:
+                DB_QUERIES.inc((template,), stats.count)
+                DB_SECONDS.inc((template,), stats.total_seconds)
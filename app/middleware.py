@@ -0,0 +1,135 @@
+from starlette.requests import HTTPConnection
+from typing import Dict
+from app import database
+import json
+import time
+
+# Pure ASGI middlewares (no BaseHTTPMiddleware task overhead on every request)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PRIMARY_COOKIE = "ahkili_primary_until"
+
+def append_header(message, name: bytes, value: str) -> None:
+    """Add a header to an http.response.start message"""
+    message["headers"] = [*message.get("headers", []), (name, value.encode("latin-1"))]
+
+class ReadYourWritesMiddleware:
+    """
+    Keep a client's reads on the primary for READ_YOUR_WRITES_SECONDS after it writes.
+
+    Writers are recognised by the user_id query parameter the API already uses,
+    and by a short-lived cookie so the guarantee also holds across workers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not database.read_engines:
+            await self.app(scope, receive, send)
+            return
+
+        conn = HTTPConnection(scope)
+        user_id = conn.query_params.get("user_id")
+
+        if scope["method"] in SAFE_METHODS:
+            pinned = database.wrote_recently(user_id) or self._cookie_valid(conn)
+            token = database.pin_to_primary(pinned)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                database.unpin(token)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                database.mark_user_write(user_id)
+                until = int(time.time() + database.READ_YOUR_WRITES_SECONDS)
+                cookie = (
+                    f"{PRIMARY_COOKIE}={until}; Max-Age={int(database.READ_YOUR_WRITES_SECONDS)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                append_header(message, b"set-cookie", cookie)
+            await send(message)
+
+        # Writes always go to the primary anyway; pin so route-level reads do too
+        token = database.pin_to_primary(True)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            database.unpin(token)
+
+    @staticmethod
+    def _cookie_valid(conn: HTTPConnection) -> bool:
+        value = conn.cookies.get(PRIMARY_COOKIE)
+        try:
+            return value is not None and int(value) >= time.time()
+        except ValueError:
+            return False
+
+class BodySizeLimitMiddleware:
+    """
+    Answer 413 as soon as a request body is known to exceed its path's limit:
+    up front from Content-Length, or the moment a chunked body crosses it. The
+    rest of the body is never read, so an oversized upload costs no more than
+    the limit in bandwidth and temp space.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = HTTPConnection(scope).headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        started = False
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request" and not started:
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    # Whatever the app does with this (FastAPI turns it into a 400) is dropped below
+                    raise ValueError("Request body too large")
+            return message
+
+        async def send_wrapper(message):
+            nonlocal started
+            if exceeded:
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, send_wrapper)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded:
+            await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit: int) -> None:
+        body = json.dumps({"detail": f"Request body too large (max {limit} bytes)"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
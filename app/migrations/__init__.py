@@ -0,0 +1,122 @@
+"""
+Versioned schema migrations.
+
+Each module in app/migrations/versions is named NNNN_description.py and defines
+an upgrade(conn) function. Applied versions are recorded in schema_migrations.
+Modules that set TRANSACTIONAL = False (e.g. CREATE INDEX CONCURRENTLY on
+Postgres) run on an autocommit connection instead of inside a transaction.
+
+    python -m app.migrations            # apply pending migrations
+    python -m app.migrations status     # list applied / pending
+"""
+import importlib
+import pkgutil
+from datetime import datetime
+from typing import List, NamedTuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from app.database import engine as default_engine
+
+# Arbitrary constant so concurrent deploys don't run migrations twice (Postgres only)
+ADVISORY_LOCK_ID = 7262451
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    module: object
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, "TRANSACTIONAL", True)
+
+def load_migrations() -> List[Migration]:
+    from app.migrations import versions
+
+    migrations = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        version, _, _ = info.name.partition("_")
+        module = importlib.import_module(f"{versions.__name__}.{info.name}")
+        migrations.append(Migration(int(version), info.name, module))
+    return sorted(migrations, key=lambda m: m.version)
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+def applied_versions(engine: Engine = default_engine) -> set:
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def _record(conn: Connection, migration: Migration) -> None:
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+        {"v": migration.version, "n": migration.name, "t": datetime.utcnow()}
+    )
+
+def upgrade(engine: Engine = default_engine) -> List[str]:
+    """Apply all pending migrations in order; returns the names applied"""
+    is_postgres = engine.dialect.name == "postgresql"
+    applied = []
+
+    with engine.connect() as lock_conn:
+        if is_postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+            lock_conn.commit()
+        try:
+            done = applied_versions(engine)
+            for migration in load_migrations():
+                if migration.version in done:
+                    continue
+
+                if migration.transactional:
+                    with engine.begin() as conn:
+                        migration.module.upgrade(conn)
+                        _record(conn, migration)
+                else:
+                    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+                    with autocommit.connect() as conn:
+                        migration.module.upgrade(conn)
+                        _record(conn, migration)
+
+                applied.append(migration.name)
+        finally:
+            if is_postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+                lock_conn.commit()
+
+    return applied
+
+def status(engine: Engine = default_engine) -> List[dict]:
+    done = applied_versions(engine)
+    return [
+        {"version": m.version, "name": m.name, "applied": m.version in done}
+        for m in load_migrations()
+    ]
+
+# ============= HELPERS FOR MIGRATION MODULES =============
+def add_column_if_missing(conn: Connection, table: str, column: str, ddl_type: str) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+def create_index(conn: Connection, name: str, table: str, columns: str) -> None:
+    """
+    Create an index if it doesn't exist. On Postgres this uses CREATE INDEX
+    CONCURRENTLY so writes aren't blocked; the migration must set TRANSACTIONAL = False.
+    """
+    if conn.dialect.name == "postgresql":
+        # A failed concurrent build leaves an INVALID index behind; drop and retry it
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"))
+    else:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
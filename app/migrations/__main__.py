@@ -0,0 +1,18 @@
+import sys
+from app import migrations
+
+command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+
+if command == "upgrade":
+    applied = migrations.upgrade()
+    if applied:
+        for name in applied:
+            print(f"✅ Applied {name}")
+    else:
+        print("Database is up to date")
+elif command == "status":
+    for m in migrations.status():
+        print(f"{'✅' if m['applied'] else '⏳'} {m['name']}")
+else:
+    print(f"Unknown command: {command} (expected 'upgrade' or 'status')")
+    sys.exit(1)
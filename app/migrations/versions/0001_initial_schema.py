@@ -0,0 +1,170 @@
+"""Baseline: create every table as defined when migrations were introduced.
+
+Existing deployments already have these tables; create_all skips them.
+"""
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, MetaData, Table, UniqueConstraint
+
+metadata = MetaData()
+
+# Frozen copy of the schema at the time of this migration, so later model
+# changes don't leak into it and can get their own migrations.
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("firebase_uid", String(50), unique=True, nullable=False, index=True),
+    Column("username", String(50), unique=True, nullable=False),
+    Column("email", String(100), unique=True, nullable=False),
+    Column("role", String(20)),
+    Column("verified", Boolean),
+    Column("created_at", DateTime),
+)
+Table(
+    "communities", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String(50), unique=True, nullable=False),
+    Column("description", Text),
+    Column("created_by", Integer, ForeignKey("users.id")),
+    Column("created_at", DateTime),
+)
+Table(
+    "posts", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, nullable=False),
+    Column("content", Text, nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("community_id", Integer, ForeignKey("communities.id")),
+    Column("image_url", String, nullable=True),
+    Column("video_url", String, nullable=True),
+    Column("is_anonymous", Boolean),
+    Column("created_at", DateTime),
+)
+Table(
+    "comments", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("post_id", Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("parent_id", Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=True),
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime),
+)
+Table(
+    "hotlines", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String(100)),
+    Column("country", String(50)),
+    Column("phone_number", String(20)),
+    Column("availability_hours", Text),
+    Column("verified", Boolean),
+)
+Table(
+    "post_reactions", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("post_id", Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("reaction_type", String(20)),
+    Column("created_at", DateTime),
+    UniqueConstraint("post_id", "user_id", name="unique_post_user_reaction"),
+)
+Table(
+    "reports", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("reported_by", Integer, ForeignKey("users.id", ondelete="SET NULL")),
+    Column("target_type", String(20)),
+    Column("target_id", Integer, nullable=False),
+    Column("reason", Text),
+    Column("status", String(20)),
+    Column("created_at", DateTime),
+    Column("resolved_by", Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+    Column("resolved_at", DateTime, nullable=True),
+)
+Table(
+    "moderation_logs", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("moderator_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("action", String(50)),
+    Column("target_type", String(20)),
+    Column("target_id", Integer),
+    Column("reason", Text),
+    Column("created_at", DateTime),
+)
+Table(
+    "doctor_verifications", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), unique=True),
+    Column("full_name", String(100), nullable=False),
+    Column("specialization", String(100), nullable=False),
+    Column("license_number", String(50), nullable=False),
+    Column("license_document_url", Text),
+    Column("clinic_address", Text),
+    Column("phone_number", String(20)),
+    Column("bio", Text),
+    Column("status", String(20)),
+    Column("submitted_at", DateTime),
+    Column("reviewed_by", Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True),
+    Column("reviewed_at", DateTime, nullable=True),
+    Column("rejection_reason", Text, nullable=True),
+)
+Table(
+    "community_moderators", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("community_id", Integer, ForeignKey("communities.id", ondelete="CASCADE")),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE")),
+    Column("assigned_by", Integer, ForeignKey("users.id", ondelete="SET NULL")),
+    Column("assigned_at", DateTime),
+    Column("permissions", String(100)),
+    UniqueConstraint("community_id", "user_id", name="unique_community_moderator"),
+)
+Table(
+    "comment_reactions", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("comment_id", Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("reaction_type", String(20)),
+    Column("created_at", DateTime),
+    UniqueConstraint("comment_id", "user_id", name="unique_comment_user_reaction"),
+)
+Table(
+    "notification_preferences", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), unique=True),
+    Column("email_notifications", Boolean),
+    Column("push_notifications", Boolean),
+    Column("comment_reactions", Boolean),
+    Column("comment_replies", Boolean),
+    Column("post_reactions", Boolean),
+    Column("new_posts", Boolean),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+Table(
+    "notifications", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("type", String(50), nullable=False),
+    Column("title", String(200), nullable=False),
+    Column("message", Text, nullable=False),
+    Column("target_type", String(20)),
+    Column("target_id", Integer),
+    Column("actor_id", Integer, ForeignKey("users.id", ondelete="CASCADE")),
+    Column("is_read", Boolean),
+    Column("created_at", DateTime),
+)
+Table(
+    "community_followers", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("community_id", Integer, ForeignKey("communities.id", ondelete="CASCADE")),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE")),
+    Column("followed_at", DateTime),
+    UniqueConstraint("community_id", "user_id", name="unique_community_follower"),
+)
+Table(
+    "community_members", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("community_id", Integer, ForeignKey("communities.id", ondelete="CASCADE")),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE")),
+    Column("joined_at", DateTime),
+    UniqueConstraint("community_id", "user_id", name="unique_community_member"),
+)
+
+def upgrade(conn):
+    metadata.create_all(bind=conn)
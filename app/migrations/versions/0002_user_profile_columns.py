@@ -0,0 +1,7 @@
+"""Profile columns on users (previously applied by hand with update_cascade.py)."""
+from app.migrations import add_column_if_missing
+
+def upgrade(conn):
+    add_column_if_missing(conn, "users", "bio", "TEXT")
+    add_column_if_missing(conn, "users", "location", "VARCHAR(100)")
+    add_column_if_missing(conn, "users", "profile_picture_url", "VARCHAR(500)")
@@ -0,0 +1,13 @@
+"""Indexes for the feed, comment thread, reaction, notification and report queries."""
+from app.migrations import create_index
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction
+TRANSACTIONAL = False
+
+def upgrade(conn):
+    create_index(conn, "ix_posts_community_id_created_at", "posts", "community_id, created_at")
+    create_index(conn, "ix_posts_user_id_created_at", "posts", "user_id, created_at")
+    create_index(conn, "ix_comments_post_id_created_at", "comments", "post_id, created_at")
+    create_index(conn, "ix_post_reactions_post_id", "post_reactions", "post_id")
+    create_index(conn, "ix_notifications_user_id_is_read_created_at", "notifications", "user_id, is_read, created_at")
+    create_index(conn, "ix_reports_status_created_at", "reports", "status, created_at")
@@ -0,0 +1,10 @@
+"""updated_at on users, posts and communities (ETag versions); backfilled from created_at."""
+from sqlalchemy import text
+from app.migrations import add_column_if_missing
+
+TABLES = ("users", "posts", "communities")
+
+def upgrade(conn):
+    for table in TABLES:
+        add_column_if_missing(conn, table, "updated_at", "TIMESTAMP")
+        conn.execute(text(f"UPDATE {table} SET updated_at = created_at WHERE updated_at IS NULL"))
@@ -0,0 +1,23 @@
+"""media_uploads: files clients uploaded straight to the storage provider."""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, MetaData, Table
+
+metadata = MetaData()
+
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True),
+)
+Table(
+    "media_uploads", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("kind", String(10), nullable=False),
+    Column("public_id", String(255), unique=True, nullable=False),
+    Column("url", String(500), nullable=False),
+    Column("format", String(10), nullable=False),
+    Column("bytes", Integer),
+    Column("created_at", DateTime),
+)
+
+def upgrade(conn):
+    metadata.tables["media_uploads"].create(bind=conn, checkfirst=True)
@@ -0,0 +1,20 @@
+"""media_assets: content-hash registry of uploaded media with reference counts."""
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table
+
+metadata = MetaData()
+
+Table(
+    "media_assets", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("content_hash", String(64), unique=True, nullable=False),
+    Column("kind", String(10), nullable=False),
+    Column("url", String(500), unique=True, nullable=False),
+    Column("public_id", String(255)),
+    Column("bytes", Integer),
+    Column("ref_count", Integer, nullable=False, server_default="0"),
+    Column("created_at", DateTime),
+    Column("last_used_at", DateTime),
+)
+
+def upgrade(conn):
+    metadata.tables["media_assets"].create(bind=conn, checkfirst=True)
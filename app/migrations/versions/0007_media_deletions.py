@@ -0,0 +1,20 @@
+"""media_deletions: queue of provider files to destroy in the background."""
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, MetaData, Table
+
+metadata = MetaData()
+
+Table(
+    "media_deletions", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("kind", String(10), nullable=False),
+    Column("url", String(500), nullable=False),
+    Column("status", String(10), nullable=False, server_default="pending"),
+    Column("attempts", Integer, nullable=False, server_default="0"),
+    Column("next_attempt_at", DateTime, nullable=False),
+    Column("last_error", Text),
+    Column("created_at", DateTime),
+    Index("ix_media_deletions_status_next_attempt_at", "status", "next_attempt_at"),
+)
+
+def upgrade(conn):
+    metadata.tables["media_deletions"].create(bind=conn, checkfirst=True)
@@ -0,0 +1,12 @@
+"""Image variant URLs on media_assets, posts and users; indexes for finding rows by image URL."""
+from app.migrations import add_column_if_missing, create_index
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction
+TRANSACTIONAL = False
+
+def upgrade(conn):
+    add_column_if_missing(conn, "media_assets", "variants", "JSON")
+    add_column_if_missing(conn, "posts", "image_variants", "JSON")
+    add_column_if_missing(conn, "users", "profile_picture_variants", "JSON")
+    create_index(conn, "ix_posts_image_url", "posts", "image_url")
+    create_index(conn, "ix_users_profile_picture_url", "users", "profile_picture_url")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey , UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey , UniqueConstraint, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -16,7 +16,14 @@ class User(Base):
     bio = Column(Text, nullable=True)  # ADD THIS
     location = Column(String(100), nullable=True)  # ADD THIS
     profile_picture_url = Column(String(500), nullable=True)
+    profile_picture_variants = Column(JSON, nullable=True)  # thumbnail/medium/webp URLs (app/services/image_variants.py)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # ETag version
+    
+    # Indexes are created by app/migrations/versions/0008_image_variants.py
+    __table_args__ = (
+        Index('ix_users_profile_picture_url', 'profile_picture_url'),
+    )
     
     # Relationships
     posts = relationship("Post", back_populates="author")
@@ -30,6 +37,7 @@ class Community(Base):
     description = Column(Text)
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # ETag version
     
     # Relationships
     posts = relationship("Post", back_populates="community")
@@ -43,9 +51,18 @@ class Post(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     community_id = Column(Integer, ForeignKey("communities.id"))
     image_url = Column(String, nullable=True)
+    image_variants = Column(JSON, nullable=True)  # thumbnail/medium/webp URLs (app/services/image_variants.py)
     video_url = Column(String, nullable=True)
     is_anonymous = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # ETag version
+    
+    # Indexes are created by app/migrations/versions/0003_hot_path_indexes.py and 0008_image_variants.py
+    __table_args__ = (
+        Index('ix_posts_community_id_created_at', 'community_id', 'created_at'),
+        Index('ix_posts_user_id_created_at', 'user_id', 'created_at'),
+        Index('ix_posts_image_url', 'image_url'),
+    )
     
     # Relationships
     author = relationship("User", back_populates="posts")
@@ -62,6 +79,10 @@ class Comment(Base):
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        Index('ix_comments_post_id_created_at', 'post_id', 'created_at'),
+    )
+    
     # Relationships
     post = relationship("Post", back_populates="comments")
     author = relationship("User", back_populates="comments")
@@ -88,6 +109,7 @@ class PostReaction(Base):
     
     __table_args__ = (
         UniqueConstraint('post_id', 'user_id', name='unique_post_user_reaction'),
+        Index('ix_post_reactions_post_id', 'post_id'),
     )
 
 class Report(Base):
@@ -102,6 +124,10 @@ class Report(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     resolved_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     resolved_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index('ix_reports_status_created_at', 'status', 'created_at'),
+    )
 
 class ModerationLog(Base):
     __tablename__ = "moderation_logs"
@@ -201,6 +227,10 @@ class Notification(Base):
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        Index('ix_notifications_user_id_is_read_created_at', 'user_id', 'is_read', 'created_at'),
+    )
+    
     # Relationships
     user = relationship("User", foreign_keys=[user_id])
     actor = relationship("User", foreign_keys=[actor_id])
@@ -236,4 +266,53 @@ class CommunityMember(Base):
     
     # Relationships
     community = relationship("Community")
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+
+class MediaUpload(Base):
+    """A file a client uploaded straight to the storage provider (POST /upload/complete)"""
+    __tablename__ = "media_uploads"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String(10), nullable=False)  # image, video
+    public_id = Column(String(255), unique=True, nullable=False)
+    url = Column(String(500), nullable=False)
+    format = Column(String(10), nullable=False)
+    bytes = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    user = relationship("User")
+
+class MediaAsset(Base):
+    """One stored file per distinct content, shared by every post/profile that uses it"""
+    __tablename__ = "media_assets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, nullable=False)  # SHA-256 of the uploaded bytes
+    kind = Column(String(10), nullable=False)  # image, video
+    url = Column(String(500), unique=True, nullable=False)
+    public_id = Column(String(255), nullable=True)
+    bytes = Column(Integer, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)  # posts/profiles pointing at url
+    variants = Column(JSON, nullable=True)  # images: thumbnail/medium/webp URLs, once generated
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow)  # last upload or dedup hit
+
+class MediaDeletion(Base):
+    """Provider file waiting to be destroyed (worked off by app/services/media_deletion.py)"""
+    __tablename__ = "media_deletions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(10), nullable=False)  # image, video
+    url = Column(String(500), nullable=False)
+    status = Column(String(10), nullable=False, default="pending")  # pending, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_media_deletions_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
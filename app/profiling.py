@@ -0,0 +1,194 @@
+from contextvars import ContextVar
+from typing import Optional
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+import anyio
+from fastapi.routing import APIRoute
+from app.middleware import append_header
+
+# On-demand profiling of single requests.
+#
+# With PROFILE_ON_REQUEST=true a request is profiled when it carries
+# "X-Profile: <admin user id>" and that user is an admin (the header of anyone
+# else is ignored). PROFILE_SAMPLE_RATE profiles a random fraction of requests.
+# The async part of the request is profiled with cProfile on the event loop
+# thread and sync endpoints get their own profiler in the threadpool thread;
+# both are merged into one .prof file in PROFILE_DIR, listed and served to
+# admins by /admin/profiles. With neither setting configured nothing is
+# installed, so there is no overhead at all.
+#
+# The event loop profiler sees everything the loop runs while the request is in
+# flight, so the profile of an async route (and the async part of any request)
+# includes other requests served concurrently. A sync endpoint's own profiler
+# only sees that request. For clean async profiles, profile on an idle instance.
+
+PROFILE_ON_REQUEST = os.getenv("PROFILE_ON_REQUEST", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ahkili-profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+ENABLED = PROFILE_ON_REQUEST or PROFILE_SAMPLE_RATE > 0
+
+class _RequestProfile:
+    __slots__ = ("loop_profiler", "thread_profilers")
+
+    def __init__(self):
+        self.loop_profiler = cProfile.Profile()
+        self.thread_profilers = []
+
+_current: ContextVar[Optional[_RequestProfile]] = ContextVar("request_profile", default=None)
+_loop_profiler_busy = False
+
+def _profile_sync_endpoint(call):
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        request_profile = _current.get()
+        if request_profile is None:
+            return call(*args, **kwargs)
+        # cProfile only sees the thread it is enabled in, so the worker gets its own
+        profiler = cProfile.Profile()
+        request_profile.thread_profilers.append(profiler)
+        profiler.enable()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profiler.disable()
+    return wrapper
+
+def install(app) -> None:
+    """Enable request profiling on app if PROFILE_ON_REQUEST or PROFILE_SAMPLE_RATE is set"""
+    if not ENABLED:
+        return
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not inspect.iscoroutinefunction(route.dependant.call):
+            route.dependant.call = _profile_sync_endpoint(route.dependant.call)
+    app.add_middleware(ProfilingMiddleware)
+
+# ============= STORAGE =============
+def _safe_name(name: str) -> str:
+    if not re.fullmatch(r"[\w.\-]+\.prof", name):
+        raise ValueError("Invalid profile name")
+    return name
+
+def save(request_profile: _RequestProfile, method: str, route: str, seconds: float) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stats = pstats.Stats(request_profile.loop_profiler)
+    for profiler in request_profile.thread_profilers:
+        stats.add(profiler)
+
+    slug = re.sub(r"[^\w]+", "-", route).strip("-") or "root"
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}_{int(time.time() * 1000) % 1000:03d}_{method}_{slug}_{int(seconds * 1000)}ms.prof"
+    stats.dump_stats(os.path.join(PROFILE_DIR, name))
+    _prune()
+    return name
+
+def _prune() -> None:
+    for old in list_profiles()[PROFILE_KEEP:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old["name"]))
+        except OSError:
+            pass
+
+def list_profiles():
+    """Stored profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.name.endswith(".prof"):
+            info = entry.stat()
+            profiles.append({"name": entry.name, "size": info.st_size, "created_at": info.st_mtime})
+    return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+def profile_path(name: str) -> str:
+    path = os.path.join(PROFILE_DIR, _safe_name(name))
+    if not os.path.isfile(path):
+        raise FileNotFoundError(name)
+    return path
+
+def render_profile(name: str, sort: str = "cumulative", limit: int = 50) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profile_path(name), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+# ============= MIDDLEWARE =============
+def _is_admin(user_id: str) -> bool:
+    """Same role check as the admin-only routes (app/routes/admin.py)"""
+    from app import crud
+    from app.database import SessionLocal
+
+    if not user_id.isdigit():
+        return False
+    db = SessionLocal()
+    try:
+        user = crud.get_user(db, int(user_id))
+        return user is not None and user.role == 'admin'
+    finally:
+        db.close()
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def _wants_profile(self, scope) -> bool:
+        if PROFILE_ON_REQUEST:
+            for key, value in scope.get("headers", ()):
+                if key == b"x-profile":
+                    return await anyio.to_thread.run_sync(_is_admin, value.decode("latin-1").strip())
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        global _loop_profiler_busy
+        # Only one cProfile can hook the event loop thread at a time
+        if scope["type"] != "http" or _loop_profiler_busy or not await self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        request_profile = _RequestProfile()
+        token = _current.set(request_profile)
+        started = time.perf_counter()
+        saved = None
+
+        def finish():
+            nonlocal saved
+            if saved is None:
+                request_profile.loop_profiler.disable()
+                saved = save(request_profile, scope["method"], _route_path(scope), time.perf_counter() - started)
+            return saved
+
+        # Hold the response start until the body is complete so the profile id can
+        # go out as a header (streamed responses are saved without the header)
+        held = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                held.append(message)
+                return
+            if held:
+                start = held.pop()
+                if message["type"] == "http.response.body" and not message.get("more_body"):
+                    append_header(start, b"x-profile-id", finish())
+                await send(start)
+            await send(message)
+
+        _loop_profiler_busy = True
+        request_profile.loop_profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+            _loop_profiler_busy = False
+            _current.reset(token)
+
+def _route_path(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope["path"]
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
 from sqlalchemy.orm import Session
-from app.database import get_db, engine, Base
-from app import models, crud, schemas
-from typing import List
+from app.database import get_db
+from app import models, crud, schemas, migrations, profiling
+from app.services import media_deletion
+from typing import List, Optional
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -13,18 +15,75 @@ def verify_admin(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=403, detail="Not authorized")
     return user
 
-@router.post("/init-db")
-def initialize_database():
-    """Initialize database tables - run this once after deployment"""
+# ============= SCHEMA MIGRATIONS =============
+@router.get("/migrations")
+def get_migrations(
+    admin_id: int = Query(..., description="Admin ID"),
+    db: Session = Depends(get_db)
+):
+    """List applied and pending schema migrations"""
+    verify_admin(admin_id, db)
+    return migrations.status()
+
+@router.post("/migrations/upgrade")
+def apply_migrations(
+    admin_id: int = Query(..., description="Admin ID"),
+    db: Session = Depends(get_db)
+):
+    """Apply pending schema migrations (normally done by the release step)"""
+    admin = verify_admin(admin_id, db)
+    if admin.role != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can run migrations")
     try:
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
-        return {
-            "success": True,
-            "message": "Database tables created successfully"
-        }
+        applied = migrations.upgrade()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "success": True,
+        "applied": applied,
+        "message": f"Applied {len(applied)} migrations"
+    }
+
+# ============= PROFILING =============
+def verify_profile_admin(admin_id: int, db: Session):
+    """Profiles show code and query details, so they are for admins only (like X-Profile)"""
+    admin = verify_admin(admin_id, db)
+    if admin.role != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can view profiles")
+    return admin
+
+@router.get("/profiles")
+def get_profiles(
+    admin_id: int = Query(..., description="Admin ID"),
+    db: Session = Depends(get_db)
+):
+    """List stored request profiles, newest first (async routes' profiles include concurrent requests)"""
+    verify_profile_admin(admin_id, db)
+    return {
+        "enabled": profiling.ENABLED,
+        "sample_rate": profiling.PROFILE_SAMPLE_RATE,
+        "profiles": profiling.list_profiles()
+    }
+
+@router.get("/profiles/{name}")
+def get_profile(
+    name: str,
+    admin_id: int = Query(..., description="Admin ID"),
+    sort: str = Query("cumulative", description="pstats sort key"),
+    limit: int = Query(50, ge=1, le=500),
+    raw: bool = Query(False, description="Download the .prof file (snakeviz, pstats)"),
+    db: Session = Depends(get_db)
+):
+    """Show a stored profile as pstats text, or download it"""
+    verify_profile_admin(admin_id, db)
+    try:
+        if raw:
+            return FileResponse(profiling.profile_path(name), media_type="application/octet-stream", filename=name)
+        return PlainTextResponse(profiling.render_profile(name, sort=sort, limit=limit))
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Invalid sort key: {sort}")
 
 @router.post("/seed-communities")
 def seed_communities(db: Session = Depends(get_db)):
@@ -197,13 +256,8 @@ def moderate_delete_post(
 ):
     verify_admin(admin_id, db)
     
-    # Delete post
-    image_url = crud.delete_post(db, post_id=post_id)
-    
-    # Delete image if exists
-    if image_url:
-        from app.services.upload import delete_image
-        delete_image(image_url)
+    # Delete post (its media is queued for deletion)
+    crud.delete_post(db, post_id=post_id)
     
     # Log the action
     crud.create_moderation_log(
@@ -217,6 +271,26 @@ def moderate_delete_post(
     
     return {"success": True, "message": "Post deleted"}
 
+# ============= MEDIA DELETION QUEUE =============
+@router.get("/media-deletions", response_model=List[schemas.MediaDeletionResponse])
+def get_failed_media_deletions(
+    admin_id: int = Query(..., description="Admin ID"),
+    db: Session = Depends(get_db)
+):
+    """Media files the background worker gave up deleting from the provider"""
+    verify_admin(admin_id, db)
+    return media_deletion.list_failed(db)
+
+@router.post("/media-deletions/retry")
+def retry_media_deletions(
+    admin_id: int = Query(..., description="Admin ID"),
+    deletion_id: Optional[int] = Query(None, description="Retry one deletion (default: all failed)"),
+    db: Session = Depends(get_db)
+):
+    verify_admin(admin_id, db)
+    count = media_deletion.retry_failed(db, deletion_id)
+    return {"success": True, "retried": count}
+
 # ============= DOCTOR VERIFICATION =============
 @router.get("/doctor-verifications", response_model=List[schemas.DoctorVerificationResponse])
 def get_doctor_verifications(
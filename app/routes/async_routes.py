@@ -0,0 +1,142 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from app import async_crud, schemas, etags, feed_cache, singleflight
+from app.database import get_async_db
+from app.routes.comments import render_thread
+from app.routes.posts import post_response, render_post
+
+# Native async versions of the hot routes (feed, post detail, comments, reactions,
+# notifications). They are mounted ahead of the sync routers in app/main.py so they
+# take over the same paths; set ASYNC_ROUTES=false to fall back to the sync handlers.
+
+posts_router = APIRouter(prefix="/posts", tags=["posts"])
+comments_router = APIRouter(prefix="/comments", tags=["comments"])
+reactions_router = APIRouter(prefix="/reactions", tags=["reactions"])
+notification_router = APIRouter(prefix="/notification", tags=["notification"])
+
+routers = [posts_router, comments_router, reactions_router, notification_router]
+
+# ============= POSTS =============
+@posts_router.get("/", response_model=List[schemas.PostDetailResponse])
+async def get_posts(
+    skip: int = 0,
+    limit: int = 100,
+    community_id: int = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    async def build():
+        posts = await async_crud.get_posts(db, skip=skip, limit=limit, community_id=community_id)
+        return feed_cache.render_page(posts)
+
+    # Served from the feed page cache; the body is produced by the same response model
+    body = await feed_cache.aget_or_build(feed_cache.page_key(community_id, skip, limit), build)
+    return Response(content=body, media_type="application/json")
+
+@posts_router.get("/{post_id}", response_model=schemas.PostDetailResponse)
+async def get_post(post_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    # Revalidation: answer from the one-row version query before loading the post
+    if request.headers.get("if-none-match"):
+        version = await async_crud.get_post_version(db, post_id)
+        if version is not None:
+            not_modified = etags.conditional(request, response, etags.make_etag(*version), etags.POST_CACHE_CONTROL)
+            if not_modified:
+                return not_modified
+
+    async def load():
+        db_post = await async_crud.get_post(db, post_id=post_id)
+        return render_post(db_post) if db_post is not None else None
+
+    rendered = await singleflight.ado("post", post_id, load)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return post_response(rendered)
+
+# ============= COMMENTS =============
+@comments_router.get("/post/{post_id}", response_model=List[schemas.CommentThreadResponse])
+async def get_comments(post_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get all comments and replies for a post"""
+    async def load():
+        if not await async_crud.post_exists(db, post_id):
+            return None
+
+        thread = await async_crud.get_comments_with_replies(db, post_id=post_id)
+
+        comment_ids = []
+        for comment, replies in thread:
+            comment_ids.append(comment.id)
+            comment_ids.extend(reply.id for reply in replies)
+        reactions = await async_crud.get_comment_reactions_counts(db, comment_ids)
+
+        return render_thread(thread, reactions)
+
+    body = await singleflight.ado("comments", post_id, load)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return Response(content=body, media_type="application/json")
+
+# ============= REACTIONS =============
+@reactions_router.post("/post/{post_id}")
+async def toggle_reaction(
+    post_id: int,
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if not await async_crud.post_exists(db, post_id):
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    await async_crud.add_reaction(db, post_id=post_id, user_id=user_id)
+
+    count = await async_crud.get_post_reactions_count(db, post_id=post_id)
+    has_reacted = await async_crud.has_user_reacted(db, post_id=post_id, user_id=user_id)
+
+    return {
+        "success": True,
+        "reactions_count": count,
+        "user_has_reacted": has_reacted
+    }
+
+@reactions_router.get("/post/{post_id}/count")
+async def get_reactions_count(post_id: int, db: AsyncSession = Depends(get_async_db)):
+    count = await async_crud.get_post_reactions_count(db, post_id=post_id)
+    return {"count": count}
+
+@reactions_router.get("/post/{post_id}/user/{user_id}")
+async def check_user_reaction(post_id: int, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    has_reacted = await async_crud.has_user_reacted(db, post_id=post_id, user_id=user_id)
+    return {"has_reacted": has_reacted}
+
+# ============= NOTIFICATIONS =============
+@notification_router.get("/notifications/{user_id}", response_model=List[schemas.NotificationResponse])
+async def get_user_notifications(
+    user_id: int,
+    skip: int = 0,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get user's notifications"""
+    return await async_crud.get_user_notifications(db, user_id, skip, limit)
+
+@notification_router.get("/notifications/{user_id}/unread/count")
+async def get_unread_notifications_count(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get count of unread notifications"""
+    count = await async_crud.get_unread_notifications_count(db, user_id)
+    return {"count": count}
+
+@notification_router.put("/notifications/{notification_id}/read")
+async def mark_notification_read(
+    notification_id: int,
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Mark a notification as read"""
+    success = await async_crud.mark_notification_as_read(db, notification_id, user_id)
+    if success:
+        return {"message": "Notification marked as read"}
+    raise HTTPException(status_code=404, detail="Notification not found")
+
+@notification_router.put("/notifications/{user_id}/read-all")
+async def mark_all_notifications_read(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Mark all user's notifications as read"""
+    await async_crud.mark_all_notifications_as_read(db, user_id)
+    return {"message": "All notifications marked as read"}
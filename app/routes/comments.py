@@ -1,67 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app import crud, schemas
+from app import crud, schemas, singleflight
 from app.database import get_db
 
 router = APIRouter(prefix="/comments", tags=["comments"])
 
-@router.get("/post/{post_id}")
+def build_thread(thread, reactions):
+    """Attach reaction counts and replies to parent comments for CommentThreadResponse"""
+    comments = []
+    for comment, replies in thread:
+        comment.reactions = reactions[comment.id]
+        for reply in replies:
+            reply.reactions = reactions[reply.id]
+        comment.thread_replies = replies
+        comments.append(comment)
+    return comments
+
+_thread_adapter = TypeAdapter(List[schemas.CommentThreadResponse])
+_comment_adapter = TypeAdapter(schemas.CommentThreadResponse)
+
+def render_thread(thread, reactions) -> bytes:
+    """JSON body of a post's comments, exactly as List[CommentThreadResponse] would serialize it"""
+    comments = build_thread(thread, reactions)
+    return _thread_adapter.dump_json(_thread_adapter.validate_python(comments, from_attributes=True))
+
+@router.get("/post/{post_id}", response_model=List[schemas.CommentThreadResponse])
 def get_comments(post_id: int, db: Session = Depends(get_db)):
     """Get all comments and replies for a post"""
-    # Check if post exists
-    post = crud.get_post(db, post_id=post_id)
-    if post is None:
+    def load():
+        # Check if post exists
+        if not db.query(crud.models.Post.id).filter(crud.models.Post.id == post_id).first():
+            return None
+
+        # Get comments paired with their replies
+        thread = crud.get_comments_with_replies(db, post_id=post_id)
+
+        # Reaction counts for every comment and reply in one query
+        comment_ids = []
+        for comment, replies in thread:
+            comment_ids.append(comment.id)
+            comment_ids.extend(reply.id for reply in replies)
+        reactions = crud.get_comment_reactions_counts(db, comment_ids)
+
+        return render_thread(thread, reactions)
+
+    # Concurrent requests for the same thread share one load and one serialization
+    body = singleflight.do("comments", post_id, load)
+    if body is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    
-    # Get comments with replies
-    comments = crud.get_comments_with_replies(db, post_id=post_id)
-    
-    # Add reaction counts to each comment
-    result = []
-    for comment in comments:
-        comment_dict = {
-            "id": comment.id,
-            "content": comment.content,
-            "user_id": comment.user_id,
-            "post_id": comment.post_id,
-            "parent_id": comment.parent_id,
-            "created_at": comment.created_at,
-            "author": {
-                "id": comment.author.id,
-                "username": comment.author.username,
-                "role": comment.author.role,
-                "verified": comment.author.verified
-            } if comment.author else None,
-            "reactions": crud.get_comment_reactions_count(db, comment.id),
-            "replies": []
-        }
-        
-        # Add replies with their reactions
-        if comment.replies:
-            for reply in comment.replies:
-                reply_dict = {
-                    "id": reply.id,
-                    "content": reply.content,
-                    "user_id": reply.user_id,
-                    "post_id": reply.post_id,
-                    "parent_id": reply.parent_id,
-                    "created_at": reply.created_at,
-                    "author": {
-                        "id": reply.author.id,
-                        "username": reply.author.username,
-                        "role": reply.author.role,
-                        "verified": reply.author.verified
-                    } if reply.author else None,
-                    "reactions": crud.get_comment_reactions_count(db, reply.id)
-                }
-                comment_dict["replies"].append(reply_dict)
-        
-        result.append(comment_dict)
-    
-    return result
+    return Response(content=body, media_type="application/json")
 
-@router.post("/post/{post_id}")
+@router.post("/post/{post_id}", response_model=schemas.CommentThreadResponse)
 def create_comment(
     post_id: int,
     comment: schemas.CommentCreate,
@@ -94,19 +85,7 @@ def create_comment(
     db.commit()
     db.refresh(db_comment)
     
-    return {
-        "id": db_comment.id,
-        "content": db_comment.content,
-        "user_id": db_comment.user_id,
-        "post_id": db_comment.post_id,
-        "parent_id": db_comment.parent_id,
-        "created_at": db_comment.created_at,
-        "author": {
-            "id": db_comment.author.id,
-            "username": db_comment.author.username,
-            "role": db_comment.author.role,
-            "verified": db_comment.author.verified
-        } if db_comment.author else None,
-        "reactions": {"likes": 0, "dislikes": 0},
-        "replies": []
-    }
\ No newline at end of file
+    # New comment: no reactions or replies yet (the response model defaults).
+    # Serialized here for the same reason as the post routes (app/routes/posts.py)
+    body = _comment_adapter.dump_json(_comment_adapter.validate_python(db_comment, from_attributes=True))
+    return Response(content=body, media_type="application/json")
\ No newline at end of file
@@ -1,22 +1,25 @@
 # app/routers/communities.py (Updated)
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
-from app import crud, schemas, models
+from app import crud, schemas, models, etags
 from app.database import get_db
 
 router = APIRouter(prefix="/communities", tags=["communities"])
 
 @router.get("/", response_model=List[schemas.CommunityResponse])
-def get_communities(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_communities(db, skip=skip, limit=limit)
+def get_communities(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    communities = crud.get_communities(db, skip=skip, limit=limit)
+    etag = etags.make_etag(*(etags.community_version(c) for c in communities))
+    return etags.conditional(request, response, etag, etags.COMMUNITY_CACHE_CONTROL) or communities
 
 @router.get("/{community_id}", response_model=schemas.CommunityResponse)
-def get_community(community_id: int, db: Session = Depends(get_db)):
+def get_community(community_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     db_community = crud.get_community(db, community_id=community_id)
     if db_community is None:
         raise HTTPException(status_code=404, detail="Community not found")
-    return db_community
+    etag = etags.make_etag(*etags.community_version(db_community))
+    return etags.conditional(request, response, etag, etags.COMMUNITY_CACHE_CONTROL) or db_community
 
 @router.post("/", response_model=schemas.CommunityResponse)
 def create_community(
@@ -0,0 +1,212 @@
+from typing import List, Optional, Tuple, Union
+from email.utils import formatdate
+from fastapi import APIRouter, HTTPException, Request, Response
+from starlette.datastructures import Headers
+import anyio
+import hashlib
+import mimetypes
+import os
+import secrets
+import stat
+from app.etags import etag_matches
+from app.services import storage
+
+# Files stored by the local storage backend (STORAGE_BACKEND=local).
+#
+# A stored file never changes (a new upload gets a new public_id), so responses
+# are cacheable for a year and revalidate with a 304. Bodies are handed to the
+# server without passing through Python where it can: zero-copy sendfile when the
+# ASGI server offers the http.response.zerocopysend extension, a path for
+# http.response.pathsend, or (MEDIA_ACCEL_REDIRECT) an X-Accel-Redirect for a
+# fronting nginx. Otherwise they are streamed in 1MB blocks. Single and
+# multipart Range requests are answered with 206 either way (pathsend only
+# carries whole files, so ranges are streamed when it is the only extension).
+#
+# MediaFileResponse is a plain Response with its own __call__: it relies on the
+# ASGI spec only, not on FileResponse internals that change between Starlette
+# releases.
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# nginx `internal` location aliased to MEDIA_ROOT, e.g. /_media
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "").rstrip("/")
+
+# ============= RANGES =============
+class RangeNotSatisfiable(Exception):
+    pass
+
+def parse_ranges(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Sorted, merged (start, end) byte ranges (end exclusive) from a Range header.
+    None when the header is malformed or not in bytes: it is then ignored and the
+    whole file is sent (RFC 9110 14.2).
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    ranges = []
+    for spec in specs.split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        first, dash, last = spec.partition("-")
+        first, last = first.strip(), last.strip()
+        if not dash or not (first or last) or not (first or "0").isdecimal() or not (last or "0").isdecimal():
+            return None
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+            if last and end <= start:
+                return None
+        else:
+            start, end = size - int(last), size  # the last N bytes
+            if start == size:
+                continue
+        if start < size:
+            ranges.append((max(start, 0), min(end, size)))
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+# ============= RESPONSE =============
+class MediaFileResponse(Response):
+    """A stored file, sent with the fastest ASGI send extension the server offers"""
+    chunk_size = 1024 * 1024
+
+    def __init__(self, path: str, stat_result: os.stat_result, headers: Optional[dict] = None):
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        super().__init__(headers=headers, media_type=media_type)
+        self.path = path
+        self.size = stat_result.st_size
+        # The same validators as Starlette's FileResponse
+        etag_base = f"{stat_result.st_mtime}-{stat_result.st_size}"
+        self.headers["content-length"] = str(self.size)
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        self.headers["etag"] = f'"{hashlib.md5(etag_base.encode(), usedforsecurity=False).hexdigest()}"'
+        self.headers["accept-ranges"] = "bytes"
+
+    def _ranges(self, request_headers: Headers) -> Optional[List[Tuple[int, int]]]:
+        if "range" not in request_headers:
+            return None
+        if_range = request_headers.get("if-range")
+        if if_range is not None and if_range not in (self.headers["etag"], self.headers["last-modified"]):
+            return None  # the client's copy is stale: send all of it
+        return parse_ranges(request_headers["range"], self.size)
+
+    def _parts(self, ranges: Optional[List[Tuple[int, int]]]) -> List[Union[bytes, Tuple[int, int]]]:
+        """The body as file ranges and, for multipart/byteranges, the bytes around them; sets the status and headers"""
+        if ranges is None:
+            return [(0, self.size)]
+        self.status_code = 206
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.headers["content-range"] = f"bytes {start}-{end - 1}/{self.size}"
+            self.headers["content-length"] = str(end - start)
+            return [(start, end)]
+
+        boundary = secrets.token_hex(16)
+        content_type = self.headers["content-type"]
+        parts = []
+        for i, (start, end) in enumerate(ranges):
+            head = (
+                f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end - 1}/{self.size}\r\n\r\n"
+            ).encode("latin-1")
+            parts.append(head if i == 0 else b"\r\n" + head)
+            parts.append((start, end))
+        parts.append(f"\r\n--{boundary}--\r\n".encode("latin-1"))
+        self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        self.headers["content-length"] = str(sum(
+            len(part) if isinstance(part, bytes) else part[1] - part[0] for part in parts
+        ))
+        return parts
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            parts = self._parts(self._ranges(Headers(scope=scope)))
+        except RangeNotSatisfiable:
+            response = Response(status_code=416, headers={"Content-Range": f"bytes */{self.size}"})
+            await response(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        extensions = scope.get("extensions") or {}
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in extensions:
+            await self._send_parts(send, parts, zerocopy=True)
+        elif "http.response.pathsend" in extensions and self.status_code == 200:
+            await send({"type": "http.response.pathsend", "path": self.path})
+        else:
+            await self._send_parts(send, parts, zerocopy=False)
+
+        if self.background is not None:
+            await self.background()
+
+    async def _send_parts(self, send, parts, zerocopy: bool) -> None:
+        async with await anyio.open_file(self.path, "rb") as f:
+            for i, part in enumerate(parts):
+                more_body = i < len(parts) - 1
+                if isinstance(part, bytes):
+                    await send({"type": "http.response.body", "body": part, "more_body": more_body})
+                    continue
+                offset, end = part
+                if zerocopy:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": f.wrapped,
+                        "offset": offset,
+                        "count": end - offset,
+                        "more_body": more_body,
+                    })
+                    continue
+                await f.seek(offset)
+                while True:
+                    chunk = await f.read(min(self.chunk_size, end - offset))
+                    offset += len(chunk)
+                    done = not chunk or offset >= end
+                    await send({"type": "http.response.body", "body": chunk, "more_body": more_body or not done})
+                    if done:
+                        break
+
+# ============= ROUTES =============
+def _stat(path: str):
+    try:
+        result = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return result if stat.S_ISREG(result.st_mode) else None
+
+@router.api_route("/v{version}/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_media(version: int, path: str, request: Request):
+    backend = storage.backend
+    if not isinstance(backend, storage.LocalStorage):
+        raise HTTPException(status_code=404, detail="Media is not served by this API")
+    file_path = backend.path(path)
+    stat_result = await anyio.to_thread.run_sync(_stat, file_path) if file_path else None
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    if MEDIA_ACCEL_REDIRECT:
+        # nginx serves the file itself (sendfile, ranges, conditional requests)
+        return Response(headers={
+            "X-Accel-Redirect": f"{MEDIA_ACCEL_REDIRECT}/{os.path.relpath(file_path, backend.root)}",
+            "Cache-Control": MEDIA_CACHE_CONTROL,
+        })
+
+    response = MediaFileResponse(file_path, stat_result=stat_result, headers={"Cache-Control": MEDIA_CACHE_CONTROL})
+    if etag_matches(request.headers.get("if-none-match"), response.headers["etag"]):
+        return Response(status_code=304, headers={
+            "ETag": response.headers["etag"],
+            "Cache-Control": MEDIA_CACHE_CONTROL,
+        })
+    return response
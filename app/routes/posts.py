@@ -1,12 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app import crud, schemas, models
+from pydantic import TypeAdapter
+from typing import List, Optional, Tuple
+from app import crud, schemas, models, etags, feed_cache, singleflight
 from app.database import get_db
-from app.services.upload import delete_image , delete_video
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
+# Sync routes serialize here and return a Response: a response_model would be
+# validated by FastAPI in a second threadpool call while the request's session
+# still holds its connection, and under load those calls wait for threads held
+# by requests that are waiting for a connection
+_post_adapter = TypeAdapter(schemas.PostDetailResponse)
+_posts_adapter = TypeAdapter(List[schemas.PostDetailResponse])
+
+def render_post(post) -> Tuple[str, bytes]:
+    """ETag and JSON body of a post, exactly as PostDetailResponse would serialize it"""
+    body = _post_adapter.dump_json(_post_adapter.validate_python(post, from_attributes=True))
+    return etags.make_etag(*etags.post_version(post)), body
+
+def render_posts(posts) -> bytes:
+    """JSON body of a list of posts, exactly as List[PostDetailResponse] would serialize it"""
+    return _posts_adapter.dump_json(_posts_adapter.validate_python(posts, from_attributes=True))
+
+def post_response(rendered: Tuple[str, bytes]) -> Response:
+    etag, body = rendered
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": etags.POST_CACHE_CONTROL},
+    )
+
 def check_post_delete_permission(post: models.Post, user_id: int, db: Session) -> bool:
     """
     Check if user can delete the post.
@@ -39,57 +63,49 @@ def check_post_delete_permission(post: models.Post, user_id: int, db: Session) -
     
     return False
 
-def serialize_post(post):
-    """Helper function to serialize post with author info"""
-    return {
-        "id": post.id,
-        "title": post.title,
-        "content": post.content,
-        "user_id": post.user_id,
-        "community_id": post.community_id,
-        "image_url": post.image_url,
-        "video_url": post.video_url,
-        "is_anonymous": post.is_anonymous if post.is_anonymous is not None else False,
-        "created_at": post.created_at,
-        "reactions_count": getattr(post, 'reactions_count', 0),
-        "comments_count": getattr(post, 'comments_count', 0),
-        "author": {
-            "id": post.author.id,
-            "username": post.author.username,
-            "role": post.author.role,
-            "verified": post.author.verified
-        } if post.author else None,
-        "community": {
-            "id": post.community.id,
-            "name": post.community.name
-        } if post.community else None
-    }
-
-@router.get("/")
+@router.get("/", response_model=List[schemas.PostDetailResponse])
 def get_posts(
     skip: int = 0,
     limit: int = 100,
     community_id: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    posts = crud.get_posts(db, skip=skip, limit=limit, community_id=community_id)
-    return [serialize_post(post) for post in posts]
+    # Served from the feed page cache; the body is produced by the same response model
+    key = feed_cache.page_key(community_id, skip, limit)
+    body = feed_cache.get_or_build(
+        key, lambda: feed_cache.render_page(crud.get_posts(db, skip=skip, limit=limit, community_id=community_id))
+    )
+    return Response(content=body, media_type="application/json")
 
-@router.get("/{post_id}")
-def get_post(post_id: int, db: Session = Depends(get_db)):
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
+@router.get("/{post_id}", response_model=schemas.PostDetailResponse)
+def get_post(post_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    # Revalidation: answer from the one-row version query before loading the post
+    if request.headers.get("if-none-match"):
+        version = crud.get_post_version(db, post_id)
+        if version is not None:
+            not_modified = etags.conditional(request, response, etags.make_etag(*version), etags.POST_CACHE_CONTROL)
+            if not_modified:
+                return not_modified
+    
+    def load():
+        db_post = crud.get_post(db, post_id=post_id)
+        return render_post(db_post) if db_post is not None else None
+
+    # Concurrent requests for the same post share one load and one serialization
+    rendered = singleflight.do("post", post_id, load)
+    if rendered is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    return serialize_post(db_post)
+    return post_response(rendered)
 
-@router.post("/")
+@router.post("/", response_model=schemas.PostDetailResponse)
 def create_post(
     post: schemas.PostCreate,
     user_id: int,
     db: Session = Depends(get_db)
 ):
     created_post = crud.create_post(db=db, post=post, user_id=user_id)
-    return serialize_post(created_post)
+    _, body = render_post(created_post)
+    return Response(content=body, media_type="application/json")
 
 @router.delete("/{post_id}")
 def delete_post(
@@ -125,25 +141,17 @@ def delete_post(
             reason=reason
         )
     
-    # Delete post and get image_url
-    # Delete post and get media URLs
-    media_urls = crud.delete_post(db, post_id=post_id)
-    
-    # Delete media from Cloudinary if exists
-    if media_urls:
-        if media_urls.get('image_url'):
-            delete_image(media_urls['image_url'])
-        if media_urls.get('video_url'):
-            delete_video(media_urls['video_url'])
+    # Delete post; its media is queued for deletion from Cloudinary in the same transaction
+    crud.delete_post(db, post_id=post_id)
     
     return {"message": "Post deleted successfully"}
 
-@router.get("/user/{user_id}")
+@router.get("/user/{user_id}", response_model=List[schemas.PostDetailResponse])
 def get_user_posts(user_id: int, db: Session = Depends(get_db)):
     posts = crud.get_user_posts(db, user_id=user_id)
-    return [serialize_post(post) for post in posts]
+    return Response(content=render_posts(posts), media_type="application/json")
 
-@router.get("/search")
+@router.get("/search", response_model=List[schemas.PostDetailResponse])
 def search_posts(
     q: str,
     skip: int = 0,
@@ -151,4 +159,4 @@ def search_posts(
     db: Session = Depends(get_db)
 ):
     posts = crud.search_posts(db, query=q, skip=skip, limit=limit)
-    return [serialize_post(post) for post in posts]
\ No newline at end of file
+    return Response(content=render_posts(posts), media_type="application/json")
\ No newline at end of file
@@ -1,8 +1,21 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.upload import upload_image
+from fastapi import APIRouter, Depends, Header, Request, UploadFile, File, HTTPException
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from app import crud, schemas
+from app.database import get_db
+from app.services import media_deletion, resumable, signed_upload
+from app.services.upload import upload_image, upload_video_file, MAX_IMAGE_BYTES, MAX_VIDEO_BYTES
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
+# Request body limits for BodySizeLimitMiddleware: the file plus room for the multipart framing
+MULTIPART_OVERHEAD = 64 * 1024
+BODY_LIMITS = {
+    "/upload/image": MAX_IMAGE_BYTES + MULTIPART_OVERHEAD,
+    "/upload/video": MAX_VIDEO_BYTES + MULTIPART_OVERHEAD,
+}
+
 @router.post("/image")
 async def upload_image_endpoint(file: UploadFile = File(...)):
     """Upload an image and return the URL"""
@@ -12,6 +25,8 @@ async def upload_image_endpoint(file: UploadFile = File(...)):
             "success": True,
             "url": url
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -25,5 +40,147 @@ async def upload_video_endpoint(file: UploadFile = File(...)):
             "success": True,
             "url": url
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ============= DIRECT UPLOADS =============
+# The client uploads straight to the storage provider; the API only signs the
+# request and records the result (see app/services/signed_upload.py)
+
+@router.post("/sign", response_model=schemas.SignedUploadResponse)
+def sign_upload(request: schemas.SignedUploadRequest, user_id: int, db: Session = Depends(get_db)):
+    """Short-lived signed parameters for uploading a file directly to the storage provider"""
+    if not crud.get_user(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        return signed_upload.signed_request(request.kind, user_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.post("/complete", response_model=schemas.MediaUploadResponse)
+def complete_upload(completion: schemas.UploadCompletion, user_id: int, db: Session = Depends(get_db)):
+    """Verify a direct upload with the provider and record its URL"""
+    # Reporting the same upload twice is harmless
+    existing = crud.get_media_upload(db, completion.public_id)
+    if existing:
+        if existing.user_id != user_id:
+            raise HTTPException(status_code=403, detail="Upload was not issued to this user")
+        return existing
+    
+    try:
+        stored = signed_upload.verify(
+            completion.kind, user_id, completion.public_id, completion.version, completion.signature
+        )
+    except signed_upload.UploadVerificationError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except signed_upload.UploadRejected as e:
+        # The file is already at the provider: remove it rather than pay for storing it
+        media_deletion.enqueue(db, completion.kind, e.url)
+        db.commit()
+        raise HTTPException(status_code=400, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return crud.create_media_upload(
+        db,
+        user_id=user_id,
+        kind=completion.kind,
+        public_id=completion.public_id,
+        url=stored["url"],
+        format=stored["format"],
+        bytes=stored["bytes"]
+    )
+
+# ============= RESUMABLE VIDEO UPLOADS =============
+# init -> PUT chunks at the reported offset (retry from GET's offset after a
+# dropped connection) -> complete. See app/services/resumable.py.
+
+def _session_response(session: resumable.UploadSession) -> dict:
+    return {
+        "session_id": session.id,
+        "offset": session.offset(),
+        "size": session.size,
+        "chunk_size": resumable.RESUMABLE_CHUNK_SIZE,
+        "expires_at": datetime.utcfromtimestamp(session.expires_at()),
+    }
+
+def _get_session(session_id: str, user_id: int) -> resumable.UploadSession:
+    try:
+        session = resumable.load(session_id)
+    except resumable.SessionNotFound:
+        session = None
+    # Someone else's session is reported the same way as a missing one
+    if session is None or session.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return session
+
+@router.post("/video/sessions", status_code=201, response_model=schemas.ResumableSessionResponse)
+def create_video_session(request: schemas.ResumableSessionCreate, user_id: int, db: Session = Depends(get_db)):
+    """Start a resumable video upload"""
+    if not crud.get_user(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    if not request.content_type.startswith('video/'):
+        raise HTTPException(status_code=400, detail="File must be a video")
+    if request.size > MAX_VIDEO_BYTES:
+        raise HTTPException(status_code=400, detail="Video too large (max 50MB)")
+    
+    session = resumable.create(user_id, request.size, request.content_type, request.filename, request.sha256)
+    return _session_response(session)
+
+@router.get("/video/sessions/{session_id}", response_model=schemas.ResumableSessionResponse)
+def get_video_session(session_id: str, user_id: int):
+    """How much of the file has been received"""
+    return _session_response(_get_session(session_id, user_id))
+
+@router.put("/video/sessions/{session_id}", response_model=schemas.ResumableSessionResponse)
+async def upload_video_chunk(
+    session_id: str,
+    offset: int,
+    user_id: int,
+    request: Request,
+    x_chunk_sha256: Optional[str] = Header(None, description="Hex SHA-256 of this chunk; a mismatch discards it")
+):
+    """Append the raw request body at offset (which must equal the session's current offset)"""
+    session = _get_session(session_id, user_id)
+    try:
+        await resumable.write_chunk(session, offset, request.stream(), x_chunk_sha256)
+    except resumable.OffsetMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
+    except resumable.SessionBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except resumable.ChunkTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except resumable.ChunkRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except resumable.SessionNotFound:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return _session_response(session)
+
+@router.post("/video/sessions/{session_id}/complete")
+async def complete_video_session(session_id: str, user_id: int):
+    """Verify the assembled file, upload it to the provider and return the URL"""
+    session = _get_session(session_id, user_id)
+    try:
+        async with resumable.completing(session) as (path, content_hash):
+            url = await upload_video_file(path, content_hash)
+    except resumable.SessionBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except resumable.ChunkRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except resumable.SessionNotFound:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return {
+        "success": True,
+        "url": url
+    }
+
+@router.delete("/video/sessions/{session_id}")
+def abort_video_session(session_id: str, user_id: int):
+    """Abandon an upload and free its disk space"""
+    resumable.discard(_get_session(session_id, user_id))
+    return {"success": True}
+
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from app import crud, schemas
+from app import crud, schemas, etags
 from app.database import get_db
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -66,6 +66,7 @@ def update_user_profile(
         bio=user.bio,
         location=user.location,
         profile_picture_url=user.profile_picture_url,
+        profile_picture_variants=user.profile_picture_variants,
         created_at=user.created_at,
         posts_count=stats['posts_count'],
         communities_count=stats['communities_count']
@@ -74,7 +75,7 @@ def update_user_profile(
     return response
 
 @router.get("/{user_id}/profile", response_model=schemas.UserProfileResponse)
-def get_user_profile(user_id: int, db: Session = Depends(get_db)):
+def get_user_profile(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get user profile with stats"""
     user = crud.get_user(db, user_id=user_id)
     if not user:
@@ -83,6 +84,12 @@ def get_user_profile(user_id: int, db: Session = Depends(get_db)):
     # Get stats
     stats = crud.get_user_profile_stats(db, user_id)
     
+    # Skip building the response if the client already has this version
+    etag = etags.make_etag(user.id, user.updated_at or user.created_at, stats['posts_count'], stats['communities_count'])
+    not_modified = etags.conditional(request, response, etag, etags.PROFILE_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
     response = schemas.UserProfileResponse(
         id=user.id,
         username=user.username,
@@ -92,6 +99,7 @@ def get_user_profile(user_id: int, db: Session = Depends(get_db)):
         bio=user.bio,
         location=user.location,
         profile_picture_url=user.profile_picture_url,
+        profile_picture_variants=user.profile_picture_variants,
         created_at=user.created_at,
         posts_count=stats['posts_count'],
         communities_count=stats['communities_count']
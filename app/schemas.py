@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
 # User schemas
 class UserCreate(BaseModel):
@@ -25,6 +25,12 @@ class UserUpdate(BaseModel):
     location: Optional[str] = None
     profile_picture_url: Optional[str] = None
 
+# Smaller renditions of an uploaded image; null until they have been generated
+class ImageVariants(BaseModel):
+    thumbnail: Optional[str] = None  # 150x150 crop
+    medium: Optional[str] = None  # fits 480x480
+    webp: Optional[str] = None  # full size, WebP
+
 class UserProfileResponse(BaseModel):
     id: int
     username: str
@@ -34,6 +40,7 @@ class UserProfileResponse(BaseModel):
     bio: Optional[str] = None
     location: Optional[str] = None
     profile_picture_url: Optional[str] = None
+    profile_picture_variants: Optional[ImageVariants] = None
     created_at: datetime
     posts_count: int = 0
     communities_count: int = 0
@@ -57,6 +64,7 @@ class PostResponse(BaseModel):
     user_id: int
     community_id: Optional[int]
     image_url: Optional[str] = None
+    image_variants: Optional[ImageVariants] = None
     video_url: Optional[str] = None
     is_anonymous: bool = False
     created_at: datetime
@@ -66,6 +74,27 @@ class PostResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AuthorSummary(BaseModel):
+    id: int
+    username: str
+    role: Optional[str] = None
+    verified: Optional[bool] = None
+    
+    class Config:
+        from_attributes = True
+
+class CommunitySummary(BaseModel):
+    id: int
+    name: str
+    
+    class Config:
+        from_attributes = True
+
+# Feed and post detail: post + author + community, read straight off the ORM object
+class PostDetailResponse(PostResponse):
+    author: Optional[AuthorSummary] = None
+    community: Optional[CommunitySummary] = None
+
 # Comment schemas
 class CommentCreate(BaseModel):
     content: str
@@ -81,6 +110,19 @@ class CommentResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CommentReactionCounts(BaseModel):
+    likes: int = 0
+    dislikes: int = 0
+
+class CommentWithAuthorResponse(CommentResponse):
+    author: Optional[AuthorSummary] = None
+    reactions: CommentReactionCounts = CommentReactionCounts()
+
+# Replies are read from comment.thread_replies: comment.replies is the ORM
+# relationship and would lazy-load (one query per comment)
+class CommentThreadResponse(CommentWithAuthorResponse):
+    replies: List[CommentWithAuthorResponse] = Field(default_factory=list, validation_alias="thread_replies")
+
 # Community schemas
 class CommunityResponse(BaseModel):
     id: int
@@ -234,4 +276,62 @@ class CommunityFollowerResponse(BaseModel):
     followed_at: datetime
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+# Direct upload schemas
+class SignedUploadRequest(BaseModel):
+    kind: Literal["image", "video"]
+
+class SignedUploadResponse(BaseModel):
+    upload_url: str
+    fields: Dict[str, str]  # posted with the file as multipart form fields
+    expires_at: datetime
+    max_bytes: int
+
+class UploadCompletion(BaseModel):
+    """The storage provider's upload response, as the client received it"""
+    kind: Literal["image", "video"]
+    public_id: str
+    version: int
+    signature: str
+
+class MediaUploadResponse(BaseModel):
+    id: int
+    kind: str
+    public_id: str
+    url: str
+    format: str
+    bytes: Optional[int]
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+# Resumable upload schemas
+class ResumableSessionCreate(BaseModel):
+    size: int = Field(gt=0)
+    content_type: str
+    filename: Optional[str] = None
+    sha256: Optional[str] = Field(default=None, pattern="^[0-9a-fA-F]{64}$")  # checked on completion
+
+class ResumableSessionResponse(BaseModel):
+    session_id: str
+    offset: int  # bytes received so far: the next chunk starts here
+    size: int
+    chunk_size: int
+    expires_at: datetime
+
+# Media deletion queue schemas
+class MediaDeletionResponse(BaseModel):
+    id: int
+    kind: str
+    url: str
+    status: str
+    attempts: int
+    last_error: Optional[str]
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Set
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import anyio
+from app import imaging, media_registry
+from app.database import SessionLocal
+from app.metrics import IMAGE_VARIANT_JOBS, IMAGE_VARIANT_SECONDS
+from app.services import media_pool, storage
+
+logger = logging.getLogger("app.image_variants")
+
+# Thumbnail, medium and WebP variants of uploaded images.
+#
+# After an image is uploaded and registered, schedule() copies it to a temp file
+# and returns; the variants are rendered on a process pool (Pillow is CPU-bound
+# and would hold the GIL), stored with the same backend as the original under
+# <public_id>_<variant>, and recorded on the original's media_assets row. From
+# there they are copied onto every post and profile using the image
+# (app/media_registry.py), so responses carry them without extra queries.
+# Until they exist, image_variants is null and clients use the original.
+
+IMAGE_VARIANTS_ENABLED = os.getenv("IMAGE_VARIANTS", "true").lower() == "true"
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+# Images waiting for or being rendered; beyond this new uploads get no variants
+IMAGE_VARIANT_QUEUE_LIMIT = int(os.getenv("IMAGE_VARIANT_QUEUE_LIMIT", "64"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+# Running jobs, referenced so they aren't garbage collected mid-flight
+_jobs: Set[asyncio.Task] = set()
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawn: forking a process that runs threads (DB pools, media workers) can deadlock
+                _executor = ProcessPoolExecutor(
+                    max_workers=IMAGE_VARIANT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _executor
+
+def enabled() -> bool:
+    return IMAGE_VARIANTS_ENABLED and imaging.available()
+
+def _copy(stream, path: str) -> None:
+    stream.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(stream, out, 1024 * 1024)
+    stream.seek(0)
+
+async def schedule(stream, url: str, public_id: str) -> None:
+    """Render and store variants of a just-uploaded image in the background"""
+    if not enabled():
+        return
+    if len(_jobs) >= IMAGE_VARIANT_QUEUE_LIMIT:
+        IMAGE_VARIANT_JOBS.inc(("skipped",))
+        logger.warning("image_variants_skipped", extra={"url": url, "queued": len(_jobs)})
+        return
+    # The upload's spooled file is gone after the request, so the job works from a copy
+    fd, source = tempfile.mkstemp(suffix=".img")
+    os.close(fd)
+    await anyio.to_thread.run_sync(_copy, stream, source)
+    job = asyncio.create_task(_generate(source, url, public_id))
+    _jobs.add(job)
+    job.add_done_callback(_jobs.discard)
+
+def _discard(urls) -> None:
+    db = SessionLocal()
+    try:
+        media_registry.discard(db, urls)
+        db.commit()
+    finally:
+        db.close()
+
+async def _generate(source: str, url: str, public_id: str) -> None:
+    out_dir = tempfile.mkdtemp(prefix="variants-")
+    variants: Dict[str, str] = {}
+    try:
+        started = time.perf_counter()
+        files = await asyncio.get_running_loop().run_in_executor(_pool(), imaging.render_variants, source, out_dir)
+        render_seconds = time.perf_counter() - started
+        IMAGE_VARIANT_SECONDS.observe((), render_seconds)
+
+        for name, path in files.items():
+            result = await media_pool.run(
+                "image", storage.backend.upload, path, resource_type="image",
+                public_id=f"{public_id}_{name}", timeout=media_pool.timeout_for("image"),
+            )
+            variants[name] = result["secure_url"]
+
+        await anyio.to_thread.run_sync(media_registry.set_variants, url, variants)
+        IMAGE_VARIANT_JOBS.inc(("ok",))
+        logger.info("image_variants_stored", extra={
+            "url": url, "variants": sorted(variants), "render_ms": round(render_seconds * 1000, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+    except Exception as e:
+        # The original is already stored and usable; it just has no variants
+        IMAGE_VARIANT_JOBS.inc(("error",))
+        logger.warning("image_variants_failed", extra={"url": url, "error": str(e)})
+        if variants:
+            await anyio.to_thread.run_sync(_discard, list(variants.values()))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.unlink(source)
+
+def shutdown() -> None:
+    global _executor
+    for job in list(_jobs):
+        job.cancel()
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
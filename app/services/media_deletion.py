@@ -0,0 +1,198 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+import asyncio
+import logging
+import os
+import random
+import anyio
+from sqlalchemy import Row, update
+from sqlalchemy.orm import Session
+from app import media_registry, models
+from app.database import SessionLocal
+from app.metrics import MEDIA_DELETIONS
+from app.services import media_pool, storage
+from app.services.upload import public_id_from_url
+
+logger = logging.getLogger("app.media_deletion")
+
+# Background deletion of media files at the provider.
+#
+# Deleting a post queues its files in media_deletions in the same transaction
+# (crud.delete_post), so the request returns once the row is gone and a file is
+# never forgotten. run_worker() claims due jobs in batches, destroys them with
+# one provider call per kind and batch, and retries failures with exponential
+# backoff. After MEDIA_DELETE_MAX_ATTEMPTS a job is marked failed and stays in
+# the table (GET /admin/media-deletions) until an admin retries it. Files still
+# used by another post (app/media_registry.py) are kept.
+#
+# Claiming moves a job's next_attempt_at a lease into the future, so several
+# workers (or processes) can share the queue and a job whose worker died is
+# picked up again once the lease runs out.
+
+MEDIA_DELETE_BATCH = int(os.getenv("MEDIA_DELETE_BATCH", "100"))  # Cloudinary's limit per call
+MEDIA_DELETE_INTERVAL = float(os.getenv("MEDIA_DELETE_INTERVAL", "5"))
+MEDIA_DELETE_MAX_ATTEMPTS = int(os.getenv("MEDIA_DELETE_MAX_ATTEMPTS", "8"))
+MEDIA_DELETE_BACKOFF = float(os.getenv("MEDIA_DELETE_BACKOFF", "30"))
+MEDIA_DELETE_BACKOFF_MAX = float(os.getenv("MEDIA_DELETE_BACKOFF_MAX", str(6 * 3600)))
+MEDIA_DELETE_LEASE = float(os.getenv("MEDIA_DELETE_LEASE", "300"))
+
+# Provider answers that mean the file is gone
+_DONE = ("deleted", "not_found")
+
+def enqueue(db: Session, kind: str, url: Optional[str]) -> None:
+    """Queue a file for deletion; committed (or rolled back) with the caller's transaction"""
+    if url:
+        db.add(models.MediaDeletion(kind=kind, url=url))
+
+def backoff(attempts: int) -> float:
+    """Seconds before retry number attempts + 1, with jitter so failed batches spread out"""
+    delay = min(MEDIA_DELETE_BACKOFF * 2 ** (attempts - 1), MEDIA_DELETE_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+# ============= QUEUE =============
+def claim(limit: int = MEDIA_DELETE_BATCH, now: Optional[datetime] = None) -> List[Row]:
+    """Due jobs (id, kind, url, attempts including this one), leased to the caller"""
+    now = now or datetime.utcnow()
+    table = models.MediaDeletion.__table__
+    db = SessionLocal()
+    try:
+        due = (
+            db.query(models.MediaDeletion.id)
+            .filter(models.MediaDeletion.status == "pending", models.MediaDeletion.next_attempt_at <= now)
+            .order_by(models.MediaDeletion.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        ids = [row.id for row in due]
+        if not ids:
+            db.rollback()
+            return []
+        # Re-checking the condition in the UPDATE makes the claim atomic even without row locks (SQLite)
+        claimed = db.execute(
+            update(table)
+            .where(table.c.id.in_(ids), table.c.status == "pending", table.c.next_attempt_at <= now)
+            .values(next_attempt_at=now + timedelta(seconds=MEDIA_DELETE_LEASE), attempts=table.c.attempts + 1)
+            .returning(table.c.id, table.c.kind, table.c.url, table.c.attempts)
+        ).all()
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+def finish(jobs: Dict[int, Row], done: List[int], retry: Dict[int, str], hopeless: Set[int] = frozenset(),
+           deferred: Optional[Dict[int, float]] = None) -> None:
+    """
+    Remove finished jobs and reschedule failed ones, giving up on those out of
+    attempts (or hopeless). Deferred jobs are retried after the given number of
+    seconds without using up an attempt.
+    """
+    db = SessionLocal()
+    try:
+        if done:
+            db.query(models.MediaDeletion).filter(models.MediaDeletion.id.in_(done)).delete(synchronize_session=False)
+        now = datetime.utcnow()
+        for job_id, delay in (deferred or {}).items():
+            db.query(models.MediaDeletion).filter(models.MediaDeletion.id == job_id).update(
+                {"next_attempt_at": now + timedelta(seconds=delay), "attempts": models.MediaDeletion.attempts - 1},
+                synchronize_session=False
+            )
+        for job_id, error in retry.items():
+            job = jobs[job_id]
+            values = {"last_error": error[:1000]}
+            if job.attempts >= MEDIA_DELETE_MAX_ATTEMPTS or job_id in hopeless:
+                values["status"] = "failed"
+                MEDIA_DELETIONS.inc((job.kind, "failed"))
+                logger.error("media_deletion_failed", extra={
+                    "kind": job.kind, "url": job.url, "attempts": job.attempts, "error": error,
+                })
+            else:
+                values["next_attempt_at"] = now + timedelta(seconds=backoff(job.attempts))
+                MEDIA_DELETIONS.inc((job.kind, "retried"))
+            db.query(models.MediaDeletion).filter(models.MediaDeletion.id == job_id).update(
+                values, synchronize_session=False
+            )
+        db.commit()
+    finally:
+        db.close()
+
+# ============= WORKER =============
+async def process_batch() -> int:
+    """Work off one batch of due jobs; returns how many were claimed"""
+    jobs = {job.id: job for job in await anyio.to_thread.run_sync(claim)}
+    done: List[int] = []
+    retry: Dict[int, str] = {}
+    hopeless: Set[int] = set()
+    deferred: Dict[int, float] = {}
+    batches = defaultdict(dict)  # kind -> public_id -> job ids
+
+    for job in jobs.values():
+        try:
+            state = await anyio.to_thread.run_sync(media_registry.release, job.url)
+        except Exception as e:
+            retry[job.id] = f"Registry error: {e}"
+            continue
+        if state == media_registry.REFERENCED:
+            # Another post still uses the file; whoever drops the last reference queues it again
+            done.append(job.id)
+            MEDIA_DELETIONS.inc((job.kind, "kept"))
+            continue
+        if state == media_registry.RECENT:
+            # Just handed out to an uploader: look again once it had time to be attached
+            deferred[job.id] = media_registry.MEDIA_DEDUP_GRACE
+            continue
+        public_id = public_id_from_url(job.url)
+        if not public_id:
+            hopeless.add(job.id)
+            retry[job.id] = "Could not extract public_id from URL"
+            continue
+        batches[job.kind].setdefault(public_id, []).append(job.id)
+
+    for kind, by_public_id in batches.items():
+        try:
+            outcomes = await media_pool.run(
+                "delete", storage.backend.destroy_many, list(by_public_id), resource_type=kind,
+                timeout=media_pool.timeout_for("delete"),
+            )
+        except Exception as e:
+            outcomes = {public_id: f"{type(e).__name__}: {e}" for public_id in by_public_id}
+        for public_id, job_ids in by_public_id.items():
+            outcome = outcomes.get(public_id, "missing from provider response")
+            for job_id in job_ids:
+                if outcome in _DONE:
+                    done.append(job_id)
+                    MEDIA_DELETIONS.inc((kind, "deleted"))
+                else:
+                    retry[job_id] = outcome
+
+    if jobs:
+        await anyio.to_thread.run_sync(finish, jobs, done, retry, hopeless, deferred)
+    return len(jobs)
+
+async def run_worker() -> None:
+    """Lifespan task: poll the queue every MEDIA_DELETE_INTERVAL seconds, back to back while it's full"""
+    while True:
+        try:
+            claimed = await process_batch()
+        except Exception as e:
+            logger.warning("media_deletion_batch_failed", extra={"error": str(e)})
+            claimed = 0
+        if claimed < MEDIA_DELETE_BATCH:
+            await asyncio.sleep(MEDIA_DELETE_INTERVAL)
+
+# ============= ADMIN =============
+def list_failed(db: Session, limit: int = 100) -> List[models.MediaDeletion]:
+    return db.query(models.MediaDeletion).filter(
+        models.MediaDeletion.status == "failed"
+    ).order_by(models.MediaDeletion.created_at.desc()).limit(limit).all()
+
+def retry_failed(db: Session, deletion_id: Optional[int] = None) -> int:
+    """Put failed jobs (one, or all) back in the queue with a fresh attempt budget"""
+    query = db.query(models.MediaDeletion).filter(models.MediaDeletion.status == "failed")
+    if deletion_id is not None:
+        query = query.filter(models.MediaDeletion.id == deletion_id)
+    count = query.update(
+        {"status": "pending", "attempts": 0, "next_attempt_at": datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    return count
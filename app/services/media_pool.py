@@ -0,0 +1,129 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from app.metrics import MEDIA_CALLS, MEDIA_CALL_SECONDS, MEDIA_QUEUE_DEPTH, MEDIA_QUEUE_WAIT_SECONDS
+
+# Bounded worker pools for blocking media-provider calls (the Cloudinary SDK).
+#
+# Every kind of call gets its own small thread pool, so a burst of video uploads
+# can't starve image uploads or deletes, and nothing blocks the event loop. At
+# most MEDIA_QUEUE_LIMIT calls per kind wait for a worker; beyond that callers
+# are rejected immediately instead of piling up. A caller that waits longer than
+# the kind's timeout gets TimeoutError (a call still queued is cancelled; one
+# already talking to the provider is bounded by the SDK's own HTTP timeout).
+
+def _setting(kind: str, name: str, default: str) -> str:
+    return os.getenv(f"MEDIA_{kind.upper()}_{name}", default)
+
+# kind -> (workers, timeout in seconds)
+KINDS = {
+    "image": (int(_setting("image", "WORKERS", "4")), float(_setting("image", "TIMEOUT", "30"))),
+    "video": (int(_setting("video", "WORKERS", "2")), float(_setting("video", "TIMEOUT", "300"))),
+    "delete": (int(_setting("delete", "WORKERS", "4")), float(_setting("delete", "TIMEOUT", "15"))),
+    "lookup": (int(_setting("lookup", "WORKERS", "4")), float(_setting("lookup", "TIMEOUT", "15"))),
+}
+MEDIA_QUEUE_LIMIT = int(os.getenv("MEDIA_QUEUE_LIMIT", "32"))
+
+class MediaPoolFull(RuntimeError):
+    """Too many calls of this kind are already waiting for a worker"""
+
+class _KindPool:
+    def __init__(self, kind: str, workers: int, timeout: float):
+        self.kind = kind
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"media-{kind}")
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def _dequeue(self) -> None:
+        with self._lock:
+            self._waiting -= 1
+        MEDIA_QUEUE_DEPTH.dec((self.kind,))
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._waiting >= MEDIA_QUEUE_LIMIT:
+                MEDIA_CALLS.inc((self.kind, "rejected"))
+                raise MediaPoolFull(f"{self.kind} queue is full ({MEDIA_QUEUE_LIMIT} waiting)")
+            self._waiting += 1
+        MEDIA_QUEUE_DEPTH.inc((self.kind,))
+        queued = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            self._dequeue()
+            MEDIA_QUEUE_WAIT_SECONDS.observe((self.kind,), started - queued)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                MEDIA_CALL_SECONDS.observe((self.kind,), time.perf_counter() - started)
+
+        future = self.executor.submit(task)
+
+        def on_done(f: Future):
+            # Cancelled while still queued: task() never ran to take it off the queue
+            if f.cancelled():
+                self._dequeue()
+
+        future.add_done_callback(on_done)
+        return future
+
+_pools: Dict[str, _KindPool] = {}
+_pools_lock = threading.Lock()
+
+def _pool(kind: str) -> _KindPool:
+    """Pools are started on first use, so app startup doesn't pay for idle threads"""
+    pool = _pools.get(kind)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(kind)
+            if pool is None:
+                workers, timeout = KINDS[kind]
+                pool = _pools[kind] = _KindPool(kind, workers, timeout)
+    return pool
+
+def timeout_for(kind: str) -> float:
+    return KINDS[kind][1]
+
+async def run(kind: str, fn: Callable, *args, **kwargs):
+    """Run a blocking provider call on the kind's pool without blocking the event loop"""
+    pool = _pool(kind)
+    future = pool.submit(fn, *args, **kwargs)
+    try:
+        # wait_for cancels the wrapper on timeout, which cancels a still-queued call
+        result = await asyncio.wait_for(asyncio.wrap_future(future), pool.timeout)
+    except asyncio.TimeoutError:
+        MEDIA_CALLS.inc((kind, "timeout"))
+        raise TimeoutError(f"{kind} call timed out after {pool.timeout:g}s") from None
+    except Exception:
+        MEDIA_CALLS.inc((kind, "error"))
+        raise
+    MEDIA_CALLS.inc((kind, "ok"))
+    return result
+
+def call(kind: str, fn: Callable, *args, **kwargs):
+    """run() for synchronous callers (threadpool route handlers)"""
+    pool = _pool(kind)
+    future = pool.submit(fn, *args, **kwargs)
+    try:
+        result = future.result(timeout=pool.timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        MEDIA_CALLS.inc((kind, "timeout"))
+        raise TimeoutError(f"{kind} call timed out after {pool.timeout:g}s") from None
+    except Exception:
+        MEDIA_CALLS.inc((kind, "error"))
+        raise
+    MEDIA_CALLS.inc((kind, "ok"))
+    return result
+
+def shutdown(wait: bool = False) -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.executor.shutdown(wait=wait, cancel_futures=True)
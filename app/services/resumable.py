@@ -0,0 +1,291 @@
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Optional
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+import anyio
+from app.services.upload import SNIFF_BYTES, sniff_media_kind
+
+try:
+    import fcntl
+except ImportError:  # Windows: sessions are only locked against this process's other requests
+    fcntl = None
+
+logger = logging.getLogger("app.upload")
+
+# Resumable chunked video uploads.
+#
+# A session is a directory under RESUMABLE_UPLOAD_DIR holding meta.json and the
+# bytes received so far ("data"). The session's offset is the size of that file,
+# so it survives restarts and is shared by every worker on the machine. Each
+# chunk must start at the current offset and is streamed to disk as it arrives;
+# a chunk sent with a SHA-256 is rolled back if it doesn't match (one sent
+# without keeps whatever arrived, so a dropped connection resumes mid-chunk).
+# On completion the file is checked (size, magic bytes, optional whole-file
+# SHA-256), hashed for deduplication and handed to the provider from disk,
+# never read into memory.
+# Sessions idle for RESUMABLE_SESSION_TTL are removed by collect_garbage().
+
+RESUMABLE_UPLOAD_DIR = os.getenv("RESUMABLE_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "ahkili-uploads"))
+RESUMABLE_CHUNK_MAX = int(os.getenv("RESUMABLE_CHUNK_MAX", str(16 * 1024 * 1024)))
+# Suggested to clients
+RESUMABLE_CHUNK_SIZE = min(int(os.getenv("RESUMABLE_CHUNK_SIZE", str(5 * 1024 * 1024))), RESUMABLE_CHUNK_MAX)
+RESUMABLE_SESSION_TTL = int(os.getenv("RESUMABLE_SESSION_TTL", str(24 * 3600)))
+RESUMABLE_GC_INTERVAL = int(os.getenv("RESUMABLE_GC_INTERVAL", "900"))
+
+# Received bytes are written in blocks of this size, on a worker thread
+WRITE_BLOCK = 1024 * 1024
+HASH_BLOCK = 1024 * 1024
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{24}$")
+
+class SessionNotFound(LookupError):
+    pass
+
+class SessionBusy(RuntimeError):
+    """Another request is writing to or completing this session"""
+
+class OffsetMismatch(ValueError):
+    def __init__(self, offset: int):
+        super().__init__(f"Chunk must start at offset {offset}")
+        self.offset = offset
+
+class ChunkRejected(ValueError):
+    pass
+
+class ChunkTooLarge(ChunkRejected):
+    pass
+
+@dataclass
+class UploadSession:
+    id: str
+    user_id: int
+    size: int
+    content_type: str
+    filename: Optional[str]
+    sha256: Optional[str]
+    created_at: float
+
+    @property
+    def path(self) -> str:
+        return os.path.join(RESUMABLE_UPLOAD_DIR, self.id)
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(self.path, "data")
+
+    def offset(self) -> int:
+        return os.path.getsize(self.data_path)
+
+    def expires_at(self) -> float:
+        return _last_activity(self.path) + RESUMABLE_SESSION_TTL
+
+def create(user_id: int, size: int, content_type: str, filename: Optional[str] = None,
+           sha256: Optional[str] = None) -> UploadSession:
+    session = UploadSession(
+        id=secrets.token_urlsafe(18),
+        user_id=user_id,
+        size=size,
+        content_type=content_type,
+        filename=filename,
+        sha256=sha256.lower() if sha256 else None,
+        created_at=time.time(),
+    )
+    os.makedirs(session.path)
+    open(session.data_path, "wb").close()
+    meta = {k: v for k, v in asdict(session).items() if k != "id"}
+    with open(os.path.join(session.path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return session
+
+def load(session_id: str) -> UploadSession:
+    if not _SESSION_ID.match(session_id):
+        raise SessionNotFound(session_id)
+    try:
+        with open(os.path.join(RESUMABLE_UPLOAD_DIR, session_id, "meta.json")) as f:
+            return UploadSession(id=session_id, **json.load(f))
+    except FileNotFoundError:
+        raise SessionNotFound(session_id) from None
+
+def discard(session: UploadSession) -> None:
+    shutil.rmtree(session.path, ignore_errors=True)
+
+# Sessions locked by this process, where there is no flock
+_locked = set()
+_locked_lock = threading.Lock()
+
+def _try_lock(session: UploadSession, f) -> bool:
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    with _locked_lock:
+        if session.id in _locked:
+            return False
+        _locked.add(session.id)
+        return True
+
+def _lock(session: UploadSession):
+    """The session's data file, opened and exclusively locked (across workers too); release with _unlock()"""
+    try:
+        f = open(session.data_path, "r+b")
+    except FileNotFoundError:
+        raise SessionNotFound(session.id) from None
+    if not _try_lock(session, f):
+        f.close()
+        raise SessionBusy("Another request is using this upload session")
+    return f
+
+def _unlock(session: UploadSession, f) -> None:
+    f.close()  # releases the flock
+    if fcntl is None:
+        with _locked_lock:
+            _locked.discard(session.id)
+
+# ============= CHUNKS =============
+def _sync(f) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+
+def _keep(f, pending: bytes) -> None:
+    f.write(pending)
+    _sync(f)
+
+def _rollback(f, offset: int) -> None:
+    f.truncate(offset)
+    _sync(f)
+
+async def write_chunk(session: UploadSession, offset: int, chunks: AsyncIterator[bytes],
+                      sha256: Optional[str] = None) -> int:
+    """Append a chunk that starts at offset; returns the new offset"""
+    f = await anyio.to_thread.run_sync(_lock, session)
+    try:
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise OffsetMismatch(current)
+        f.seek(offset)
+
+        remaining = session.size - offset
+        digest = hashlib.sha256()
+        received = 0
+        block = bytearray()
+        try:
+            async for piece in chunks:
+                received += len(piece)
+                if received > remaining:
+                    raise ChunkTooLarge(f"Chunk runs past the declared size of {session.size} bytes")
+                if received > RESUMABLE_CHUNK_MAX:
+                    raise ChunkTooLarge(f"Chunks are limited to {RESUMABLE_CHUNK_MAX} bytes")
+                digest.update(piece)
+                block += piece
+                if len(block) >= WRITE_BLOCK:
+                    await anyio.to_thread.run_sync(f.write, bytes(block))
+                    block.clear()
+            if block:
+                await anyio.to_thread.run_sync(f.write, bytes(block))
+            if sha256 and not hmac.compare_digest(digest.hexdigest(), sha256.lower()):
+                raise ChunkRejected("Chunk checksum mismatch")
+        except ChunkRejected:
+            await anyio.to_thread.run_sync(_rollback, f, offset)
+            raise
+        except BaseException:
+            # Dropped connection: keep what arrived, unless the chunk can't be verified without the rest
+            if sha256:
+                await anyio.to_thread.run_sync(_rollback, f, offset)
+            else:
+                await anyio.to_thread.run_sync(_keep, f, bytes(block))
+            raise
+
+        await anyio.to_thread.run_sync(_sync, f)
+        return offset + received
+    finally:
+        _unlock(session, f)
+
+# ============= COMPLETION =============
+def _verify(session: UploadSession, f) -> str:
+    """Check the assembled file and return its SHA-256 (also used to deduplicate it)"""
+    size = os.fstat(f.fileno()).st_size
+    if size != session.size:
+        raise ChunkRejected(f"Upload incomplete: {size} of {session.size} bytes received")
+    f.seek(0)
+    if sniff_media_kind(f.read(SNIFF_BYTES)) != "video":
+        raise ChunkRejected("File content is not a supported video format")
+    f.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(HASH_BLOCK), b""):
+        digest.update(block)
+    if session.sha256 and not hmac.compare_digest(digest.hexdigest(), session.sha256):
+        raise ChunkRejected("File checksum mismatch")
+    return digest.hexdigest()
+
+def _remove_locked(session: UploadSession, f) -> None:
+    """Remove a session while still holding its lock, so no other request picks it up meanwhile"""
+    if fcntl is None:
+        # Windows can't remove an open file; the process-local lock stays held until _unlock()
+        f.close()
+    discard(session)
+
+@asynccontextmanager
+async def completing(session: UploadSession):
+    """
+    Lock and verify a fully received session and yield the assembled file's path
+    and SHA-256. The session is removed if the block succeeds and kept (for a
+    retry) if it raises.
+    """
+    f = await anyio.to_thread.run_sync(_lock, session)
+    try:
+        content_hash = await anyio.to_thread.run_sync(_verify, session, f)
+        yield session.data_path, content_hash
+        await anyio.to_thread.run_sync(_remove_locked, session, f)
+    finally:
+        _unlock(session, f)
+
+# ============= GARBAGE COLLECTION =============
+def _last_activity(path: str) -> float:
+    mtimes = [os.path.getmtime(path)]
+    for entry in os.scandir(path):
+        mtimes.append(entry.stat().st_mtime)
+    return max(mtimes)
+
+def collect_garbage(now: Optional[float] = None) -> int:
+    """Remove sessions idle for longer than RESUMABLE_SESSION_TTL; returns how many"""
+    now = time.time() if now is None else now
+    removed = 0
+    try:
+        entries = list(os.scandir(RESUMABLE_UPLOAD_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not entry.is_dir():
+            continue
+        try:
+            idle = now - _last_activity(entry.path) > RESUMABLE_SESSION_TTL
+        except FileNotFoundError:
+            continue  # removed meanwhile
+        if idle:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+async def run_garbage_collector() -> None:
+    """Lifespan task: collect abandoned sessions every RESUMABLE_GC_INTERVAL seconds"""
+    while True:
+        try:
+            removed = await anyio.to_thread.run_sync(collect_garbage)
+            if removed:
+                logger.info("upload_sessions_collected", extra={"removed": removed})
+        except Exception as e:
+            logger.warning("upload_session_cleanup_failed", extra={"error": str(e)})
+        await asyncio.sleep(RESUMABLE_GC_INTERVAL)
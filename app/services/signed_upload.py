@@ -0,0 +1,144 @@
+from datetime import datetime
+from typing import Dict, Optional
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import time
+from app.services import media_pool, storage
+from app.services.storage import UPLOAD_FOLDER
+from app.services.upload import MAX_IMAGE_BYTES, MAX_VIDEO_BYTES
+
+# Direct-to-storage uploads: media bytes go from the client straight to the
+# provider instead of through the API.
+#
+# POST /upload/sign returns Cloudinary upload parameters signed with our API
+# secret: a public_id we choose (folder, kind, user, issue time), the allowed
+# formats and the same incoming transformation the proxied upload applies. The
+# client posts the file to the provider with them and sends the provider's
+# response to POST /upload/complete. The provider signs that response over
+# (public_id, version) only, so the stored file's size and format are then read
+# from the provider (Admin API) rather than taken from the client.
+#
+# Everything up to CONFIGURED PROVIDER is a pure function of its arguments and
+# the API secret, so it runs (and can be checked) offline.
+
+UPLOAD_SIGNATURE_TTL = int(os.getenv("UPLOAD_SIGNATURE_TTL", "600"))
+SIGNATURE_ALGORITHM = os.getenv("CLOUDINARY_SIGNATURE_ALGORITHM", "sha1")
+# Where uploaded files are served from (a local stand-in in benchmarks)
+MEDIA_DELIVERY_URL = os.getenv("MEDIA_DELIVERY_URL", "https://res.cloudinary.com")
+# Tolerated difference between our clock and the provider's
+CLOCK_SKEW = 60
+
+ALLOWED_FORMATS = {
+    "image": ("jpg", "jpeg", "png", "gif", "webp", "heic", "avif"),
+    "video": ("mp4", "mov", "webm", "mkv", "avi", "3gp"),
+}
+TRANSFORMATIONS = {
+    "image": "c_limit,h_800,w_800/q_auto",
+    "video": "c_limit,h_720,w_1280/q_auto",
+}
+MAX_BYTES = {"image": MAX_IMAGE_BYTES, "video": MAX_VIDEO_BYTES}
+
+_PUBLIC_ID = re.compile(rf"^{re.escape(UPLOAD_FOLDER)}/(image|video)s/(\d+)_(\d+)_[0-9a-f]{{16}}$")
+
+class UploadVerificationError(ValueError):
+    """The reported upload wasn't issued to this user, expired, or isn't signed by the provider"""
+
+class UploadRejected(ValueError):
+    """The stored file is too large or of a format we don't accept; url is where it is stored"""
+
+    def __init__(self, message: str, url: str):
+        super().__init__(message)
+        self.url = url
+
+def sign(params: Dict[str, object], api_secret: str, algorithm: str = SIGNATURE_ALGORITHM) -> str:
+    """Cloudinary's API signature: non-empty params sorted by name as k=v joined by &, then the secret"""
+    pairs = []
+    for key, value in sorted(params.items()):
+        if isinstance(value, (list, tuple)):
+            value = ",".join(str(v) for v in value)
+        if value is None or value == "":
+            continue
+        pairs.append(f"{key}={value}")
+    return hashlib.new(algorithm, ("&".join(pairs) + api_secret).encode()).hexdigest()
+
+def upload_url(cloud_name: str, kind: str, prefix: Optional[str] = None) -> str:
+    return f"{prefix or 'https://api.cloudinary.com'}/v1_1/{cloud_name}/{kind}/upload"
+
+def delivery_url(cloud_name: str, kind: str, version: int, public_id: str, file_format: str,
+                 base: str = MEDIA_DELIVERY_URL) -> str:
+    return f"{base}/{cloud_name}/{kind}/upload/v{version}/{public_id}.{file_format}"
+
+def new_public_id(kind: str, user_id: int, timestamp: int) -> str:
+    return f"{UPLOAD_FOLDER}/{kind}s/{user_id}_{timestamp}_{secrets.token_hex(8)}"
+
+def upload_params(kind: str, user_id: int, api_key: str, api_secret: str, now: Optional[float] = None) -> Dict[str, str]:
+    """Form fields the client sends along with the file"""
+    timestamp = int(time.time() if now is None else now)
+    params = {
+        "timestamp": timestamp,
+        "public_id": new_public_id(kind, user_id, timestamp),
+        "allowed_formats": ALLOWED_FORMATS[kind],
+        "transformation": TRANSFORMATIONS[kind],
+    }
+    fields = {key: ",".join(value) if isinstance(value, tuple) else str(value) for key, value in params.items()}
+    fields["signature"] = sign(params, api_secret)
+    fields["api_key"] = api_key
+    return fields
+
+def verify_completion(kind: str, user_id: int, public_id: str, version: int, signature: str,
+                      api_secret: str) -> None:
+    """Raise UploadVerificationError unless this is a provider-signed upload we issued to user_id"""
+    match = _PUBLIC_ID.match(public_id)
+    if not match or match.group(1) != kind or int(match.group(2)) != user_id:
+        raise UploadVerificationError("Upload was not issued to this user")
+
+    # version is the provider's upload timestamp: the file must have arrived while the signature was fresh
+    issued = int(match.group(3))
+    if not issued - CLOCK_SKEW <= version <= issued + UPLOAD_SIGNATURE_TTL + CLOCK_SKEW:
+        raise UploadVerificationError("Upload signature expired before the file was uploaded")
+
+    expected = sign({"public_id": public_id, "version": version}, api_secret)
+    if not hmac.compare_digest(expected, signature):
+        raise UploadVerificationError("Invalid provider signature")
+
+# ============= CONFIGURED PROVIDER =============
+def _credentials():
+    if not storage.backend.direct_uploads:
+        raise RuntimeError("Direct uploads are not supported by the configured storage backend")
+    cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME")
+    api_key = os.getenv("CLOUDINARY_API_KEY")
+    api_secret = os.getenv("CLOUDINARY_API_SECRET")
+    if not (cloud_name and api_key and api_secret):
+        raise RuntimeError("Cloudinary credentials are not configured")
+    return cloud_name, api_key, api_secret
+
+def signed_request(kind: str, user_id: int) -> dict:
+    cloud_name, api_key, api_secret = _credentials()
+    fields = upload_params(kind, user_id, api_key, api_secret)
+    return {
+        "upload_url": upload_url(cloud_name, kind, os.getenv("CLOUDINARY_UPLOAD_PREFIX")),
+        "fields": fields,
+        "expires_at": datetime.utcfromtimestamp(int(fields["timestamp"]) + UPLOAD_SIGNATURE_TTL),
+        "max_bytes": MAX_BYTES[kind],
+    }
+
+def verify(kind: str, user_id: int, public_id: str, version: int, signature: str) -> dict:
+    """Check a reported upload with the provider; returns the url, format and bytes to record"""
+    cloud_name, _, api_secret = _credentials()
+    verify_completion(kind, user_id, public_id, version, signature, api_secret)
+
+    # Blocks a threadpool worker, bounded by the lookup pool (app/services/media_pool.py)
+    stored = media_pool.call("lookup", storage.backend.resource, public_id, kind)
+    if stored is None:
+        raise UploadVerificationError("Upload not found at the provider")
+    file_format = stored["format"].lower()
+    # Only public_id and version are signed, so the URL is built here rather than taken from the client
+    url = delivery_url(cloud_name, kind, version, public_id, file_format)
+    if file_format not in ALLOWED_FORMATS[kind]:
+        raise UploadRejected(f"Unsupported {kind} format", url)
+    if stored["bytes"] > MAX_BYTES[kind]:
+        raise UploadRejected("File too large", url)
+    return {"url": url, "format": file_format, "bytes": stored["bytes"]}
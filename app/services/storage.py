@@ -0,0 +1,244 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Optional
+import importlib
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import time
+
+# Where uploaded media is stored.
+#
+# STORAGE_BACKEND picks the implementation: "cloudinary" (default), "local" for
+# files on this machine (served by GET /media/..., see app/routes/media.py), or
+# "package.module:ClassName" of another StorageBackend. Both built-in backends
+# hand out URLs of the same shape, .../v<version>/<public_id>.<format>, so
+# stored URLs can be mapped back to public_ids whichever backend wrote them.
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "ahkili")
+# Bytes the Cloudinary SDK holds in memory per upload: files go to the provider in
+# chunks of this size (Cloudinary's minimum for chunked uploads is 5MB)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(6 * 1024 * 1024)))
+# Local backend: files live under MEDIA_ROOT and are served under MEDIA_BASE_URL/media
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(tempfile.gettempdir(), "ahkili-media"))
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "").rstrip("/")
+
+_PUBLIC_ID = re.compile(r'/v\d+/(.+)\.\w+$')
+
+class StorageBackend(ABC):
+    """
+    Interface used by app/services/upload.py and media_deletion.py. Calls block
+    (they are run on media_pool workers), and upload() and destroy() return
+    Cloudinary-shaped dicts so callers don't care which backend is configured.
+    """
+    # Whether clients can upload straight to the backend (app/services/signed_upload.py)
+    direct_uploads = False
+
+    @abstractmethod
+    def upload(self, source, resource_type: str = "image", **options) -> dict:
+        """Store a file object or path (under public_id if given); returns at least secure_url, public_id and bytes"""
+
+    @abstractmethod
+    def destroy(self, public_id: str, resource_type: str = "image", **options) -> dict:
+        """{"result": "ok"} or {"result": "not found"}"""
+
+    @abstractmethod
+    def destroy_many(self, public_ids: Iterable[str], resource_type: str = "image", **options) -> Dict[str, str]:
+        """public_id -> "deleted", "not_found" or an error, for every public_id given"""
+
+    def resource(self, public_id: str, resource_type: str = "image") -> Optional[dict]:
+        """A stored file's bytes, format and version, None if there is none (needed for direct_uploads)"""
+        raise NotImplementedError
+
+    def public_id(self, url: str) -> Optional[str]:
+        # URL format: https://res.cloudinary.com/cloud_name/image/upload/v1234567890/public_id.jpg
+        match = _PUBLIC_ID.search(url)
+        return match.group(1) if match else None
+
+# ============= CLOUDINARY =============
+class _KeepOpen:
+    """A file object the SDK may use in a with block without closing it (callers still read it afterwards)"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class CloudinaryStorage(StorageBackend):
+    direct_uploads = True
+
+    def __init__(self):
+        self._uploader = None
+
+    def uploader(self):
+        """Import and configure Cloudinary on first use, so app startup doesn't pay for it"""
+        if self._uploader is None:
+            import cloudinary
+            import cloudinary.uploader
+
+            cloudinary.config(
+                cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+                api_key=os.getenv("CLOUDINARY_API_KEY"),
+                api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+                # Points the SDK at another API host, e.g. a local stand-in (benchmarks/fake_media_provider.py)
+                upload_prefix=os.getenv("CLOUDINARY_UPLOAD_PREFIX"),
+            )
+            self._uploader = cloudinary.uploader
+        return self._uploader
+
+    def upload(self, source, resource_type: str = "image", **options) -> dict:
+        # Sent chunk by chunk, never read whole. upload_large closes a file object it
+        # is given, and image variants are made from the same upload afterwards
+        if hasattr(source, "read"):
+            source = _KeepOpen(source)
+        return self.uploader().upload_large(source, chunk_size=UPLOAD_CHUNK_SIZE, resource_type=resource_type, **options)
+
+    def destroy(self, public_id: str, resource_type: str = "image", **options) -> dict:
+        return self.uploader().destroy(public_id, resource_type=resource_type, **options)
+
+    def destroy_many(self, public_ids: Iterable[str], resource_type: str = "image", **options) -> Dict[str, str]:
+        # Admin API batch delete (up to 100 public_ids per call)
+        self.uploader()
+        import cloudinary.api
+
+        result = cloudinary.api.delete_resources(list(public_ids), resource_type=resource_type, **options)
+        return result.get("deleted", {})
+
+    def resource(self, public_id: str, resource_type: str = "image") -> Optional[dict]:
+        # Admin API lookup
+        self.uploader()
+        import cloudinary.api
+        import cloudinary.exceptions
+
+        try:
+            return cloudinary.api.resource(public_id, resource_type=resource_type)
+        except cloudinary.exceptions.NotFound:
+            return None
+
+# ============= LOCAL FILESYSTEM =============
+# Leading bytes -> file extension, for naming stored files (content was already
+# checked by upload._check_upload / resumable._verify)
+_FORMATS = (
+    (b"\xff\xd8\xff", 0, "jpg"),
+    (b"\x89PNG\r\n\x1a\n", 0, "png"),
+    (b"GIF8", 0, "gif"),
+    (b"WEBP", 8, "webp"),
+    (b"AVI ", 8, "avi"),
+    (b"\x1a\x45\xdf\xa3", 0, "webm"),
+    (b"ftypheic", 4, "heic"),
+    (b"ftypheix", 4, "heic"),
+    (b"ftypmif1", 4, "heic"),
+    (b"ftypavif", 4, "avif"),
+    (b"ftypqt  ", 4, "mov"),
+    (b"ftyp3gp", 4, "3gp"),
+    (b"ftyp", 4, "mp4"),
+)
+
+def guess_format(head: bytes, resource_type: str) -> str:
+    for signature, offset, fmt in _FORMATS:
+        if head[offset:offset + len(signature)] == signature:
+            return fmt
+    return "mp4" if resource_type == "video" else "jpg"
+
+class LocalStorage(StorageBackend):
+    """
+    Files under root, named like Cloudinary public_ids. Stored as uploaded:
+    Cloudinary's incoming transformations (resize, quality) are not applied.
+    """
+    COPY_BLOCK = 1024 * 1024
+
+    def __init__(self, root: str = MEDIA_ROOT, base_url: str = MEDIA_BASE_URL):
+        self.root = os.path.realpath(root)
+        self.base_url = base_url
+
+    def path(self, relative: str) -> Optional[str]:
+        """Absolute path of a stored file from its URL path below /media/v<version>/, None if outside root"""
+        path = os.path.realpath(os.path.join(self.root, relative))
+        return path if path.startswith(self.root + os.sep) else None
+
+    def upload(self, source, resource_type: str = "image", public_id: Optional[str] = None, **options) -> dict:
+        public_id = public_id or f"{UPLOAD_FOLDER}/{resource_type}s/{secrets.token_hex(16)}"
+        version = int(time.time())
+        directory = os.path.join(self.root, os.path.dirname(public_id))
+        os.makedirs(directory, exist_ok=True)
+
+        # Written under a temporary name and renamed, so a file is never served half-written
+        fd, partial = tempfile.mkstemp(dir=directory, suffix=".part")
+        os.close(fd)
+        try:
+            if isinstance(source, (str, os.PathLike)):
+                with open(source, "rb") as f:
+                    head = f.read(16)
+                shutil.copyfile(source, partial)  # copy_file_range/sendfile in the kernel
+            else:
+                source.seek(0)
+                head = source.read(16)
+                source.seek(0)
+                with open(partial, "wb") as out:
+                    shutil.copyfileobj(source, out, self.COPY_BLOCK)
+            os.chmod(partial, 0o644)  # readable by a fronting web server (MEDIA_ACCEL_REDIRECT)
+            fmt = guess_format(head, resource_type)
+            final = os.path.join(self.root, f"{public_id}.{fmt}")
+            os.replace(partial, final)
+        except BaseException:
+            if os.path.exists(partial):
+                os.unlink(partial)
+            raise
+
+        return {
+            "public_id": public_id,
+            "version": version,
+            "resource_type": resource_type,
+            "format": fmt,
+            "bytes": os.path.getsize(final),
+            "secure_url": f"{self.base_url}/media/v{version}/{public_id}.{fmt}",
+        }
+
+    def _remove(self, public_id: str) -> bool:
+        base = self.path(public_id)
+        if base is None:
+            return False
+        directory, name = os.path.split(base)
+        removed = False
+        try:
+            entries = os.listdir(directory)
+        except FileNotFoundError:
+            return False
+        for entry in entries:
+            stem, dot, _ = entry.rpartition(".")
+            if dot and stem == name:
+                try:
+                    os.unlink(os.path.join(directory, entry))
+                    removed = True
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def destroy(self, public_id: str, resource_type: str = "image", **options) -> dict:
+        return {"result": "ok" if self._remove(public_id) else "not found"}
+
+    def destroy_many(self, public_ids: Iterable[str], resource_type: str = "image", **options) -> Dict[str, str]:
+        return {public_id: "deleted" if self._remove(public_id) else "not_found" for public_id in public_ids}
+
+def _load_backend(spec: str) -> StorageBackend:
+    if spec == "cloudinary":
+        return CloudinaryStorage()
+    if spec == "local":
+        return LocalStorage()
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+backend: StorageBackend = _load_backend(STORAGE_BACKEND)
+
+def set_backend(new_backend: StorageBackend) -> None:
+    global backend
+    backend = new_backend
@@ -1,107 +1,199 @@
-import cloudinary
-import cloudinary.uploader
-import os
 from fastapi import UploadFile, HTTPException
-import re
+from typing import Optional
+import anyio
+import logging
+import time
+from app import media_registry
+from app.metrics import record_cache
+from app.services import image_variants, media_pool, storage
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
+logger = logging.getLogger("app.upload")
+
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+MAX_VIDEO_BYTES = 50 * 1024 * 1024
+
+# Run on media_pool workers, so blocking storage calls (and the first call's SDK import) stay off the event loop
+def _upload(stream, **options):
+    """Store a file object or path with the configured backend (app/services/storage.py)"""
+    return storage.backend.upload(stream, **options)
+
+def _destroy(public_id: str, **options):
+    return storage.backend.destroy(public_id, **options)
+
+def public_id_from_url(url: str) -> Optional[str]:
+    return storage.backend.public_id(url)
+
+def _ms_since(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+# ============= VALIDATION =============
+# The multipart parser streams each file into a spooled temp file (memory up to
+# 1MB, disk after that) and BodySizeLimitMiddleware cuts oversized bodies off
+# while they arrive, so uploads are checked here by size and leading bytes
+# without ever being read into memory.
+SNIFF_BYTES = 16
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")
+IMAGE_FTYP_BRANDS = (b"heic", b"heix", b"hevc", b"mif1", b"msf1", b"avif")
+VIDEO_SIGNATURES = (b"\x1a\x45\xdf\xa3",)  # Matroska / WebM
+
+def sniff_media_kind(head: bytes) -> Optional[str]:
+    """'image' or 'video' from a file's first bytes, None if it is neither"""
+    if head.startswith(IMAGE_SIGNATURES) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP"):
+        return "image"
+    if head[4:8] == b"ftyp":  # ISO base media: MP4, MOV, 3GP, HEIF, AVIF
+        return "image" if head[8:12] in IMAGE_FTYP_BRANDS else "video"
+    if head.startswith(VIDEO_SIGNATURES) or (head[:4] == b"RIFF" and head[8:12] == b"AVI "):
+        return "video"
+    return None
+
+async def _check_upload(file: UploadFile, kind: str, max_bytes: int, too_large: str) -> None:
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=400, detail=too_large)
+    head = await file.read(SNIFF_BYTES)
+    if sniff_media_kind(head) != kind:
+        raise HTTPException(status_code=400, detail=f"File content is not a supported {kind} format")
+    await file.seek(0)
+
+def _pool_error(e: Exception, what: str) -> HTTPException:
+    if isinstance(e, media_pool.MediaPoolFull):
+        return HTTPException(status_code=503, detail=f"Too many {what} uploads in progress, try again shortly",
+                             headers={"Retry-After": "5"})
+    return HTTPException(status_code=504, detail=f"{what.capitalize()} upload timed out")
+
+# ============= DEDUPLICATION =============
+# Uploads are looked up by content hash before they are sent (see app/media_registry.py)
+async def _find_duplicate(content_hash: str, kind: str) -> Optional[str]:
+    url = await anyio.to_thread.run_sync(media_registry.lookup, content_hash, kind)
+    record_cache("media_dedup", url is not None)
+    return url
+
+async def _register(content_hash: str, kind: str, result: dict) -> str:
+    url = result['secure_url']
+    kept = await anyio.to_thread.run_sync(
+        media_registry.register, content_hash, kind, url, result.get('public_id'), result.get('bytes')
+    )
+    if kept != url:
+        # An identical upload finished first: hand out its URL and drop this copy
+        try:
+            await media_pool.run("delete", _destroy, result['public_id'], resource_type=kind,
+                                 timeout=media_pool.timeout_for("delete"))
+        except Exception as e:
+            logger.warning("duplicate_cleanup_failed", extra={"kind": kind, "url": url, "error": str(e)})
+    return kept
 
 async def upload_image(file: UploadFile) -> str:
-    """Upload image to Cloudinary and return URL"""
+    """Upload image to storage (Cloudinary unless configured otherwise) and return URL"""
     try:
         # Check file type
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Check file size (max 5MB)
-        contents = await file.read()
-        if len(contents) > 5 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="File too large (max 5MB)")
+        # Check file size (max 5MB) and that the content really is an image
+        await _check_upload(file, "image", MAX_IMAGE_BYTES, "File too large (max 5MB)")
         
-        # Upload to Cloudinary
-        result = cloudinary.uploader.upload(
-            contents,
-            resource_type="image",
-            transformation=[
-                {'width': 800, 'height': 800, 'crop': 'limit'},
-                {'quality': 'auto'}
-            ]
-        )
+        # Same bytes uploaded before: reuse the stored file
+        content_hash = await anyio.to_thread.run_sync(media_registry.hash_file, file.file)
+        url = await _find_duplicate(content_hash, "image")
+        if url:
+            logger.info("upload_deduplicated", extra={"kind": "image", "url": url})
+            return url
+        
+        # Upload on the image worker pool (the storage call blocks for the whole transfer)
+        started = time.perf_counter()
+        try:
+            result = await media_pool.run(
+                "image",
+                _upload,
+                file.file,
+                resource_type="image",
+                transformation=[
+                    {'width': 800, 'height': 800, 'crop': 'limit'},
+                    {'quality': 'auto'}
+                ],
+                timeout=media_pool.timeout_for("image"),
+            )
+        except (media_pool.MediaPoolFull, TimeoutError) as e:
+            raise _pool_error(e, "image")
         
-        print(f"Upload successful: {result['secure_url']}")
-        return result['secure_url']
+        url = await _register(content_hash, "image", result)
+        if url == result['secure_url']:
+            # A new asset: thumbnail/medium/WebP variants are made in the background
+            await image_variants.schedule(file.file, url, result['public_id'])
+        logger.info("upload_stored", extra={
+            "kind": "image", "url": url, "bytes": result.get('bytes'), "upload_ms": _ms_since(started),
+        })
+        return url
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Upload error: {str(e)}")
+        logger.error("upload_failed", extra={"kind": "image", "error": str(e)}, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-async def upload_video(file: UploadFile) -> str:
-    """Upload video to Cloudinary and return URL"""
+async def _send_video(source) -> dict:
+    """Upload on the video worker pool (the storage call blocks for the whole transfer)"""
     try:
-        # Check file type
-        if not file.content_type.startswith('video/'):
-            raise HTTPException(status_code=400, detail="File must be a video")
-        
-        # Check file size (max 50MB for videos)
-        contents = await file.read()
-        if len(contents) > 50 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="Video too large (max 50MB)")
-        
-        # Upload to Cloudinary
-        result = cloudinary.uploader.upload(
-            contents,
+        return await media_pool.run(
+            "video",
+            _upload,
+            source,
             resource_type="video",
             transformation=[
                 {'width': 1280, 'height': 720, 'crop': 'limit'},
                 {'quality': 'auto'}
-            ]
+            ],
+            timeout=media_pool.timeout_for("video"),
         )
-        
-        print(f"Video upload successful: {result['secure_url']}")
-        return result['secure_url']
-    except Exception as e:
-        print(f"Video upload error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Video upload failed: {str(e)}")
+    except (media_pool.MediaPoolFull, TimeoutError) as e:
+        raise _pool_error(e, "video")
 
-def delete_image(image_url: str) -> bool:
-    """Delete image from Cloudinary using its URL"""
+async def upload_video(file: UploadFile) -> str:
+    """Upload video to storage (Cloudinary unless configured otherwise) and return URL"""
     try:
-        # Extract public_id from URL
-        # URL format: https://res.cloudinary.com/cloud_name/image/upload/v1234567890/public_id.jpg
-        match = re.search(r'/v\d+/(.+)\.\w+$', image_url)
-        if not match:
-            print(f"Could not extract public_id from URL: {image_url}")
-            return False
+        # Check file type
+        if not file.content_type.startswith('video/'):
+            raise HTTPException(status_code=400, detail="File must be a video")
+        
+        # Check file size (max 50MB for videos) and that the content really is a video
+        await _check_upload(file, "video", MAX_VIDEO_BYTES, "Video too large (max 50MB)")
         
-        public_id = match.group(1)
-        print(f"Deleting image with public_id: {public_id}")
+        content_hash = await anyio.to_thread.run_sync(media_registry.hash_file, file.file)
+        url = await _find_duplicate(content_hash, "video")
+        if url:
+            logger.info("upload_deduplicated", extra={"kind": "video", "url": url})
+            return url
         
-        result = cloudinary.uploader.destroy(public_id)
-        print(f"Delete result: {result}")
-        return result.get('result') == 'ok'
+        started = time.perf_counter()
+        result = await _send_video(file.file)
+        
+        url = await _register(content_hash, "video", result)
+        logger.info("upload_stored", extra={
+            "kind": "video", "url": url, "bytes": result.get('bytes'), "upload_ms": _ms_since(started),
+        })
+        return url
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Delete error: {str(e)}")
-        return False
+        logger.error("upload_failed", extra={"kind": "video", "error": str(e)}, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Video upload failed: {str(e)}")
 
-def delete_video(video_url: str) -> bool:
-    """Delete video from Cloudinary using its URL"""
+async def upload_video_file(path: str, content_hash: str) -> str:
+    """Upload a video already on local disk (an assembled resumable upload) and return URL"""
     try:
-        # Extract public_id from URL
-        match = re.search(r'/v\d+/(.+)\.\w+$', video_url)
-        if not match:
-            print(f"Could not extract public_id from URL: {video_url}")
-            return False
+        url = await _find_duplicate(content_hash, "video")
+        if url:
+            logger.info("upload_deduplicated", extra={"kind": "video", "url": url})
+            return url
         
-        public_id = match.group(1)
-        print(f"Deleting video with public_id: {public_id}")
-        
-        result = cloudinary.uploader.destroy(public_id, resource_type="video")
-        print(f"Delete result: {result}")
-        return result.get('result') == 'ok'
+        # The SDK opens the file itself and reads it chunk by chunk
+        started = time.perf_counter()
+        result = await _send_video(path)
+        url = await _register(content_hash, "video", result)
+        logger.info("upload_stored", extra={
+            "kind": "video", "url": url, "bytes": result.get('bytes'), "upload_ms": _ms_since(started),
+        })
+        return url
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Delete error: {str(e)}")
-        return False
\ No newline at end of file
+        logger.error("upload_failed", extra={"kind": "video", "error": str(e)}, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Video upload failed: {str(e)}")
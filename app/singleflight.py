@@ -0,0 +1,98 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable
+import asyncio
+import threading
+import weakref
+from app.database import pinned_to_primary
+from app.metrics import SINGLEFLIGHT_COALESCED, SINGLEFLIGHT_EXECUTIONS
+
+# Single-flight request coalescing.
+#
+# Concurrent calls with the same (group, key) share one execution: the first
+# caller runs the function, later callers wait for its result (or exception)
+# instead of running the same queries again. Nothing is cached once the call
+# finishes. Results are shared between requests, so callers should return
+# immutable values (serialized bodies, tuples), not live ORM objects.
+#
+# do() is for threadpool (sync) handlers, ado() for handlers on the event loop.
+# Requests pinned to the primary never share with replica reads.
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_calls: Dict[Hashable, _Call] = {}
+_calls_lock = threading.Lock()
+
+def _full_key(group: str, key: Hashable):
+    return group, key, pinned_to_primary()
+
+def do(group: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+    full_key = _full_key(group, key)
+    with _calls_lock:
+        call = _calls.get(full_key)
+        leader = call is None
+        if leader:
+            call = _calls[full_key] = _Call()
+
+    if not leader:
+        SINGLEFLIGHT_COALESCED.inc((group,))
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    SINGLEFLIGHT_EXECUTIONS.inc((group,))
+    try:
+        call.result = fn()
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            del _calls[full_key]
+        call.done.set()
+
+# One table per event loop: futures can't be awaited from another loop
+_async_calls = weakref.WeakKeyDictionary()
+
+async def ado(group: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+    loop = asyncio.get_running_loop()
+    calls = _async_calls.get(loop)
+    if calls is None:
+        calls = _async_calls[loop] = {}
+    full_key = _full_key(group, key)
+
+    while True:
+        future = calls.get(full_key)
+        if future is None:
+            break
+        SINGLEFLIGHT_COALESCED.inc((group,))
+        try:
+            # shield: a follower going away must not cancel the leader's work
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The leader was cancelled (client disconnected): run it ourselves
+
+    future = calls[full_key] = loop.create_future()
+    SINGLEFLIGHT_EXECUTIONS.inc((group,))
+    try:
+        result = await fn()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved: there may be no followers
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del calls[full_key]
@@ -0,0 +1,138 @@
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.util import await_only
+import asyncio
+import os
+import threading
+
+# Production settings for SQLite deployments (staging, small self-hosted installs).
+#
+# WAL lets readers run in parallel with the single writer SQLite allows, and the
+# writer lock below serializes this process's write transactions in FIFO order,
+# so concurrent reactions/notifications wait their turn instead of racing for the
+# database lock and failing with "database is locked".
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negative values are KiB, so this is a 64 MB page cache per connection
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-64000"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+    f"PRAGMA cache_size={SQLITE_CACHE_SIZE}",
+)
+
+class _Waiter:
+    __slots__ = ("wake", "granted")
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+class WriterLock:
+    """
+    FIFO lock shared by threads (sync sessions) and the event loop (async
+    sessions). Releasing hands the lock straight to the oldest waiter, so
+    writers are served in arrival order. Async waiters wait on a future, not
+    in a parked worker thread.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._held = False
+        self._waiters = deque()
+
+    def _try_acquire(self) -> bool:
+        if not self._held and not self._waiters:
+            self._held = True
+            return True
+        return False
+
+    def acquire(self) -> None:
+        with self._mutex:
+            if self._try_acquire():
+                return
+            event = threading.Event()
+            self._waiters.append(_Waiter(event.set))
+        event.wait()
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._mutex:
+            if self._try_acquire():
+                return
+            future = loop.create_future()
+            waiter = _Waiter(lambda: loop.call_soon_threadsafe(_resolve, future))
+            self._waiters.append(waiter)
+        try:
+            await future
+        except BaseException:
+            # Cancelled (e.g. the client went away): leave the line, or pass on
+            # the lock if it was handed over meanwhile
+            with self._mutex:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._mutex:
+            if not self._waiters:
+                self._held = False
+                return
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+        waiter.wake()
+
+def _resolve(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+_writer_lock = WriterLock()
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+def _acquire_writer(session) -> None:
+    if session.info.get("sqlite_writer"):
+        return
+    if getattr(session, "is_async", False):
+        # Async sessions run on the event loop: wait without blocking it
+        await_only(_writer_lock.acquire_async())
+    else:
+        _writer_lock.acquire()
+    session.info["sqlite_writer"] = True
+
+def _release_writer(session) -> None:
+    if session.info.pop("sqlite_writer", False):
+        _writer_lock.release()
+
+def configure_sqlite(engines, session_class) -> None:
+    """Apply pragmas on connect and serialize write transactions of session_class"""
+    for engine in engines:
+        event.listen(engine, "connect", _apply_pragmas)
+
+    @event.listens_for(session_class, "before_flush")
+    def _writer_before_flush(session, flush_context, instances):
+        if session.new or session.dirty or session.deleted:
+            _acquire_writer(session)
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def _writer_before_bulk_write(orm_execute_state):
+        if not orm_execute_state.is_select:
+            _acquire_writer(orm_execute_state.session)
+
+    @event.listens_for(session_class, "after_transaction_end")
+    def _writer_after_transaction(session, transaction):
+        if transaction.parent is None:
+            _release_writer(session)
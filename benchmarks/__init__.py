@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+
+def default_settings(database: str) -> None:
+    """
+    Settings for a benchmark run, where not already set: a throwaway SQLite file
+    named database and warnings-only logs. Call before anything imports the app,
+    which reads its settings at import.
+    """
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/{database}"
+    # Per-request log lines would drown the report on stdout
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,83 @@
+"""
+Compare requests per second of the sync (threadpool) and native async handlers
+for the hot routes.
+
+    python -m benchmarks.async_vs_sync --requests 2000 --concurrency 64
+
+Uses DATABASE_URL if set, otherwise a throwaway SQLite file. Requests are driven
+in-process through httpx's ASGI transport, so no server needs to be running.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks import default_settings
+
+default_settings("bench.db")
+
+import httpx
+from fastapi import FastAPI
+from app.database import async_engine
+from benchmarks import dataset
+from benchmarks.harness import build_app
+
+
+def seed():
+    try:
+        dataset.load(dataset.PRESETS["tiny"])
+    except RuntimeError:
+        pass  # already loaded
+
+
+async def run(app: FastAPI, paths, total: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(paths[i % len(paths)])
+
+        async def worker():
+            while not queue.empty():
+                response = await client.get(queue.get_nowait())
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    seed()
+    paths = [
+        "/posts/?limit=20",
+        "/posts/1",
+        "/comments/post/1",
+        "/reactions/post/1/count",
+        "/notification/notifications/1",
+        "/notification/notifications/1/unread/count",
+    ]
+
+    # One event loop for both runs: async engine connections are bound to their loop
+    async def compare():
+        results = {}
+        for label, use_async in (("sync", False), ("async", True)):
+            app = build_app(use_async)
+            await run(app, paths, len(paths) * 5, args.concurrency)  # warm-up
+            results[label] = round(await run(app, paths, args.requests, args.concurrency), 1)
+        await async_engine.dispose()
+        return results
+
+    results = asyncio.run(compare())
+    results["speedup"] = round(results["async"] / results["sync"], 2)
+    print(json.dumps({"requests_per_second": results,
+                      "requests": args.requests, "concurrency": args.concurrency}))
+
+
+if __name__ == "__main__":
+    main()
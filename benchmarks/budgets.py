@@ -0,0 +1,147 @@
+"""
+Query-budget and latency regression checks for the hot endpoints.
+
+    python -m benchmarks.budgets
+    python -m benchmarks.budgets --preset small --latency-scale 2
+
+Seeds a dataset (benchmarks.dataset) into DATABASE_URL, or a throwaway SQLite
+file, then requests every hot endpoint through both the sync and the async
+handlers. Each request must stay within its SQL statement budget and must not
+repeat a statement N_PLUS_ONE_THRESHOLD+ times; each endpoint's p95 must stay
+inside its latency envelope. Prints a JSON report and exits 1 on any failure.
+The same checks run in the test suite (tests/test_query_budgets.py), one case
+per endpoint and mode.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, NamedTuple
+
+from benchmarks import default_settings
+
+default_settings("budgets.db")
+# Budgets are about the queries behind each page, so every request must hit the database
+os.environ.setdefault("FEED_CACHE", "false")
+
+import httpx
+from app import instrumentation
+from app.database import async_engine
+from benchmarks import dataset
+from benchmarks.harness import build_app, row_counts
+
+
+class Budget(NamedTuple):
+    path: str
+    max_queries: int
+    p95_ms: float
+
+
+# Paths are formatted with a random post/user/community id from the dataset.
+# Budgets are the current statement counts; raise one only with a reason.
+BUDGETS: Dict[str, Budget] = {
+    "feed": Budget("/posts/?limit=20", 3, 250),
+    "post": Budget("/posts/{post}", 3, 50),
+    "comments": Budget("/comments/post/{post}", 4, 75),
+    "reactions_count": Budget("/reactions/post/{post}/count", 1, 30),
+    "user_reaction": Budget("/reactions/post/{post}/user/{user}", 1, 30),
+    "notifications": Budget("/notification/notifications/{user}", 1, 50),
+    "community_stats": Budget("/communities/{community}/stats", 3, 50),
+    "user_profile": Budget("/users/{user}/profile", 3, 50),
+}
+
+
+def _p95(values: List[float]) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.95))]
+
+async def warm_up(client: httpx.AsyncClient, budgets) -> None:
+    """Request each budget's path once, so pools and statement caches are warm before anything is timed"""
+    for budget in budgets:
+        await client.get(budget.path.format(post=1, user=1, community=1))
+
+async def check(client: httpx.AsyncClient, name: str, budget: Budget, counts: dict,
+                requests: int, latency_scale: float) -> dict:
+    rng = random.Random(name)
+    failures = []
+    latencies = []
+    max_queries = 0
+
+    for _ in range(requests):
+        path = budget.path.format(
+            post=rng.randint(1, counts["posts"]),
+            user=rng.randint(1, counts["users"]),
+            community=rng.randint(1, counts["communities"]),
+        )
+        # The ASGI transport runs the app in this task, so the ContextVar reaches
+        # the handler (and the threadpool, for sync handlers)
+        with instrumentation.track_queries() as stats:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+
+        max_queries = max(max_queries, stats.count)
+        if response.status_code >= 400:
+            failures.append(f"{path}: HTTP {response.status_code}")
+        if stats.count > budget.max_queries:
+            failures.append(f"{path}: {stats.count} queries > budget {budget.max_queries}")
+        for suspect in stats.suspected_n_plus_one():
+            failures.append(f"{path}: suspected N+1 ({suspect['count']}x) {suspect['statement']}")
+        if len(failures) >= 5:
+            break
+
+    p95_ms = round(_p95(latencies) * 1000, 2)
+    envelope = budget.p95_ms * latency_scale
+    if p95_ms > envelope:
+        failures.append(f"p95 {p95_ms}ms > envelope {envelope}ms")
+
+    return {
+        "max_queries": max_queries,
+        "budget": budget.max_queries,
+        "p95_ms": p95_ms,
+        "envelope_ms": envelope,
+        "ok": not failures,
+        "failures": failures,
+    }
+
+async def run(counts: dict, requests: int, latency_scale: float) -> dict:
+    instrumentation.install()
+    report = {}
+    for mode, use_async in (("sync", False), ("async", True)):
+        transport = httpx.ASGITransport(app=build_app(use_async))
+        async with httpx.AsyncClient(transport=transport, base_url="http://budgets") as client:
+            await warm_up(client, BUDGETS.values())
+            report[mode] = {
+                name: await check(client, name, budget, counts, requests, latency_scale)
+                for name, budget in BUDGETS.items()
+            }
+    await async_engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(dataset.PRESETS), default="tiny",
+                        help="dataset loaded when the database is empty")
+    parser.add_argument("--requests", type=int, default=50, help="requests per endpoint and mode")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiply every latency envelope (slow CI machines)")
+    args = parser.parse_args()
+
+    try:
+        dataset.load(dataset.PRESETS[args.preset])
+    except RuntimeError:
+        pass  # already loaded
+    counts = row_counts()
+
+    report = asyncio.run(run(counts, args.requests, args.latency_scale))
+    ok = all(result["ok"] for mode in report.values() for result in mode.values())
+    print(json.dumps({"ok": ok, "results": report}, indent=2))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Deterministic synthetic dataset for performance work.
+
+    python -m benchmarks.dataset --preset medium
+    python -m benchmarks.dataset --users 200000 --posts 2000000 --seed 7
+
+The same seed and sizes always produce the same rows (ids, authors, comment
+trees, timestamps), so numbers from different commits are comparable. Rows are
+generated lazily and written in batches: COPY on PostgreSQL, executemany
+everywhere else. Uses DATABASE_URL; the schema is created by the migrations and
+must be empty.
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import time
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+from sqlalchemy import Engine, text
+from app import migrations, models
+from app.database import engine as default_engine
+
+BATCH_SIZE = 10000
+EPOCH = datetime(2025, 1, 1)
+
+NOTIFICATION_TYPES = ("post_reaction", "comment_reply", "comment_reaction", "new_post")
+WORDS = (
+    "today feel better anxiety sleep talk friend family work stress calm breathe "
+    "walk therapy week small step hope tired support thank you share story help"
+).split()
+
+
+@dataclass
+class Scale:
+    users: int = 1000
+    communities: int = 10
+    follows_per_user: int = 3
+    posts: int = 10000
+    comments_per_post: int = 5
+    reply_ratio: float = 0.4
+    reactions_per_post: int = 8
+    comment_reactions_per_comment: int = 1
+    notifications_per_user: int = 20
+    seed: int = 42
+
+
+PRESETS: Dict[str, Scale] = {
+    "tiny": Scale(users=50, communities=3, posts=200, notifications_per_user=5),
+    "small": Scale(),
+    "medium": Scale(users=20000, communities=25, posts=200000),
+    "large": Scale(users=200000, communities=50, follows_per_user=5, posts=2000000),
+}
+
+
+# ============= ROW GENERATORS =============
+# Each generator draws from its own Random(seed, table) so changing one table's
+# size doesn't reshuffle the others.
+
+def _rng(scale: Scale, table: str) -> random.Random:
+    return random.Random(f"{scale.seed}:{table}")
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+def _around(rng: random.Random, mean: float) -> int:
+    """Integer spread uniformly over [0, 2*mean] so averages match the scale"""
+    return rng.randint(0, round(2 * mean))
+
+def _skewed(rng: random.Random, n: int) -> int:
+    """1-based id in [1, n] biased towards low ids (a few hot communities/authors)"""
+    return int(n * rng.random() ** 2) + 1
+
+def users(scale: Scale) -> Iterator[dict]:
+    for i in range(1, scale.users + 1):
+        yield {
+            "id": i,
+            "firebase_uid": f"bench-{i}",
+            "username": f"user{i}",
+            "email": f"user{i}@bench.ahkili.app",
+            "role": "admin" if i == 1 else "user",
+            "verified": False,
+            "created_at": EPOCH + timedelta(minutes=i),
+            "updated_at": EPOCH + timedelta(minutes=i),
+        }
+
+def communities(scale: Scale) -> Iterator[dict]:
+    rng = _rng(scale, "communities")
+    for i in range(1, scale.communities + 1):
+        yield {
+            "id": i,
+            "name": f"Community {i}",
+            "description": _sentence(rng, 12),
+            "created_by": 1,
+            "created_at": EPOCH,
+            "updated_at": EPOCH,
+        }
+
+def community_followers(scale: Scale) -> Iterator[dict]:
+    rng = _rng(scale, "community_followers")
+    follows = min(scale.follows_per_user, scale.communities)
+    row_id = 0
+    for user_id in range(1, scale.users + 1):
+        for community_id in sorted(rng.sample(range(1, scale.communities + 1), follows)):
+            row_id += 1
+            yield {
+                "id": row_id,
+                "community_id": community_id,
+                "user_id": user_id,
+                "followed_at": EPOCH + timedelta(minutes=user_id + 1),
+            }
+
+def posts(scale: Scale) -> Iterator[dict]:
+    rng = _rng(scale, "posts")
+    for i in range(1, scale.posts + 1):
+        yield {
+            "id": i,
+            "title": _sentence(rng, 6).capitalize(),
+            "content": _sentence(rng, 60),
+            "user_id": _skewed(rng, scale.users),
+            "community_id": _skewed(rng, scale.communities),
+            "is_anonymous": rng.random() < 0.1,
+            "created_at": EPOCH + timedelta(seconds=30 * i),
+            "updated_at": EPOCH + timedelta(seconds=30 * i),
+        }
+
+def comments(scale: Scale) -> Iterator[dict]:
+    """Comment trees: top-level comments, and replies to an earlier top-level one"""
+    rng = _rng(scale, "comments")
+    row_id = 0
+    for post_id in range(1, scale.posts + 1):
+        created = EPOCH + timedelta(seconds=30 * post_id)
+        top_level: List[int] = []
+        for _ in range(_around(rng, scale.comments_per_post)):
+            row_id += 1
+            created += timedelta(seconds=rng.randint(1, 600))
+            parent_id = None
+            if top_level and rng.random() < scale.reply_ratio:
+                parent_id = rng.choice(top_level)
+            else:
+                top_level.append(row_id)
+            yield {
+                "id": row_id,
+                "post_id": post_id,
+                "user_id": rng.randint(1, scale.users),
+                "parent_id": parent_id,
+                "content": _sentence(rng, 20),
+                "created_at": created,
+            }
+
+def post_reactions(scale: Scale) -> Iterator[dict]:
+    rng = _rng(scale, "post_reactions")
+    row_id = 0
+    for post_id in range(1, scale.posts + 1):
+        count = min(_around(rng, scale.reactions_per_post), scale.users)
+        for user_id in rng.sample(range(1, scale.users + 1), count):
+            row_id += 1
+            yield {
+                "id": row_id,
+                "post_id": post_id,
+                "user_id": user_id,
+                "reaction_type": "like",
+                "created_at": EPOCH + timedelta(seconds=30 * post_id + row_id % 3600),
+            }
+
+def comment_reactions(scale: Scale, comment_count: int) -> Iterator[dict]:
+    rng = _rng(scale, "comment_reactions")
+    row_id = 0
+    for comment_id in range(1, comment_count + 1):
+        count = min(_around(rng, scale.comment_reactions_per_comment), scale.users)
+        for user_id in rng.sample(range(1, scale.users + 1), count):
+            row_id += 1
+            yield {
+                "id": row_id,
+                "comment_id": comment_id,
+                "user_id": user_id,
+                "reaction_type": "like" if rng.random() < 0.85 else "dislike",
+                "created_at": EPOCH + timedelta(seconds=row_id),
+            }
+
+def notifications(scale: Scale) -> Iterator[dict]:
+    rng = _rng(scale, "notifications")
+    row_id = 0
+    for user_id in range(1, scale.users + 1):
+        for _ in range(_around(rng, scale.notifications_per_user)):
+            row_id += 1
+            kind = rng.choice(NOTIFICATION_TYPES)
+            yield {
+                "id": row_id,
+                "user_id": user_id,
+                "type": kind,
+                "title": kind.replace("_", " ").capitalize(),
+                "message": _sentence(rng, 10),
+                "target_type": "post",
+                "target_id": rng.randint(1, scale.posts) if scale.posts else None,
+                "actor_id": rng.randint(1, scale.users),
+                "is_read": rng.random() < 0.7,
+                "created_at": EPOCH + timedelta(seconds=row_id),
+            }
+
+
+# ============= LOADING =============
+def _batches(rows: Iterator[dict], size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _csv_value(value):
+    if value is None:
+        return r"\N"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+def _copy(engine: Engine, table, batch: List[dict]) -> None:
+    columns = list(batch[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow([_csv_value(row[c]) for c in columns])
+    buffer.seek(0)
+
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+        raw.commit()
+    finally:
+        raw.close()
+
+def _insert(engine: Engine, table, rows: Iterator[dict]) -> int:
+    use_copy = engine.dialect.name == "postgresql"
+    total = 0
+    for batch in _batches(rows):
+        if use_copy:
+            _copy(engine, table, batch)
+        else:
+            with engine.begin() as conn:
+                conn.execute(table.insert(), batch)  # executemany
+        total += len(batch)
+    return total
+
+def _reset_sequences(engine: Engine, tables) -> None:
+    """Rows were inserted with explicit ids; move PostgreSQL sequences past them"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for table in tables:
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+            ))
+
+def load(scale: Scale, engine: Engine = default_engine, verbose: bool = False) -> Dict[str, int]:
+    """Create the schema and bulk-load a dataset; returns row counts per table"""
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT COUNT(*) FROM users")).scalar():
+            raise RuntimeError("Target database is not empty")
+
+    plan = [
+        (models.User, lambda: users(scale)),
+        (models.Community, lambda: communities(scale)),
+        (models.CommunityFollower, lambda: community_followers(scale)),
+        (models.Post, lambda: posts(scale)),
+        (models.Comment, lambda: comments(scale)),
+        (models.CommentReaction, lambda: comment_reactions(scale, counts["comments"])),
+        (models.PostReaction, lambda: post_reactions(scale)),
+        (models.Notification, lambda: notifications(scale)),
+    ]
+    counts: Dict[str, int] = {}
+    for model, rows in plan:
+        started = time.perf_counter()
+        counts[model.__tablename__] = _insert(engine, model.__table__, rows())
+        if verbose:
+            print(f"  {model.__tablename__}: {counts[model.__tablename__]} rows "
+                  f"in {time.perf_counter() - started:.1f}s", flush=True)
+
+    _reset_sequences(engine, [model.__table__ for model, _ in plan])
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    for field in fields(Scale):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=field.type, default=None)
+    args = parser.parse_args()
+
+    overrides = {f.name: getattr(args, f.name) for f in fields(Scale) if getattr(args, f.name) is not None}
+    scale = Scale(**{**asdict(PRESETS[args.preset]), **overrides})
+
+    started = time.perf_counter()
+    counts = load(scale, verbose=True)
+    print(json.dumps({"scale": asdict(scale), "rows": counts,
+                      "seconds": round(time.perf_counter() - started, 2)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Local HTTP stand-in for the Cloudinary upload API.
+
+    python -m benchmarks.fake_media_provider --port 8765 --latency 0.5 --seconds-per-mb 0.2
+    CLOUDINARY_UPLOAD_PREFIX=http://127.0.0.1:8765 CLOUDINARY_CLOUD_NAME=local ... uvicorn app.main:app
+
+Answers POST /v1_1/<cloud>/<resource_type>/upload and .../destroy, and the
+Admin API's DELETE /v1_1/<cloud>/resources/<resource_type>/upload and GET
+.../upload/<public_id> (for files it received), the way the real API does (as far as app/services/upload.py and signed_upload.py care)
+after a configurable delay, so upload paths can be exercised and timed without
+network access or credentials. Request signatures are not checked; responses
+are signed with --api-secret like the real provider's. tests/test_uploads.py
+runs the upload paths against it.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+import uuid
+from urllib.parse import unquote
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeMediaProvider(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, seconds_per_mb: float = 0.0, fail_rate: float = 0.0,
+                 api_secret: str = "secret"):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.api_secret = api_secret
+        self.latency = latency
+        self.seconds_per_mb = seconds_per_mb
+        self.fail_rate = fail_rate
+        self.calls = 0
+        # (resource_type, public_id) -> Admin API details of the files uploaded so far
+        self.resources = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeMediaProvider":
+        threading.Thread(target=self.serve_forever, name="fake-media-provider", daemon=True).start()
+        return self
+
+
+def _form_fields(content_type: str, body: bytes) -> dict:
+    """Text fields of a multipart/form-data body"""
+    if not content_type.startswith("multipart/form-data"):
+        return {}
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    return {
+        part.get_param("name", header="content-disposition"): part.get_content()
+        for part in message.iter_parts()
+        if part.get_filename() is None and part.get_content_maintype() == "text"
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeMediaProvider
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self, size: int) -> bool:
+        """Count the call and wait like the provider would; False if this call fails"""
+        server = self.server
+        with server._lock:
+            server.calls += 1
+            # Deterministic: every 1/fail_rate-th call fails
+            fail = int(server.calls * server.fail_rate) > int((server.calls - 1) * server.fail_rate)
+        time.sleep(server.latency + server.seconds_per_mb * size / (1024 * 1024))
+        if fail:
+            self._reply(500, {"error": {"message": "Simulated provider failure"}})
+        return not fail
+
+    def do_DELETE(self):
+        size = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(size) or b"{}")
+        parts = self.path.split("?")[0].strip("/").split("/")  # v1_1, cloud, resources, resource_type, type
+        if len(parts) != 5 or parts[0] != "v1_1" or parts[2] != "resources":
+            self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        if self._simulate(0):
+            self._reply(200, {"deleted": {public_id: "deleted" for public_id in body.get("public_ids", [])},
+                              "partial": False})
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/", 5)  # v1_1, cloud, resources, resource_type, type, public_id
+        if len(parts) != 6 or parts[0] != "v1_1" or parts[2] != "resources":
+            self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        if not self._simulate(0):
+            return
+        public_id = unquote(parts[5])
+        details = self.server.resources.get((parts[3], public_id))
+        if details is None:
+            self._reply(404, {"error": {"message": f"Resource not found - {public_id}"}})
+        else:
+            self._reply(200, details)
+
+    def do_POST(self):
+        size = int(self.headers.get("Content-Length") or 0)
+        fields = _form_fields(self.headers.get("Content-Type", ""), self.rfile.read(size))
+        parts = self.path.strip("/").split("/")  # v1_1, cloud, resource_type, action
+        if len(parts) != 4 or parts[0] != "v1_1":
+            self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        _, cloud, resource_type, action = parts
+
+        server = self.server
+        if not self._simulate(size):
+            return
+
+        if action == "upload":
+            public_id = fields.get("public_id") or uuid.uuid4().hex
+            version = int(time.time())
+            fmt = "mp4" if resource_type == "video" else "jpg"
+            signed = f"public_id={public_id}&version={version}{server.api_secret}"
+            details = {
+                "public_id": public_id,
+                "version": version,
+                "resource_type": resource_type,
+                "format": fmt,
+                "bytes": size,
+                "secure_url": f"{server.url}/{cloud}/{resource_type}/upload/v{version}/{public_id}.{fmt}",
+            }
+            server.resources[(resource_type, public_id)] = details
+            self._reply(200, {**details, "signature": hashlib.sha1(signed.encode()).hexdigest()})
+        elif action == "destroy":
+            self._reply(200, {"result": "ok"})
+        else:
+            self._reply(404, {"error": {"message": f"Unknown action {action}"}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds added to every call")
+    parser.add_argument("--seconds-per-mb", type=float, default=0.1, help="Simulated transfer time")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of calls answered with 500")
+    parser.add_argument("--api-secret", default="secret", help="Secret the responses are signed with")
+    args = parser.parse_args()
+
+    server = FakeMediaProvider(args.port, args.latency, args.seconds_per_mb, args.fail_rate, args.api_secret)
+    print(f"Fake media provider on {server.url}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Drive the main read routes in-process and report latency, throughput and SQL
+query counts as JSON.
+
+    python -m benchmarks.harness --preset small --requests 500 --concurrency 16
+    python -m benchmarks.harness --output run.json --baseline previous.json
+
+Uses DATABASE_URL if set, otherwise a throwaway SQLite file; an empty database
+is loaded first with benchmarks.dataset (--preset). Requests go through the full
+app (middlewares included) via httpx's ASGI transport. Query counts come from the
+Server-Timing header added by the SQL instrumentation middleware.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import time
+from dataclasses import asdict
+from typing import Callable, Dict, List
+
+from benchmarks import default_settings
+
+default_settings("bench.db")
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, inspect, select
+from app import models
+from app.database import SessionLocal, async_engine, engine
+from app.routes import async_routes, comments, communities, notification, posts, reactions, users
+from benchmarks import dataset
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+# name -> path built from a Random and the row counts of the loaded dataset
+ROUTES: Dict[str, Callable[[random.Random, dict], str]] = {
+    "feed": lambda r, n: "/posts/?limit=20",
+    "community_feed": lambda r, n: f"/posts/?limit=20&community_id={r.randint(1, n['communities'])}",
+    "post": lambda r, n: f"/posts/{r.randint(1, n['posts'])}",
+    "comments": lambda r, n: f"/comments/post/{r.randint(1, n['posts'])}",
+    "reactions_count": lambda r, n: f"/reactions/post/{r.randint(1, n['posts'])}/count",
+    "notifications": lambda r, n: f"/notification/notifications/{r.randint(1, n['users'])}",
+    "unread_count": lambda r, n: f"/notification/notifications/{r.randint(1, n['users'])}/unread/count",
+    "communities": lambda r, n: "/communities/",
+    "community_stats": lambda r, n: f"/communities/{r.randint(1, n['communities'])}/stats",
+    "user_profile": lambda r, n: f"/users/{r.randint(1, n['users'])}/profile",
+}
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def build_app(use_async: bool) -> FastAPI:
+    """The post, comment, reaction, notification, community and user routes, with or without the async handlers"""
+    app = FastAPI(default_response_class=ORJSONResponse)
+    if use_async:
+        for router in async_routes.routers:
+            app.include_router(router)
+    for router in (posts.router, comments.router, reactions.router, notification.router,
+                   communities.router, users.router):
+        app.include_router(router)
+    return app
+
+def row_counts() -> dict:
+    db = SessionLocal()
+    try:
+        return {
+            "users": db.scalar(select(func.max(models.User.id))) or 0,
+            "communities": db.scalar(select(func.max(models.Community.id))) or 0,
+            "posts": db.scalar(select(func.max(models.Post.id))) or 0,
+        }
+    finally:
+        db.close()
+
+def prepare(preset: str) -> dict:
+    counts = row_counts() if inspect(engine).has_table("users") else {}
+    if not counts.get("users"):
+        dataset.load(dataset.PRESETS[preset])
+        counts = row_counts()
+    return counts
+
+
+async def run_route(client: httpx.AsyncClient, paths: List[str], concurrency: int) -> dict:
+    latencies: List[float] = []
+    queries: List[int] = []
+    errors = 0
+    pending = iter(paths)
+
+    async def worker():
+        nonlocal errors
+        for path in pending:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                errors += 1
+            match = QUERIES.search(response.headers.get("server-timing", ""))
+            if match:
+                queries.append(int(match.group(1)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(paths),
+        "errors": errors,
+        "requests_per_second": round(len(paths) / elapsed, 1),
+        "p50_ms": ms(_percentile(latencies, 50)),
+        "p95_ms": ms(_percentile(latencies, 95)),
+        "p99_ms": ms(_percentile(latencies, 99)),
+        "mean_ms": ms(statistics.fmean(latencies)),
+        "queries_mean": round(statistics.fmean(queries), 2) if queries else None,
+        "queries_max": max(queries) if queries else None,
+    }
+
+async def run(app, counts: dict, routes: List[str], requests: int, concurrency: int, seed: int) -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in routes:
+            rng = random.Random(f"{seed}:{name}")
+            build = ROUTES[name]
+            # Warm-up pass so pools, statement caches and imports aren't measured
+            await run_route(client, [build(rng, counts) for _ in range(min(requests, 20))], concurrency)
+            results[name] = await run_route(client, [build(rng, counts) for _ in range(requests)], concurrency)
+    await async_engine.dispose()
+    return results
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """Relative change per route for the headline numbers (negative latency = faster)"""
+    deltas = {}
+    for name, now in current["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if not before:
+            continue
+        deltas[name] = {
+            key: round((now[key] - before[key]) / before[key] * 100, 1)
+            for key in ("requests_per_second", "p50_ms", "p95_ms", "p99_ms")
+            if before.get(key)
+        }
+        deltas[name]["queries_mean"] = (now["queries_mean"] or 0) - (before["queries_mean"] or 0)
+    return {"baseline_commit": baseline.get("commit"), "percent_change": deltas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(dataset.PRESETS), default="small",
+                        help="dataset loaded when the database is empty")
+    parser.add_argument("--requests", type=int, default=300, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma-separated subset of routes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    args = parser.parse_args()
+
+    routes = [name.strip() for name in args.routes.split(",") if name.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    counts = prepare(args.preset)
+    from app.main import app
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "database": engine.dialect.name,
+        "dataset": {"preset": args.preset, **asdict(dataset.PRESETS[args.preset]), "max_ids": counts},
+        "requests_per_route": args.requests,
+        "concurrency": args.concurrency,
+        "routes": asyncio.run(run(app, counts, routes, args.requests, args.concurrency, args.seed)),
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
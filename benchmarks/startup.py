@@ -0,0 +1,55 @@
+"""
+Measure app startup: import time of app.main and lifespan warm-up time.
+
+    python -m benchmarks.startup --runs 5
+
+Each run uses a fresh interpreter so import caches don't hide regressions.
+Prints the median of each timing as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import asyncio, json, time
+t = time.perf_counter()
+import app.main
+imported = time.perf_counter() - t
+
+async def boot():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        pass
+
+t = time.perf_counter()
+asyncio.run(boot())
+print(json.dumps({"import_seconds": imported, "lifespan_seconds": time.perf_counter() - t}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if "DATABASE_URL" not in env:
+        env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/startup.db"
+        subprocess.run([sys.executable, "-m", "app.migrations"], env=env, check=True, capture_output=True)
+
+    samples = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], env=env, check=True, capture_output=True, text=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(json.dumps({
+        key: round(statistics.median(s[key] for s in samples), 4)
+        for key in ("import_seconds", "lifespan_seconds")
+    } | {"runs": args.runs}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Upload load test against a local stand-in for the media provider.
+
+    python -m benchmarks.uploads --images 40 --videos 6 --video-mb 20
+    python -m benchmarks.uploads --storage local
+
+Starts benchmarks.fake_media_provider in-process and points the Cloudinary SDK
+at it (or, with --storage local, stores files on disk with the local storage
+backend), then fires concurrent image and video uploads at the app while probing
+GET /health. If provider calls block the event loop, the probe latency climbs
+to the length of an upload; with the media worker pools it stays flat. Prints
+upload and probe latencies, status codes and the media_* metrics as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks import default_settings
+from benchmarks.fake_media_provider import FakeMediaProvider
+
+
+def _percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from app import migrations
+    from app.main import app
+
+    # Uploads are recorded in media_assets (content-hash deduplication)
+    migrations.upgrade()
+
+    image = b"\xff\xd8\xff\xe0" + os.urandom(args.image_kb * 1024)
+    video = b"\x00\x00\x00\x18ftypmp42" + os.urandom(args.video_mb * 1024 * 1024)
+    statuses = {}
+    latencies = {"image": [], "video": [], "probe": []}
+    served = []
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def upload(kind, payload, name, content_type):
+            started = time.perf_counter()
+            response = await client.post(f"/upload/{kind}", files={"file": (name, payload, content_type)})
+            latencies[kind].append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                served.append(response.json()["url"])
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                latencies["probe"].append(time.perf_counter() - started)
+                await asyncio.sleep(0.02)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(
+            # Distinct bytes per upload, or content-hash deduplication answers most of them
+            *(upload("image", image + i.to_bytes(4, "big"), "a.jpg", "image/jpeg") for i in range(args.images)),
+            *(upload("video", video + i.to_bytes(4, "big"), "a.mp4", "video/mp4") for i in range(args.videos)),
+        )
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+        # Serve one uploaded file back (the local backend's GET /media/...)
+        if args.storage == "local" and served:
+            started = time.perf_counter()
+            response = await client.get(served[0], headers={"Range": "bytes=0-1023"})
+            latencies["serve"] = [time.perf_counter() - started]
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        metrics = [
+            line for line in (await client.get("/metrics")).text.splitlines()
+            if line.startswith("media_") and "_bucket" not in line
+        ]
+
+    return {
+        "seconds": round(elapsed, 2),
+        "statuses": statuses,
+        "image": _percentiles(latencies["image"]),
+        "video": _percentiles(latencies["video"]),
+        "health_probe": _percentiles(latencies["probe"]),
+        "serve": _percentiles(latencies.get("serve", [])),
+        "metrics": metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--videos", type=int, default=6)
+    parser.add_argument("--image-kb", type=int, default=300)
+    parser.add_argument("--video-mb", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2, help="Provider seconds per call")
+    parser.add_argument("--seconds-per-mb", type=float, default=0.05, help="Provider transfer time")
+    parser.add_argument("--storage", choices=("cloudinary", "local"), default="cloudinary",
+                        help="cloudinary: the SDK against the local stand-in; local: files on disk")
+    args = parser.parse_args()
+
+    provider = None
+    if args.storage == "local":
+        os.environ.update({"STORAGE_BACKEND": "local", "MEDIA_ROOT": tempfile.mkdtemp()})
+    else:
+        provider = FakeMediaProvider(latency=args.latency, seconds_per_mb=args.seconds_per_mb).start()
+        os.environ.update({
+            "CLOUDINARY_UPLOAD_PREFIX": provider.url,
+            "CLOUDINARY_CLOUD_NAME": "local",
+            "CLOUDINARY_API_KEY": "key",
+            "CLOUDINARY_API_SECRET": "secret",
+        })
+    default_settings("uploads.db")
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    if provider is not None:
+        provider.shutdown()
+
+
+if __name__ == "__main__":
+    main()
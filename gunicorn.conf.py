@@ -0,0 +1,99 @@
+import gc
+import os
+import shutil
+import tempfile
+from dotenv import load_dotenv
+from uvicorn_worker import UvicornWorker
+
+# The settings below (DATABASE_URL included) may come from .env, like the app's
+load_dotenv()
+
+# Production server: gunicorn supervising uvicorn workers (Procfile / railway.json
+# run `gunicorn app.main:app`, which reads this file from the working directory).
+#
+# The app is imported once in the master and the workers are forked from it, so
+# the imported modules are shared copy-on-write instead of loaded per worker.
+# Everything else (DB connections, the feed cache, media and image pools, the
+# background workers) is per worker and set up by each worker's lifespan
+# (app/lifespan.py). Workers are recycled after WORKER_MAX_REQUESTS requests:
+# the old one stops accepting, finishes what it is serving, and a fresh fork
+# replaces it.
+#
+# Each worker has its own counters, so workers publish their metrics to
+# METRICS_DIR and GET /metrics, whichever worker answers it, returns all of them
+# labelled by pid (app/metrics.py). The in-process feed cache is per worker too:
+# a write's invalidation only reaches the worker that served it, and the others
+# keep serving their copy for up to FEED_CACHE_TTL (FEED_CACHE_BACKEND selects a
+# shared cache, see app/feed_cache.py).
+#
+# Local development still runs a single process: uvicorn app.main:app --reload
+
+def _cpu_count() -> int:
+    try:
+        # Cores this process may run on (container CPU sets), not all of the host's
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _default_workers() -> int:
+    # SQLite's writer lock (app/sqlite_mode.py) only orders one process's writes;
+    # several processes would be back to racing for "database is locked"
+    if os.getenv("DATABASE_URL", "sqlite").startswith("sqlite"):
+        return 1
+    return _cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# WEB_CONCURRENCY is also what gunicorn and most hosts use for this
+workers = int(os.getenv("WEB_CONCURRENCY", str(_default_workers())))
+preload_app = True
+
+# Jitter spreads restarts out so the workers don't all recycle at once; 0 disables recycling
+max_requests = int(os.getenv("WORKER_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+# Seconds a stopping worker gets to finish in-flight requests (long uploads included)
+graceful_timeout = int(os.getenv("WORKER_GRACEFUL_TIMEOUT", "60"))
+# uvicorn's default; gunicorn's own (2s) would close idle keep-alive connections sooner
+keepalive = int(os.getenv("KEEPALIVE_SECONDS", "5"))
+
+# No access log: every request already gets a structured request_sql line (app/logs.py)
+accesslog = None
+errorlog = "-"
+
+# Set before the app is imported; a fresh directory, so no snapshots of a previous run's workers
+_created_metrics_dir = None
+if not os.getenv("METRICS_DIR"):
+    _created_metrics_dir = os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="ahkili-metrics-")
+
+class Worker(UvicornWorker):
+    # "auto" uses uvloop and httptools when they are installed, asyncio and h11 otherwise
+    CONFIG_KWARGS = {
+        "loop": os.getenv("UVICORN_LOOP", "auto"),
+        "http": os.getenv("UVICORN_HTTP", "auto"),
+    }
+
+worker_class = Worker
+
+def when_ready(server):
+    # The app is loaded; move everything it allocated out of the collector's reach
+    # so garbage collections in the workers don't write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Pooled connections opened in the master (if any) belong to the master only
+    from app import database
+
+    for engine in (database.engine, *database.read_engines):
+        engine.dispose(close=False)
+    for engine in (database.async_engine, *database.async_read_engines):
+        engine.sync_engine.dispose(close=False)
+
+def child_exit(server, worker):
+    # A worker that was killed never removed its metrics snapshot itself
+    from app import metrics
+
+    metrics.remove_snapshot(worker.pid)
+
+def on_exit(server):
+    if _created_metrics_dir:
+        shutil.rmtree(_created_metrics_dir, ignore_errors=True)
@@ -1,6 +1,6 @@
-from app.database import engine, Base
-from app.models import User, Community, Post, Comment, Hotline
+from app import migrations
 
-print("Creating database tables...")
-Base.metadata.create_all(bind=engine)
-print("Database tables created successfully!")
\ No newline at end of file
+print("Applying database migrations...")
+applied = migrations.upgrade()
+print(f"Applied {len(applied)} migrations: {', '.join(applied) or 'none'}")
+print("Database is up to date!")
@@ -0,0 +1,46 @@
+import asyncio
+import os
+import tempfile
+
+# Settings are read at import, so they are set before anything imports the app.
+# DATABASE_URL can point the suite at another database (an empty PostgreSQL in CI).
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/tests.db"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# For tests/test_query_budgets.py, as in benchmarks/budgets.py
+os.environ.setdefault("FEED_CACHE", "false")
+
+import httpx
+import pytest
+from app import migrations
+from app.database import async_engine
+from app.main import app
+from benchmarks import dataset
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    migrations.upgrade()
+    # The query budget tests need the generated dataset, which only loads into an
+    # empty database: load it before any test adds rows of its own
+    try:
+        dataset.load(dataset.PRESETS["tiny"])
+    except RuntimeError:
+        pass  # DATABASE_URL already has data
+
+
+@pytest.fixture(scope="session")
+def run():
+    """Run a coroutine on the suite's event loop (async engine pools are bound to one loop)"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.run_until_complete(async_engine.dispose())
+    loop.close()
+
+
+@pytest.fixture
+def client(run):
+    """An httpx client for the app through the ASGI transport; await its requests inside run()"""
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60)
+    yield client
+    run(client.aclose())
@@ -0,0 +1,165 @@
+"""
+Files served by the local storage backend (app/routes/media.py) through each send
+path the server may offer: http.response.zerocopysend, http.response.pathsend,
+plain streamed bodies and an X-Accel-Redirect for nginx. The ASGI app is called
+directly, since httpx's transport offers no send extensions.
+"""
+import os
+
+import pytest
+from app.main import app
+from app.routes import media
+from app.services import storage
+
+# More than one streamed block, not a multiple of it
+BODY = os.urandom(media.MediaFileResponse.chunk_size * 2 + 1000)
+NAME = "uploads/images/photo.jpg"
+SEND_PATHS = {
+    "zerocopysend": {"http.response.zerocopysend": {}},
+    "pathsend": {"http.response.pathsend": {}},
+    "stream": {},
+}
+
+
+@pytest.fixture
+def stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "backend", storage.LocalStorage(str(tmp_path)))
+    path = tmp_path / NAME
+    path.parent.mkdir(parents=True)
+    path.write_bytes(BODY)
+    return f"/media/v1/{NAME}"
+
+
+async def fetch(path: str, extensions: dict, headers: dict = None, method: str = "GET"):
+    """(status, headers, body, body message types) of a request sent straight to the app"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "server": ("test", 80), "client": ("127.0.0.1", 1234), "extensions": extensions,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+    start, body, kinds = None, b"", []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal start, body
+        if message["type"] == "http.response.start":
+            start = message
+            return
+        kinds.append(message["type"])
+        if message["type"] == "http.response.zerocopysend":
+            body += os.pread(message["file"].fileno(), message["count"], message["offset"])
+        elif message["type"] == "http.response.pathsend":
+            with open(message["path"], "rb") as f:
+                body += f.read()
+        else:
+            body += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body, kinds
+
+
+@pytest.mark.parametrize("send_path", SEND_PATHS)
+def test_whole_file(send_path, stored, run):
+    status, headers, body, kinds = run(fetch(stored, SEND_PATHS[send_path]))
+
+    assert status == 200
+    assert body == BODY
+    assert int(headers["content-length"]) == len(BODY)
+    assert headers["content-type"] == "image/jpeg"
+    assert headers["cache-control"] == media.MEDIA_CACHE_CONTROL
+    assert set(kinds) == {f"http.response.{send_path}" if send_path != "stream" else "http.response.body"}
+
+
+@pytest.mark.parametrize("send_path", SEND_PATHS)
+def test_single_range(send_path, stored, run):
+    status, headers, body, _ = run(fetch(stored, SEND_PATHS[send_path], {"Range": "bytes=100-1048675"}))
+
+    assert status == 206
+    assert body == BODY[100:1048676]
+    assert headers["content-range"] == f"bytes 100-1048675/{len(BODY)}"
+    assert int(headers["content-length"]) == len(body)
+
+
+@pytest.mark.parametrize("send_path", SEND_PATHS)
+def test_multipart_ranges(send_path, stored, run):
+    status, headers, body, _ = run(fetch(stored, SEND_PATHS[send_path], {"Range": "bytes=0-9, -10"}))
+
+    assert status == 206
+    boundary = headers["content-type"].removeprefix("multipart/byteranges; boundary=")
+    assert int(headers["content-length"]) == len(body)
+    assert body == (
+        f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Range: bytes 0-9/{len(BODY)}\r\n\r\n".encode()
+        + BODY[:10]
+        + f"\r\n--{boundary}\r\nContent-Type: image/jpeg\r\n"
+          f"Content-Range: bytes {len(BODY) - 10}-{len(BODY) - 1}/{len(BODY)}\r\n\r\n".encode()
+        + BODY[-10:]
+        + f"\r\n--{boundary}--\r\n".encode()
+    )
+
+
+@pytest.mark.parametrize("send_path", SEND_PATHS)
+def test_head_sends_no_body(send_path, stored, run):
+    status, headers, body, _ = run(fetch(stored, SEND_PATHS[send_path], method="HEAD"))
+
+    assert status == 200
+    assert body == b""
+    assert int(headers["content-length"]) == len(BODY)
+
+
+@pytest.mark.parametrize("range_header, status, length", [
+    (f"bytes={len(BODY)}-", 416, 0),  # unsatisfiable
+    ("bytes=10-5", 200, len(BODY)),  # malformed: ignored
+    ("items=0-5", 200, len(BODY)),
+])
+def test_unusable_ranges(range_header, status, length, stored, run):
+    got_status, headers, body, _ = run(fetch(stored, {}, {"Range": range_header}))
+
+    assert got_status == status
+    assert len(body) == length
+    if status == 416:
+        assert headers["content-range"] == f"bytes */{len(BODY)}"
+
+
+def test_stale_if_range_gets_the_whole_file(stored, run):
+    status, _, body, _ = run(fetch(stored, {}, {"Range": "bytes=0-9", "If-Range": '"stale"'}))
+
+    assert status == 200
+    assert body == BODY
+
+
+def test_matching_etag_answers_304(stored, run):
+    _, headers, _, _ = run(fetch(stored, {}, method="HEAD"))
+    status, _, body, _ = run(fetch(stored, {}, {"If-None-Match": headers["etag"]}))
+
+    assert status == 304
+    assert body == b""
+
+
+def test_accel_redirect_leaves_the_body_to_nginx(stored, monkeypatch, run):
+    monkeypatch.setattr(media, "MEDIA_ACCEL_REDIRECT", "/_media")
+    status, headers, body, _ = run(fetch(stored, SEND_PATHS["zerocopysend"]))
+
+    assert status == 200
+    assert headers["x-accel-redirect"] == f"/_media/{NAME}"
+    assert body == b""
+
+
+def test_compressible_file_through_an_extension(stored, tmp_path, run):
+    (tmp_path / "uploads/images/logo.svg").write_bytes(b"<svg/>" * 1000)
+    status, headers, body, kinds = run(fetch(
+        "/media/v1/uploads/images/logo.svg", SEND_PATHS["pathsend"], {"Accept-Encoding": "gzip"},
+    ))
+
+    assert status == 200
+    assert "content-encoding" not in headers
+    assert body == b"<svg/>" * 1000
+    assert kinds == ["http.response.pathsend"]
+
+
+def test_missing_file_is_not_found(stored, run):
+    status, _, _, _ = run(fetch("/media/v1/uploads/images/missing.jpg", {}))
+
+    assert status == 404
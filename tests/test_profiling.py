@@ -0,0 +1,61 @@
+"""
+On-demand request profiling (app/profiling.py): X-Profile is only honoured for
+admins, and /admin/profiles only lists profiles to admins.
+"""
+import secrets
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from app import models, profiling
+from app.database import SessionLocal
+
+
+def make_user(role: str) -> int:
+    name = secrets.token_hex(6)
+    db = SessionLocal()
+    try:
+        user = models.User(firebase_uid=name, username=name, email=f"{name}@example.com", role=role)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="module")
+def users():
+    return {role: make_user(role) for role in ("admin", "moderator", "user")}
+
+
+@pytest.fixture
+def profiled(monkeypatch, tmp_path, run):
+    monkeypatch.setattr(profiling, "PROFILE_ON_REQUEST", True)
+    monkeypatch.setattr(profiling, "ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    profiling.install(app)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield client
+    run(client.aclose())
+
+
+@pytest.mark.parametrize("role, profiled_request", [("admin", True), ("moderator", False), ("user", False)])
+def test_x_profile_is_honoured_for_admins_only(role, profiled_request, users, profiled, run):
+    response = run(profiled.get("/ping", headers={"X-Profile": str(users[role])}))
+
+    assert response.status_code == 200
+    assert ("x-profile-id" in response.headers) == profiled_request
+    assert bool(profiling.list_profiles()) == profiled_request
+
+
+@pytest.mark.parametrize("role, status", [("admin", 200), ("moderator", 403), ("user", 403)])
+def test_profiles_are_listed_to_admins_only(role, status, users, client, run):
+    response = run(client.get("/admin/profiles", params={"admin_id": users[role]}))
+
+    assert response.status_code == status, response.text
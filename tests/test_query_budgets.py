@@ -0,0 +1,45 @@
+"""
+SQL statement budgets and latency envelopes of the hot endpoints (see
+benchmarks/budgets.py), through both the sync and the async handlers. A new
+N+1 or an extra statement fails the build.
+
+BUDGET_REQUESTS sets requests per endpoint and mode; BUDGET_LATENCY_SCALE
+multiplies every latency envelope (slow CI machines).
+"""
+import os
+
+import httpx
+import pytest
+from app import instrumentation
+from benchmarks.budgets import BUDGETS, check, warm_up
+from benchmarks.harness import build_app, row_counts
+
+REQUESTS = int(os.getenv("BUDGET_REQUESTS", "30"))
+LATENCY_SCALE = float(os.getenv("BUDGET_LATENCY_SCALE", "1.0"))
+
+
+@pytest.fixture(scope="module")
+def counts():
+    # The dataset is loaded by tests/conftest.py
+    instrumentation.install()
+    return row_counts()
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["sync", "async"])
+def app(request):
+    return build_app(request.param)
+
+
+@pytest.mark.parametrize("name", sorted(BUDGETS))
+def test_endpoint_within_budget(name, app, counts, run):
+    budget = BUDGETS[name]
+
+    async def measure():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://budgets") as client:
+            await warm_up(client, [budget])
+            return await check(client, name, budget, counts, REQUESTS, LATENCY_SCALE)
+
+    result = run(measure())
+    assert result["ok"], "\n".join(result["failures"])
+    assert result["max_queries"] <= budget.max_queries
@@ -0,0 +1,53 @@
+"""
+Sync post and comment routes under more concurrent requests than the
+threadpool has threads (anyio's default limit is 40) and the connection pool
+has connections: every request must still finish, none may wait out the pool
+timeout.
+"""
+import asyncio
+import secrets
+
+import anyio.to_thread
+import pytest
+from app import models
+from app.database import SessionLocal
+
+IN_FLIGHT = 80
+
+
+@pytest.fixture(scope="module")
+def post():
+    name = secrets.token_hex(6)
+    db = SessionLocal()
+    try:
+        user = models.User(firebase_uid=name, username=name, email=f"{name}@example.com")
+        db.add(user)
+        db.flush()
+        post = models.Post(title="Concurrency", content="Comments welcome", user_id=user.id)
+        db.add(post)
+        db.commit()
+        return {"id": post.id, "user_id": user.id}
+    finally:
+        db.close()
+
+
+async def concurrently(client, method: str, path: str, **kwargs) -> list:
+    assert anyio.to_thread.current_default_thread_limiter().total_tokens < IN_FLIGHT
+    return await asyncio.gather(*(client.request(method, path, **kwargs) for _ in range(IN_FLIGHT)))
+
+
+def test_concurrent_comment_posts_finish(post, client, run):
+    responses = run(concurrently(
+        client, "POST", f"/comments/post/{post['id']}",
+        params={"user_id": post["user_id"]}, json={"content": "Same here"},
+    ))
+
+    assert [r.status_code for r in responses] == [200] * IN_FLIGHT, responses[0].text
+    assert responses[0].json()["author"]["id"] == post["user_id"]
+
+
+def test_concurrent_user_post_lists_finish(post, client, run):
+    responses = run(concurrently(client, "GET", f"/posts/user/{post['user_id']}"))
+
+    assert [r.status_code for r in responses] == [200] * IN_FLIGHT, responses[0].text
+    assert [p["id"] for p in responses[0].json()] == [post["id"]]
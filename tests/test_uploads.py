@@ -0,0 +1,229 @@
+"""
+Proxied image and video uploads, resumable video uploads and the completion of
+direct uploads against a local stand-in for the provider (benchmarks/fake_media_provider.py), through
+the real Cloudinary SDK and the media worker pools (app/services/media_pool.py).
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+import httpx
+import pytest
+from app import models
+from app.database import SessionLocal
+from app.services import image_variants, media_pool, resumable, signed_upload, storage
+from benchmarks.fake_media_provider import FakeMediaProvider
+
+SLOW_PROVIDER_SECONDS = 1.0
+
+# kind -> (path, content type, file body); bodies are random so uploads are never deduplicated
+UPLOADS = {
+    "image": ("/upload/image", "image/png", lambda: b"\x89PNG\r\n\x1a\n" + os.urandom(4096)),
+    "video": ("/upload/video", "video/mp4", lambda: b"\x00\x00\x00\x18ftypmp42" + os.urandom(64 * 1024)),
+}
+
+
+@pytest.fixture(scope="module")
+def provider():
+    server = FakeMediaProvider().start()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("CLOUDINARY_UPLOAD_PREFIX", server.url)
+        patch.setenv("CLOUDINARY_CLOUD_NAME", "local")
+        patch.setenv("CLOUDINARY_API_KEY", "key")
+        patch.setenv("CLOUDINARY_API_SECRET", "secret")
+        patch.setattr(storage, "backend", storage.CloudinaryStorage())
+        # Variant jobs would keep uploading after the test is over
+        patch.setattr(image_variants, "IMAGE_VARIANTS_ENABLED", False)
+        yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def slow_provider(provider):
+    provider.latency = SLOW_PROVIDER_SECONDS
+    yield provider
+    provider.latency = 0.0
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Install a one-worker pool for a kind: pool(kind, timeout)"""
+    pools = []
+
+    def install(kind: str, timeout: float = 30.0) -> media_pool._KindPool:
+        kind_pool = media_pool._KindPool(kind, 1, timeout)
+        monkeypatch.setitem(media_pool._pools, kind, kind_pool)
+        pools.append(kind_pool)
+        return kind_pool
+
+    yield install
+    for kind_pool in pools:
+        kind_pool.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def upload(client: httpx.AsyncClient, kind: str):
+    path, content_type, body = UPLOADS[kind]
+    return client.post(path, files={"file": (f"upload.{kind}", body(), content_type)})
+
+
+def direct_upload(provider, kind: str, user_id: int) -> dict:
+    """Post a file straight to the provider with signed parameters, as a client would; its response"""
+    _, content_type, body = UPLOADS[kind]
+    fields = signed_upload.upload_params(kind, user_id, "key", "secret")
+    response = httpx.post(
+        signed_upload.upload_url("local", kind, provider.url),
+        data=fields,
+        files={"file": (f"upload.{kind}", body(), content_type)},
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def complete(client: httpx.AsyncClient, user_id: int, stored: dict, **reported):
+    completion = {key: stored[key] for key in ("public_id", "version", "signature")}
+    return client.post("/upload/complete", params={"user_id": user_id},
+                       json={"kind": stored["resource_type"], **completion, **reported})
+
+
+@pytest.mark.parametrize("kind", sorted(UPLOADS))
+def test_upload_is_stored_at_the_provider(kind, provider, client, run):
+    calls = provider.calls
+    response = run(upload(client, kind))
+
+    assert response.status_code == 200, response.text
+    assert response.json()["url"].startswith(f"{provider.url}/local/{kind}/upload/")
+    assert provider.calls == calls + 1
+
+
+def test_provider_upload_leaves_the_file_open(provider):
+    # Image variants are made from the uploaded file after the provider call
+    _, _, body = UPLOADS["image"]
+    with tempfile.SpooledTemporaryFile() as f:
+        f.write(body())
+        f.seek(0)
+        storage.backend.upload(f, resource_type="image")
+        assert not f.closed
+
+
+@pytest.mark.parametrize("kind", sorted(UPLOADS))
+def test_full_pool_answers_503(kind, provider, pool, monkeypatch, client, run):
+    monkeypatch.setattr(media_pool, "MEDIA_QUEUE_LIMIT", 1)
+    kind_pool = pool(kind)
+    # Occupy the only worker, then fill the one waiting place
+    started, release = threading.Event(), threading.Event()
+    kind_pool.submit(lambda: (started.set(), release.wait()))
+    assert started.wait(5)
+    kind_pool.submit(lambda: None)
+    calls = provider.calls
+    try:
+        response = run(upload(client, kind))
+    finally:
+        release.set()
+
+    assert response.status_code == 503, response.text
+    assert response.headers["retry-after"] == "5"
+    assert provider.calls == calls
+
+
+@pytest.mark.parametrize("kind", sorted(UPLOADS))
+def test_provider_timeout_answers_504(kind, slow_provider, pool, client, run):
+    pool(kind, timeout=SLOW_PROVIDER_SECONDS / 4)
+    response = run(upload(client, kind))
+
+    assert response.status_code == 504, response.text
+
+
+def test_event_loop_stays_responsive_during_slow_upload(slow_provider, client, run):
+    async def measure():
+        task = asyncio.ensure_future(upload(client, "image"))
+        gaps = []
+        while not task.done():
+            ticked = time.perf_counter()
+            await asyncio.sleep(0.01)
+            gaps.append(time.perf_counter() - ticked)
+        return await task, gaps
+
+    started = time.perf_counter()
+    response, gaps = run(measure())
+
+    assert response.status_code == 200, response.text
+    assert time.perf_counter() - started >= SLOW_PROVIDER_SECONDS
+    # The provider call runs on a pool thread; the loop keeps ticking every ~10ms
+    assert max(gaps) < 0.1, f"event loop blocked for {max(gaps):.3f}s"
+
+
+@pytest.mark.parametrize("kind", sorted(UPLOADS))
+def test_direct_upload_records_the_provider_size(kind, provider, client, run):
+    stored = direct_upload(provider, kind, user_id=1)
+    # What the client reports about the file is not used
+    response = run(complete(client, 1, stored, bytes=1, format="png"))
+
+    assert response.status_code == 200, response.text
+    assert response.json()["bytes"] == stored["bytes"]
+    assert response.json()["format"] == stored["format"]
+
+
+@pytest.mark.parametrize("kind", sorted(UPLOADS))
+def test_oversized_direct_upload_is_rejected_and_deleted(kind, provider, monkeypatch, client, run):
+    stored = direct_upload(provider, kind, user_id=1)
+    monkeypatch.setitem(signed_upload.MAX_BYTES, kind, stored["bytes"] - 1)
+    response = run(complete(client, 1, stored, bytes=1))
+
+    assert response.status_code == 400, response.text
+    db = SessionLocal()
+    try:
+        queued = db.query(models.MediaDeletion).filter(models.MediaDeletion.url.contains(stored["public_id"])).count()
+        recorded = db.query(models.MediaUpload).filter(models.MediaUpload.public_id == stored["public_id"]).count()
+    finally:
+        db.close()
+    assert (queued, recorded) == (1, 0)
+
+
+def test_direct_upload_missing_at_the_provider_is_refused(provider, client, run):
+    stored = direct_upload(provider, "image", user_id=1)
+    provider.resources.clear()
+    response = run(complete(client, 1, stored))
+
+    assert response.status_code == 403, response.text
+
+
+@pytest.fixture
+def video_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(resumable, "RESUMABLE_UPLOAD_DIR", str(tmp_path))
+    body = UPLOADS["video"][2]()
+    return resumable.create(1, len(body), "video/mp4"), body
+
+
+def test_resumable_upload_is_stored_at_the_provider(provider, video_session, client, run):
+    session, body = video_session
+    base = f"/upload/video/sessions/{session.id}"
+
+    async def resumable_upload():
+        half = len(body) // 2
+        for offset, chunk in ((0, body[:half]), (half, body[half:])):
+            response = await client.put(base, params={"offset": offset, "user_id": 1}, content=chunk)
+            assert response.status_code == 200, response.text
+        return await client.post(f"{base}/complete", params={"user_id": 1})
+
+    response = run(resumable_upload())
+
+    assert response.status_code == 200, response.text
+    assert response.json()["url"].startswith(f"{provider.url}/local/video/upload/")
+    assert not os.path.exists(session.path)
+
+
+@pytest.mark.parametrize("method, path, params", [
+    ("GET", "", {}),
+    ("PUT", "", {"offset": 0}),
+    ("POST", "/complete", {}),
+    ("DELETE", "", {}),
+])
+def test_resumable_session_of_another_user_is_not_found(method, path, params, video_session, client, run):
+    session, body = video_session
+    response = run(client.request(method, f"/upload/video/sessions/{session.id}{path}",
+                                  params={**params, "user_id": 2}, content=body if method == "PUT" else None))
+
+    assert response.status_code == 404, response.text
+    assert resumable.load(session.id).offset() == 0